@@ -14,19 +14,33 @@
 #           average contract for x
 #           average positive margin (diff between contract and score when won) for x
 #           average negative margin (diff between contract and score when lost) for x
+import json
 import math
 import os
+import tempfile
+import warnings
 from datetime import datetime
+from itertools import islice
+from multiprocessing import Pool
 from statistics import NormalDist
-from typing import Tuple, Optional, List
+from typing import Dict, Iterable, Iterator, Tuple, Optional, List, NamedTuple
 
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 
+from analysis.card_codes import decode_deals
 from analysis.matplotlib_wrapper import heatmap, annotate_heatmap
+from analysis.typed_csv import (
+    AUCTIONS_DTYPES, TRICKS_DTYPES, concat_frames, empty_typed_frame, iter_typed_csv, parse_typed_lines,
+    read_csv_header, read_typed_csv, remap_categories, rename_categories
+)
 
 PLAYER_TO_TEAM = {'east': 'east/west', 'west': 'east/west', 'north': 'north/south', 'south': 'north/south'}
+TEAM_TO_PLAYERS = {
+    team: [player for (player, player_team) in PLAYER_TO_TEAM.items() if player_team == team]
+    for team in set(PLAYER_TO_TEAM.values())
+}
 DATA_PATH = "./data"
 HEATMAPS_PATH = "./heatmaps"
 
@@ -51,45 +65,92 @@ MIRROR_TRICKS_COLUMNS = {
 }
 
 
+def mirror_values(values: pd.Series, mirror: Dict[str, str]) -> pd.Series:
+    """mirror of a player (or team) column, missing values staying missing"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return remap_categories(values, mirror)
+    return values.map(mirror)
+
+
+def count_distinct(df: pd.DataFrame, columns: List[str]) -> int:
+    return len(df.drop_duplicates(columns))
+
+
+def is_team_player(players: pd.Series, team: str) -> pd.Series:
+    return players.isin(TEAM_TO_PLAYERS[team])
+
+
 # STEP 0: A-B
 # STEP 1: A-B & B-A
 # STEP 2: A-A & A-A
 def prepare_datasets(ew_agent: str, ns_agent: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    tricks_df = pd.DataFrame()
-    auctions_df = pd.DataFrame()
+    """typed frames (cf analysis.typed_csv), parsed CSV files being cached on disk"""
+    tricks_dfs = []
+    auctions_dfs = []
 
     ew_ns_dir_path = os.path.join(DATA_PATH, f'{ew_agent}-vs-{ns_agent}')
     ns_ew_dir_path = os.path.join(DATA_PATH, f'{ns_agent}-vs-{ew_agent}')
 
-    # standard format (A vs B)
-    if os.path.exists(ew_ns_dir_path):
-        tricks_df = pd.read_csv(os.path.join(ew_ns_dir_path, 'tricks_data.csv'), sep=';', header='infer')
-        auctions_df = pd.read_csv(os.path.join(ew_ns_dir_path, 'auctions_data.csv'), sep=';', header='infer')
+    # standard format (A vs B); directories of round sampling experiments only may lack games (cf rounds_data.csv)
+    if os.path.exists(os.path.join(ew_ns_dir_path, 'tricks_data.csv')):
+        tricks_dfs.append(read_typed_csv(os.path.join(ew_ns_dir_path, 'tricks_data.csv'), TRICKS_DTYPES))
+        auctions_dfs.append(read_typed_csv(os.path.join(ew_ns_dir_path, 'auctions_data.csv'), AUCTIONS_DTYPES))
 
     # mirror format (B vs A)
-    if os.path.exists(ns_ew_dir_path):
+    if os.path.exists(os.path.join(ns_ew_dir_path, 'tricks_data.csv')):
         # open mirror dataframes
-        mirror_tricks_df = pd.read_csv(os.path.join(ns_ew_dir_path, 'tricks_data.csv'), sep=';', header='infer')
-        mirror_auctions_df = pd.read_csv(os.path.join(ns_ew_dir_path, 'auctions_data.csv'), sep=';', header='infer')
+        mirror_tricks_df = read_typed_csv(os.path.join(ns_ew_dir_path, 'tricks_data.csv'), TRICKS_DTYPES)
+        mirror_auctions_df = read_typed_csv(os.path.join(ns_ew_dir_path, 'auctions_data.csv'), AUCTIONS_DTYPES)
+        # mirror information: codes of player and team columns are remapped, other columns are shared
+        mirror_tricks_df = mirror_frame(
+            mirror_tricks_df, dataset='tricks', same_agents=(ew_agent == ns_agent)
+        ).rename(columns=MIRROR_TRICKS_COLUMNS, copy=False)
+        mirror_auctions_df = mirror_frame(mirror_auctions_df, dataset='auctions', same_agents=(ew_agent == ns_agent))
+        tricks_dfs.append(mirror_tricks_df)
+        auctions_dfs.append(mirror_auctions_df)
+
+    # reconcile dataframes (empty ones when agents never played each other)
+    if not tricks_dfs:
+        return empty_typed_frame(AUCTIONS_DTYPES), empty_typed_frame(TRICKS_DTYPES)
+    return concat_frames(auctions_dfs), concat_frames(tricks_dfs)
+
+
+def mirror_frame(df: pd.DataFrame, dataset: str, same_agents: bool) -> pd.DataFrame:
+    mirror_df = df.copy(deep=False)
+    # A = B
+    if same_agents:
+        mirror_df['experiment_id'] = rename_categories(df['experiment_id'], '_mirror')
+    for col in PLAYER_COLUMNS[dataset]:
+        mirror_df[col] = mirror_values(df[col], MIRROR_PLAYER)
+    for col in TEAM_COLUMNS[dataset]:
+        mirror_df[col] = mirror_values(df[col], MIRROR_TEAM)
+    return mirror_df
+
+
+def prepare_deals_dataset(ew_agent: str, ns_agent: str) -> pd.DataFrame:
+    deals_df = pd.DataFrame()
+
+    ew_ns_deals_path = os.path.join(DATA_PATH, f'{ew_agent}-vs-{ns_agent}', 'deals_data.csv')
+    ns_ew_deals_path = os.path.join(DATA_PATH, f'{ns_agent}-vs-{ew_agent}', 'deals_data.csv')
+
+    # standard format (A vs B)
+    if os.path.exists(ew_ns_deals_path):
+        deals_df = pd.read_csv(ew_ns_deals_path, sep=';', header='infer')
+
+    # mirror format (B vs A)
+    if os.path.exists(ns_ew_deals_path):
+        mirror_deals_df = pd.read_csv(ns_ew_deals_path, sep=';', header='infer')
         # A = B
         if ew_agent == ns_agent:
-            mirror_tricks_df['experiment_id'] = mirror_tricks_df['experiment_id'] + '_mirror'
-            mirror_auctions_df['experiment_id'] = mirror_auctions_df['experiment_id'] + '_mirror'
-        # mirror information
-        for col in PLAYER_COLUMNS['tricks']:
-            mirror_tricks_df[col] = mirror_tricks_df[col].apply(lambda p: MIRROR_PLAYER.get(p))
-        for col in TEAM_COLUMNS['tricks']:
-            mirror_tricks_df[col] = mirror_tricks_df[col].apply(lambda t: MIRROR_TEAM.get(t))
-        mirror_tricks_df = mirror_tricks_df.rename(columns=MIRROR_TRICKS_COLUMNS)
-        for col in PLAYER_COLUMNS['auctions']:
-            mirror_auctions_df[col] = mirror_auctions_df[col].apply(lambda p: MIRROR_PLAYER.get(p))
-        for col in TEAM_COLUMNS['auctions']:
-            mirror_auctions_df[col] = mirror_auctions_df[col].apply(lambda t: MIRROR_TEAM.get(t))
+            mirror_deals_df['experiment_id'] = mirror_deals_df['experiment_id'] + '_mirror'
+        # mirror information: hand of MIRROR_PLAYER[p] is the former hand of p, i.e. hands are rotated by one seat
+        mirror_deals_df['first_player'] = mirror_deals_df['first_player'].map(MIRROR_PLAYER)
+        hands = decode_deals(mirror_deals_df['deal']).reshape(len(mirror_deals_df), 4, -1)
+        mirror_deals_df['deal'] = [codes.tobytes().hex() for codes in np.roll(hands, shift=1, axis=1)]
         # reconcile dataframes
-        tricks_df = pd.concat([tricks_df, mirror_tricks_df])
-        auctions_df = pd.concat([auctions_df, mirror_auctions_df])
+        deals_df = pd.concat([deals_df, mirror_deals_df])
 
-    return auctions_df, tricks_df
+    return deals_df
 
 
 def compute_confidence_intervals(
@@ -102,179 +163,516 @@ def compute_confidence_intervals(
     return inf_threshold, sup_threshold
 
 
-def compute_pc_games_won(tricks_df: pd.DataFrame, team: str) -> Tuple[float, int]:
-    nb_games = len(pd.unique(tricks_df['experiment_id'] + '-' + tricks_df['game_id'].astype(str)))
-    nb_won_games = tricks_df[tricks_df['game_winners'] == team].shape[0]
-    return nb_won_games / nb_games, nb_games
-
-
-def compute_pc_rounds_won(tricks_df: pd.DataFrame, auctions_df: pd.DataFrame, team: str) -> Tuple[float, int]:
-    nb_rounds = len(
-        pd.unique(
-            tricks_df['experiment_id']
-            + '-' + tricks_df['game_id'].astype(str)
-            + '-' + tricks_df['round_id'].astype(str)
-        )
-    )
-    round_end_df = tricks_df[tricks_df['is_last_in_round']]
-    contractor_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(
-        ['experiment_id', 'game_id', 'round_id'], keep='last'
-    )[['experiment_id', 'game_id', 'round_id', 'player']]
-    contractor_df = contractor_df.rename(
-        columns={'experiment_id': 'experiment_id_', 'game_id': 'game_id_', 'round_id': 'round_id_', 'player': 'player_'}
-    )
-    round_end_with_contract_df = round_end_df.merge(
-        right=contractor_df,
-        how='inner',
-        left_on=['experiment_id', 'game_id', 'round_id'],
-        right_on=['experiment_id_', 'game_id_', 'round_id_']
+def is_win_rate_resolved(estimator: float, nb_samples: int, required_confidence_level: float) -> bool:
+    """win rate is resolved when its confidence interval does not contain 50% anymore"""
+    if nb_samples == 0:
+        return False
+    inf_threshold, sup_threshold = compute_confidence_intervals(
+        estimator=estimator, nb_samples=nb_samples, required_confidence_level=required_confidence_level
     )
+    return (inf_threshold > 0.5) or (sup_threshold < 0.5)
 
-    def round_won(row, team):
-        if row['contract_reached']:
-            return PLAYER_TO_TEAM[row['player_']] == team
-        else:
-            return PLAYER_TO_TEAM[row['player_']] != team
-    nb_won_rounds = round_end_with_contract_df[
-        round_end_with_contract_df.apply(lambda row: round_won(row, team), axis=1)
-    ].shape[0]
 
-    return nb_won_rounds / nb_rounds, nb_rounds
+# ONE-PASS METRICS
+# Rather than filtering and merging tricks_df / auctions_df for every indicator, reports and heatmaps derive
+# the facts of a dataset once (one row per round, one per game) and compute every indicator from them.
+ROUND_KEYS = ['experiment_id', 'game_id', 'round_id']
+GAME_KEYS = ['experiment_id', 'game_id']
+OTHER_TEAM = {'east/west': 'north/south', 'north/south': 'east/west'}
 
 
-def compute_pc_tricks_won(tricks_df: pd.DataFrame, team: str) -> Tuple[float, int]:
-    nb_tricks = len(
-        pd.unique(
-            tricks_df['experiment_id']
-            + '-' + tricks_df['game_id'].astype(str)
-            + '-' + tricks_df['round_id'].astype(str)
-            + '-' + tricks_df['trick_id'].astype(str)
-        )
-    )
-    trick_end_df = tricks_df[tricks_df['is_last_in_trick']]
-    nb_won_tricks = trick_end_df[
-        trick_end_df.apply(lambda row: PLAYER_TO_TEAM[row['trick_winner']] == team, axis=1)
-    ].shape[0]
-
-    return nb_won_tricks / nb_tricks, nb_tricks
-
-
-def compute_pc_contracted_rounds(auctions_df: pd.DataFrame, team: str) -> Tuple[float, int]:
-    nb_rounds = len(
-        pd.unique(
-            auctions_df['experiment_id']
-            + '-' + auctions_df['game_id'].astype(str)
-            + '-' + auctions_df['round_id'].astype(str)
-        )
-    )
-    contractor_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(
-        ['experiment_id', 'game_id', 'round_id'], keep='last'
-    )
-    nb_contracted_rounds = contractor_df[
-        contractor_df.apply(lambda row: PLAYER_TO_TEAM[row['player']] == team, axis=1)
-    ].shape[0]
-
-    return nb_contracted_rounds / nb_rounds, nb_rounds
+class DatasetFacts(NamedTuple):
+    # one row per round (of auctions_df or tricks_df): contractor, contract_team, contract (of the last bet),
+    # played (round end is in tricks_df), reached, <team>_points, belote_team, round_winners, <team>_tricks,
+    # nb_tricks (of tricks_df), auctioned (round is in auctions_df)
+    rounds: pd.DataFrame
+    # one row per game: finished, game_winners, <team>_score
+    games: pd.DataFrame
 
 
-def compute_pc_contracted_rounds_won(
-        tricks_df: pd.DataFrame, auctions_df: pd.DataFrame, team: str) -> Tuple[float, int]:
-    contractor_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(
-        ['experiment_id', 'game_id', 'round_id'], keep='last'
-    )[['experiment_id', 'game_id', 'round_id', 'player']]
-    contracted_df = contractor_df[
-        contractor_df.apply(lambda row: PLAYER_TO_TEAM[row['player']] == team, axis=1)
+def build_dataset_facts(tricks_df: pd.DataFrame, auctions_df: pd.DataFrame) -> DatasetFacts:
+    rounds = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(ROUND_KEYS, keep='last')[
+        ROUND_KEYS + ['player', 'value']
+    ].rename(columns={'player': 'contractor', 'value': 'contract'})
+    rounds['contract_team'] = rounds['contractor'].map(PLAYER_TO_TEAM)
+    round_ends = tricks_df[tricks_df['is_last_in_round']][
+        ROUND_KEYS + ['east/west_points', 'north/south_points', 'contract_reached', 'belote_team']
     ]
-    nb_contracted_rounds = contracted_df.shape[0]
-
-    round_end_df = tricks_df[tricks_df['is_last_in_round']]
-    contracted_df = contracted_df.rename(
-        columns={'experiment_id': 'experiment_id_', 'game_id': 'game_id_', 'round_id': 'round_id_', 'player': 'player_'}
-    )
-    round_end_with_contracted_df = round_end_df.merge(
-        right=contracted_df,
-        how='inner',
-        left_on=['experiment_id', 'game_id', 'round_id'],
-        right_on=['experiment_id_', 'game_id_', 'round_id_']
+    trick_ends = tricks_df[tricks_df['is_last_in_trick']]
+    tricks_won = trick_ends.assign(
+        east_west_trick=is_team_player(trick_ends['trick_winner'], 'east/west')
+    ).groupby(ROUND_KEYS, observed=True)['east_west_trick'].agg(['sum', 'size']).reset_index()
+    tricks_won = tricks_won.rename(columns={'sum': 'east/west_tricks'})
+    tricks_won['north/south_tricks'] = tricks_won['size'] - tricks_won['east/west_tricks']
+    nb_tricks = tricks_df[ROUND_KEYS + ['trick_id']].drop_duplicates().groupby(
+        ROUND_KEYS, observed=True
+    ).size().rename('nb_tricks').reset_index()
+    auctioned = auctions_df[ROUND_KEYS].drop_duplicates().assign(auctioned=True)
+    rounds = rounds.merge(round_ends.assign(played=True), how='outer', on=ROUND_KEYS).merge(
+        tricks_won.drop(columns='size'), how='outer', on=ROUND_KEYS
+    ).merge(nb_tricks, how='outer', on=ROUND_KEYS).merge(auctioned, how='outer', on=ROUND_KEYS)
+    rounds['played'] = rounds['played'].eq(True)
+    rounds['auctioned'] = rounds['auctioned'].eq(True)
+    count_columns = ['east/west_tricks', 'north/south_tricks', 'nb_tricks']
+    rounds[count_columns] = rounds[count_columns].fillna(0).astype(int)
+    rounds['reached'] = rounds['played'] & rounds['contract_reached'].fillna(False).astype(bool)
+    rounds['round_winners'] = np.where(
+        rounds['played'] & rounds['contract_team'].notna(),
+        np.where(rounds['reached'], rounds['contract_team'], rounds['contract_team'].map(OTHER_TEAM)),
+        None
     )
-    nb_contracted_rounds_won = round_end_with_contracted_df[round_end_with_contracted_df['contract_reached']].shape[0]
-
-    return nb_contracted_rounds_won / nb_contracted_rounds, nb_contracted_rounds
-
+    rounds = rounds.drop(columns='contract_reached')
 
-def compute_avg_game_score(tricks_df: pd.DataFrame, team: str) -> float:
-    return tricks_df[tricks_df['is_last_in_game']][f'{team}_score'].mean()
-
-
-def compute_avg_contract(auctions_df: pd.DataFrame, team: str) -> float:
-    contractor_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(
-        ['experiment_id', 'game_id', 'round_id'], keep='last'
-    )
-    contracted_df = contractor_df[
-        contractor_df.apply(lambda row: PLAYER_TO_TEAM[row['player']] == team, axis=1)
+    game_ends = tricks_df[tricks_df['is_last_in_game']][
+        GAME_KEYS + ['game_winners', 'east/west_score', 'north/south_score']
     ]
-    return contracted_df['value'].mean()
-
-
-def compute_avg_positive_margin(auctions_df: pd.DataFrame, tricks_df: pd.DataFrame, team: str) -> float:
-    contractor_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(
-        ['experiment_id', 'game_id', 'round_id'], keep='last'
-    )
-    contracted_df = contractor_df[
-        contractor_df.apply(lambda row: PLAYER_TO_TEAM[row['player']] == team, axis=1)
-    ][['experiment_id', 'game_id', 'round_id', 'player']]
-    contracted_df = contracted_df.rename(
-        columns={'experiment_id': 'experiment_id_', 'game_id': 'game_id_', 'round_id': 'round_id_', 'player': 'player_'}
-    )
-    succeeded_round_end_df = tricks_df[tricks_df['is_last_in_round'] & tricks_df['contract_reached']]
-    succeeded_round_end_with_contracted_df = succeeded_round_end_df.merge(
-        right=contracted_df,
-        how='inner',
-        left_on=['experiment_id', 'game_id', 'round_id'],
-        right_on=['experiment_id_', 'game_id_', 'round_id_']
-    )
-
-    return succeeded_round_end_with_contracted_df.apply(
-        lambda row: row[f'{team}_points'] - row['contract'], axis=1
-    ).mean()
-
+    games = tricks_df[GAME_KEYS].drop_duplicates().merge(game_ends, how='left', on=GAME_KEYS)
+    games.insert(len(GAME_KEYS), 'finished', games['game_winners'].notna())
+
+    return DatasetFacts(rounds=rounds, games=games)
+
+
+INDICATORS = [
+    'pc_games_won', 'pc_rounds_won', 'pc_tricks_won', 'pc_contracted_rounds', 'pc_contracted_rounds_won',
+    'avg_game_score', 'avg_contract', 'avg_positive_margin', 'avg_negative_margin',
+]
+ROUND_INDICATORS = [
+    'pc_rounds_won', 'pc_tricks_won', 'pc_contracted_rounds', 'pc_contracted_rounds_won',
+    'avg_contract', 'avg_positive_margin', 'avg_negative_margin',
+]
+GAME_INDICATORS = ['pc_games_won', 'avg_game_score']
+
+
+def get_contributions(facts: DatasetFacts, team: str) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    (total, count) of every round (for ROUND_INDICATORS) or every game (for GAME_INDICATORS):
+    an indicator is the sum of its totals over the sum of its counts
+    """
+    rounds, games = facts.rounds, facts.games
+    contracted = (rounds['contract_team'] == team).to_numpy()
+    reached = contracted & rounds['reached'].to_numpy()
+    failed = contracted & rounds['played'].to_numpy() & ~reached
+    contracts = rounds['contract'].to_numpy(dtype=float)
+    margins = rounds[f'{team}_points'].to_numpy(dtype=float) - contracts
+    game_scores = games[f'{team}_score'].to_numpy(dtype=float)
+    has_contract = contracted & ~np.isnan(contracts)
+    has_positive_margin = reached & ~np.isnan(margins)
+    has_negative_margin = failed & ~np.isnan(margins)
+    has_game_score = games['finished'].to_numpy() & ~np.isnan(game_scores)
+    return {
+        'pc_games_won': ((games['game_winners'] == team).to_numpy(), np.ones(len(games), dtype=bool)),
+        'pc_rounds_won': ((rounds['round_winners'] == team).to_numpy(), rounds['nb_tricks'].to_numpy() > 0),
+        'pc_tricks_won': (rounds[f'{team}_tricks'].to_numpy(), rounds['nb_tricks'].to_numpy()),
+        'pc_contracted_rounds': (contracted, rounds['auctioned'].to_numpy()),
+        'pc_contracted_rounds_won': (reached, contracted),
+        'avg_game_score': (np.where(has_game_score, game_scores, 0.), has_game_score),
+        'avg_contract': (np.where(has_contract, contracts, 0.), has_contract),
+        'avg_positive_margin': (np.where(has_positive_margin, margins, 0.), has_positive_margin),
+        'avg_negative_margin': (np.where(has_negative_margin, -margins, 0.), has_negative_margin),
+    }
+
+
+def aggregate_indicators(facts: DatasetFacts, team: str) -> Dict[str, Tuple[float, int]]:
+    """(total, count) of every indicator: aggregates of disjoint sets of games are summed (cf merge_aggregates)"""
+    return {
+        name: (totals.sum(), counts.sum()) for (name, (totals, counts)) in get_contributions(facts, team).items()
+    }
+
+
+def aggregate_indicators_by(
+        facts: DatasetFacts, team: str, keys: List[str]
+) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """
+    keys of every group of rounds / games (one row per group), with the totals and counts of every indicator
+    (columns, in INDICATORS order) for every group
+    """
+    unit_keys = pd.concat([facts.rounds[keys], facts.games[keys]], ignore_index=True).astype(object)
+    units = unit_keys.groupby(keys, sort=False).ngroup().to_numpy()
+    round_units, game_units = units[:len(facts.rounds)], units[len(facts.rounds):]
+    nb_units = units.max() + 1 if len(units) else 0
+    contributions = get_contributions(facts, team)
+    totals = np.empty((nb_units, len(INDICATORS)))
+    counts = np.empty((nb_units, len(INDICATORS)))
+    for (column, name) in enumerate(INDICATORS):
+        name_units = round_units if name in ROUND_INDICATORS else game_units
+        totals[:, column] = np.bincount(name_units, weights=contributions[name][0], minlength=nb_units)
+        counts[:, column] = np.bincount(name_units, weights=contributions[name][1], minlength=nb_units)
+    return unit_keys.drop_duplicates().reset_index(drop=True), totals, counts
+
+
+def merge_aggregates(
+        aggregates: Dict[str, Tuple[float, int]], other_aggregates: Dict[str, Tuple[float, int]]
+) -> Dict[str, Tuple[float, int]]:
+    return {
+        name: (aggregates[name][0] + other_aggregates[name][0], aggregates[name][1] + other_aggregates[name][1])
+        for name in INDICATORS
+    }
+
+
+def finalize_indicators(aggregates: Dict[str, Tuple[float, int]]) -> Dict[str, Tuple[float, Optional[int]]]:
+    indicators = {}
+    for name in INDICATORS:
+        total, count = aggregates[name]
+        value = float(total) / count if count else np.nan
+        indicators[name] = (value, int(count)) if name.startswith('pc_') else (value, None)
+    return indicators
+
+
+def compute_indicators(facts: DatasetFacts, team: str) -> Dict[str, Tuple[float, Optional[int]]]:
+    """every indicator of generate_report: (value, nb_samples), nb_samples being None for averages"""
+    return finalize_indicators(aggregate_indicators(facts, team))
+
+
+def get_game_deals(deals_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    one row per game of deals_df (cf prepare_deals_dataset): GAME_KEYS and game_deal, its first deal up to a
+    rotation of seats (mirrored experiments deal the same cards one seat further).
+    Games of a deal pool starting with the same deal replay the same deals (cf analysis.deal_pool.PooledGame),
+    whatever their game_id and first_deal; randomly dealt games are (almost surely) alone with their first deal
+    """
+    first_deals_df = deals_df[(deals_df['round_id'] == 0) & (deals_df['deal_id'] == 0)]
+    hands = decode_deals(first_deals_df['deal']).reshape(len(first_deals_df), 4, -1)
+    rotations = [np.roll(hands, shift=shift, axis=1).reshape(len(hands), -1) for shift in range(4)]
+    return pd.DataFrame({
+        'experiment_id': first_deals_df['experiment_id'].astype(str).to_numpy(),
+        'game_id': first_deals_df['game_id'].to_numpy(),
+        'game_deal': [min(rotation[i].tobytes().hex() for rotation in rotations) for i in range(len(hands))],
+    })
+
+
+def add_game_deals(df: pd.DataFrame, game_deals: pd.DataFrame) -> pd.DataFrame:
+    """game_deal of the game of every row, games missing from game_deals getting a deal of their own"""
+    keys_df = df[GAME_KEYS].astype({'experiment_id': str})
+    game_deal = keys_df.merge(game_deals, how='left', on=GAME_KEYS)['game_deal']
+    own_deal = keys_df['experiment_id'] + '/' + keys_df['game_id'].astype(str)
+    return df.assign(game_deal=game_deal.fillna(own_deal).to_numpy())
+
+
+BOOTSTRAP_SAMPLES = 1000
+BOOTSTRAP_BLOCK_SIZE = 1_000_000  # multiplicities drawn at once (about 8 MB per matrix)
+
+
+def bootstrap_confidence_intervals(
+        facts: DatasetFacts, team: str, confidence_levels: List[float], nb_samples: int = BOOTSTRAP_SAMPLES,
+        game_deals: Optional[pd.DataFrame] = None, seed: int = 0
+) -> Dict[str, Dict[float, Tuple[float, float]]]:
+    """
+    percentile bootstrap intervals of every indicator, games being resampled with replacement: resamplings are
+    drawn by blocks, as (block, nb_games) matrices of multiplicities of about BOOTSTRAP_BLOCK_SIZE entries,
+    multiplied by the totals and counts of the games (cf aggregate_indicators_by), i.e. a matrix product per block
+    for all indicators;
+    game_deals (cf get_game_deals): games starting with the same deal are resampled together, e.g. when
+    experiments replay the same deals of a deal pool (cf analysis.deal_pool) in both seats, for duplicated agents
+    or in shards of a work queue; games missing from game_deals are resampled alone
+    """
+    if game_deals is None:
+        _, totals, counts = aggregate_indicators_by(facts, team, keys=GAME_KEYS)
+    else:
+        paired_facts = DatasetFacts(
+            rounds=add_game_deals(facts.rounds, game_deals), games=add_game_deals(facts.games, game_deals)
+        )
+        _, totals, counts = aggregate_indicators_by(paired_facts, team, keys=['game_deal'])
+    nb_units = len(totals)
+    if nb_units == 0:
+        return {name: {level: (np.nan, np.nan) for level in confidence_levels} for name in INDICATORS}
+    rng = np.random.default_rng(seed)
+    block_size = max(1, BOOTSTRAP_BLOCK_SIZE // nb_units)
+    values = np.empty((nb_samples, len(INDICATORS)))
+    for start in range(0, nb_samples, block_size):
+        nb_block_samples = min(block_size, nb_samples - start)
+        # multiplicities of the games drawn in every resampling of the block, counted by a single bincount over
+        # all of them (rows are offset by nb_units), which is much faster than Generator.multinomial
+        draws = rng.integers(0, nb_units, size=(nb_block_samples, nb_units))
+        multiplicities = np.bincount(
+            (draws + nb_units * np.arange(nb_block_samples)[:, None]).ravel(), minlength=nb_block_samples * nb_units
+        ).reshape(nb_block_samples, nb_units).astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values[start:start + nb_block_samples] = (multiplicities @ totals) / (multiplicities @ counts)
+    quantiles = [q for level in confidence_levels for q in ((1 - level) / 2, (1 + level) / 2)]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # indicators without any sample (e.g. no contract)
+        bounds = np.nanquantile(values, quantiles, axis=0)
+    return {
+        name: {level: (bounds[2 * k, column], bounds[2 * k + 1, column]) for (k, level) in enumerate(confidence_levels)}
+        for (column, name) in enumerate(INDICATORS)
+    }
+
+
+_DATASET_FACTS_CACHE: Dict[Tuple, DatasetFacts] = {}
+
+
+def _dataset_signature(ew_agent: str, ns_agent: str) -> Tuple:
+    """files read by prepare_datasets, with their modification time and size"""
+    signature = []
+    for dir_name in [f'{ew_agent}-vs-{ns_agent}', f'{ns_agent}-vs-{ew_agent}']:
+        for file_name in ['tricks_data.csv', 'auctions_data.csv']:
+            path = os.path.join(DATA_PATH, dir_name, file_name)
+            if os.path.exists(path):
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def load_dataset_facts(ew_agent: str, ns_agent: str) -> DatasetFacts:
+    """
+    facts of prepare_datasets(ew_agent, ns_agent), cached until its files change; the cache is per process:
+    workers of a pool (cf compute_heatmap_matrices) start empty and only share the parsed files cached on disk
+    (cf read_typed_csv)
+    """
+    key = (ew_agent, ns_agent, _dataset_signature(ew_agent, ns_agent))
+    if key not in _DATASET_FACTS_CACHE:
+        auctions_df, tricks_df = prepare_datasets(ew_agent=ew_agent, ns_agent=ns_agent)
+        _DATASET_FACTS_CACHE[key] = build_dataset_facts(tricks_df=tricks_df, auctions_df=auctions_df)
+    return _DATASET_FACTS_CACHE[key]
+
+
+# STREAMING METRICS
+# Datasets larger than memory are read by chunks of rows (cf iter_typed_csv), regrouped so that every game is
+# whole in a single chunk: the facts of a chunk are then those of its games, and the aggregates of the chunks
+# (cf aggregate_indicators) are summed. Peak memory is bounded by the chunk size (plus the rows of one game).
+# Rows of a game are contiguous and games are in the same order in auctions and tricks files
+# (cf analysis.experiment.run_experiment, which writes whole games).
+STREAMING_CHUNKSIZE = 1_000_000
+
+
+def get_game_mask(df: pd.DataFrame, game: Tuple) -> pd.Series:
+    experiment_id, game_id = game
+    return (df['experiment_id'] == experiment_id) & (df['game_id'] == game_id)
+
+
+def iter_whole_games(chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    """chunks whose last game is held back and prepended to the next chunk, so that no game is split"""
+    held_back_df = None
+    for chunk in chunks:
+        if held_back_df is not None:
+            chunk = concat_frames([held_back_df, chunk])
+        if chunk.empty:
+            continue
+        other_games_positions = np.flatnonzero(~get_game_mask(chunk, tuple(chunk[GAME_KEYS].iloc[-1])).to_numpy())
+        split = other_games_positions[-1] + 1 if len(other_games_positions) else 0
+        if split > 0:
+            yield chunk.iloc[:split]
+        held_back_df = chunk.iloc[split:]
+    if (held_back_df is not None) and not held_back_df.empty:
+        yield held_back_df
+
+
+def iter_aligned_chunks(
+        auctions_chunks: Iterable[pd.DataFrame], tricks_chunks: Iterable[pd.DataFrame]
+) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    (auctions_df, tricks_df) of the same games, from chunks of whole games (cf iter_whole_games);
+    auctions of games following the last game of tricks (i.e. without tricks) are ignored
+    """
+    auctions_chunks = iter(auctions_chunks)
+    auctions_buffer_df = pd.DataFrame(columns=GAME_KEYS)
+    for tricks_df in tricks_chunks:
+        last_game = tuple(tricks_df[GAME_KEYS].iloc[-1])
+        while not get_game_mask(auctions_buffer_df, last_game).any():
+            auctions_df = next(auctions_chunks, None)
+            if auctions_df is None:
+                break
+            auctions_buffer_df = concat_frames([auctions_buffer_df, auctions_df])
+        last_game_positions = np.flatnonzero(get_game_mask(auctions_buffer_df, last_game).to_numpy())
+        split = last_game_positions[-1] + 1 if len(last_game_positions) else len(auctions_buffer_df)
+        yield auctions_buffer_df.iloc[:split], tricks_df
+        auctions_buffer_df = auctions_buffer_df.iloc[split:]
+
+
+def iter_dataset_chunks(
+        ew_agent: str, ns_agent: str, chunksize: int = STREAMING_CHUNKSIZE
+) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """(auctions_df, tricks_df) of prepare_datasets(ew_agent, ns_agent), by chunks of whole games"""
+    for (dir_name, mirror) in [(f'{ew_agent}-vs-{ns_agent}', False), (f'{ns_agent}-vs-{ew_agent}', True)]:
+        dir_path = os.path.join(DATA_PATH, dir_name)
+        if not os.path.exists(os.path.join(dir_path, 'tricks_data.csv')):
+            continue
+        aligned_chunks = iter_aligned_chunks(
+            auctions_chunks=iter_whole_games(
+                iter_typed_csv(os.path.join(dir_path, 'auctions_data.csv'), AUCTIONS_DTYPES, chunksize=chunksize)
+            ),
+            tricks_chunks=iter_whole_games(
+                iter_typed_csv(os.path.join(dir_path, 'tricks_data.csv'), TRICKS_DTYPES, chunksize=chunksize)
+            )
+        )
+        for (auctions_df, tricks_df) in aligned_chunks:
+            if mirror:
+                auctions_df = mirror_frame(auctions_df, dataset='auctions', same_agents=(ew_agent == ns_agent))
+                tricks_df = mirror_frame(
+                    tricks_df, dataset='tricks', same_agents=(ew_agent == ns_agent)
+                ).rename(columns=MIRROR_TRICKS_COLUMNS, copy=False)
+            yield auctions_df, tricks_df
+
+
+def stream_indicators(
+        ew_agent: str, ns_agent: str, team: str, chunksize: int = STREAMING_CHUNKSIZE
+) -> Dict[str, Tuple[float, Optional[int]]]:
+    """compute_indicators of the dataset of ew_agent vs ns_agent, read by chunks of chunksize rows"""
+    aggregates = {name: (0, 0) for name in INDICATORS}
+    for (auctions_df, tricks_df) in iter_dataset_chunks(ew_agent=ew_agent, ns_agent=ns_agent, chunksize=chunksize):
+        facts = build_dataset_facts(tricks_df=tricks_df, auctions_df=auctions_df)
+        aggregates = merge_aggregates(aggregates, aggregate_indicators(facts, team=team))
+    return finalize_indicators(aggregates)
+
+
+# INCREMENTAL METRICS
+# Data files are append-only, and the nb_games of an experiment in config_data.csv is updated once its games are
+# written (cf analysis.experiment.save_and_flush_data). The metrics state of a data directory (metrics_state.json)
+# holds the aggregates (cf aggregate_indicators) of every experiment for both teams, and the watermarks of the data
+# files: byte offsets up to which rows are folded in. A refresh only parses the rows after the watermarks, up to
+# the first row of a game not written yet: its cost is proportional to new data.
+METRICS_STATE_FILE_NAME = 'metrics_state.json'
+METRICS_STATE_VERSION = 1
+TEAMS = ['east/west', 'north/south']
+
+
+class AppendedRows:
+    """rows of a data file after a byte offset, read by chunks, offset following the rows read"""
+
+    def __init__(self, path: str, dtypes: Dict, offset: int):
+        self.path = path
+        self.dtypes = dtypes
+        self.offset = offset
+        self.columns = read_csv_header(path)
+
+    def iter_chunks(self, written_games: Dict[str, int], chunksize: int) -> Iterator[pd.DataFrame]:
+        """
+        rows of written games (game_id < written_games of their experiment, every game of an unknown experiment),
+        up to the first row of a game not written yet or of a partially written line
+        """
+        with open(self.path, 'rb') as f:
+            if self.offset == 0:
+                self.offset = len(f.readline())  # header
+            f.seek(self.offset)
+            while True:
+                lines = list(islice(f, chunksize))
+                is_partial = bool(lines) and not lines[-1].endswith(b'\n')
+                if is_partial:
+                    lines = lines[:-1]
+                if not lines:
+                    return
+                df = parse_typed_lines(lines, self.columns, self.dtypes)
+                written_games_of_rows = df['experiment_id'].astype(object).map(written_games).fillna(np.inf)
+                is_written = (df['game_id'] < written_games_of_rows).to_numpy()
+                nb_written_rows = len(df) if is_written.all() else int(np.argmin(is_written))
+                if nb_written_rows > 0:
+                    self.offset += sum(len(line) for line in lines[:nb_written_rows])
+                    yield df.iloc[:nb_written_rows]
+                if is_partial or (nb_written_rows < len(df)):
+                    return
+
+
+def load_metrics_state(dir_path: str) -> Dict:
+    """state of the data directory, a new one when there is none or when its files have been rewritten"""
+    path = os.path.join(dir_path, METRICS_STATE_FILE_NAME)
+    if os.path.exists(path):
+        with open(path) as f:
+            state = json.load(f)
+        if (state['version'] == METRICS_STATE_VERSION) and all(
+                os.path.getsize(os.path.join(dir_path, file_name)) >= offset
+                for (file_name, offset) in state['offsets'].items()
+        ):
+            return state
+    return {
+        'version': METRICS_STATE_VERSION,
+        'offsets': {'auctions_data.csv': 0, 'tricks_data.csv': 0},
+        'experiments': {},  # experiment_id: {'nb_games': ..., 'aggregates': {team: {indicator: [total, count]}}}
+    }
+
+
+class AppendedDataset:
+    """written games of a data directory after watermarks (byte offsets of its data files, cf AppendedRows)"""
+
+    def __init__(self, dir_path: str, offsets: Dict[str, int]):
+        config_df = pd.read_csv(os.path.join(dir_path, 'config_data.csv'), sep=';', dtype={'experiment_id': str})
+        self.written_games = dict(zip(config_df['experiment_id'], config_df['nb_games']))
+        self.auctions_rows = AppendedRows(
+            os.path.join(dir_path, 'auctions_data.csv'), AUCTIONS_DTYPES, offsets.get('auctions_data.csv', 0)
+        )
+        self.tricks_rows = AppendedRows(
+            os.path.join(dir_path, 'tricks_data.csv'), TRICKS_DTYPES, offsets.get('tricks_data.csv', 0)
+        )
 
-def compute_avg_negative_margin(auctions_df: pd.DataFrame, tricks_df: pd.DataFrame, team: str) -> float:
-    contractor_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(
-        ['experiment_id', 'game_id', 'round_id'], keep='last'
-    )
-    contracted_df = contractor_df[
-        contractor_df.apply(lambda row: PLAYER_TO_TEAM[row['player']] == team, axis=1)
-    ][['experiment_id', 'game_id', 'round_id', 'player']]
-    contracted_df = contracted_df.rename(
-        columns={'experiment_id': 'experiment_id_', 'game_id': 'game_id_', 'round_id': 'round_id_', 'player': 'player_'}
-    )
-    round_end_df = tricks_df[tricks_df['is_last_in_round']]
-    failed_round_end_df = round_end_df[~round_end_df['contract_reached'].astype(bool)]
-    failed_round_end_with_contracted_df = failed_round_end_df.merge(
-        right=contracted_df,
-        how='inner',
-        left_on=['experiment_id', 'game_id', 'round_id'],
-        right_on=['experiment_id_', 'game_id_', 'round_id_']
-    )
+    @property
+    def offsets(self) -> Dict[str, int]:
+        return {'auctions_data.csv': self.auctions_rows.offset, 'tricks_data.csv': self.tricks_rows.offset}
 
-    return failed_round_end_with_contracted_df.apply(
-        lambda row: row['contract'] - row[f'{team}_points'], axis=1
-    ).mean()
+    def iter_facts(self, chunksize: int = STREAMING_CHUNKSIZE) -> Iterator[DatasetFacts]:
+        """facts of the appended games, by chunks of whole games (offsets follow the rows read)"""
+        aligned_chunks = iter_aligned_chunks(
+            auctions_chunks=iter_whole_games(self.auctions_rows.iter_chunks(self.written_games, chunksize=chunksize)),
+            tricks_chunks=iter_whole_games(self.tricks_rows.iter_chunks(self.written_games, chunksize=chunksize))
+        )
+        for (auctions_df, tricks_df) in aligned_chunks:
+            yield build_dataset_facts(tricks_df=tricks_df, auctions_df=auctions_df)
+
+
+def refresh_metrics_state(dir_path: str, chunksize: int = STREAMING_CHUNKSIZE) -> Dict:
+    """state of the data directory, once the games written since its last refresh are folded in"""
+    state = load_metrics_state(dir_path)
+    dataset = AppendedDataset(dir_path, state['offsets'])
+    for facts in dataset.iter_facts(chunksize=chunksize):
+        for (experiment_id, nb_games) in facts.games['experiment_id'].astype(object).value_counts().items():
+            experiment = state['experiments'].setdefault(experiment_id, {
+                'nb_games': 0,
+                'aggregates': {team: {name: [0, 0] for name in INDICATORS} for team in TEAMS},
+            })
+            experiment['nb_games'] += int(nb_games)
+        for team in TEAMS:
+            units, totals, counts = aggregate_indicators_by(facts, team, keys=['experiment_id'])
+            for (experiment_id, experiment_totals, experiment_counts) in zip(units['experiment_id'], totals, counts):
+                aggregates = state['experiments'][experiment_id]['aggregates'][team]
+                for (name, total, count) in zip(INDICATORS, experiment_totals, experiment_counts):
+                    aggregates[name] = [aggregates[name][0] + float(total), aggregates[name][1] + int(count)]
+
+    if dataset.offsets != state['offsets']:
+        state['offsets'] = dataset.offsets
+        # every process writes its own temporary file: readers never see a partially written state, and the last
+        # of concurrent refreshes wins (every state is consistent with its offsets)
+        fd, tmp_path = tempfile.mkstemp(dir=dir_path, prefix=f'{METRICS_STATE_FILE_NAME}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, os.path.join(dir_path, METRICS_STATE_FILE_NAME))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return state
+
+
+def load_incremental_indicators(
+        ew_agent: str, ns_agent: str, team: str, chunksize: int = STREAMING_CHUNKSIZE
+) -> Dict[str, Tuple[float, Optional[int]]]:
+    """compute_indicators of prepare_datasets(ew_agent, ns_agent), from the refreshed states of its directories"""
+    aggregates = {name: (0, 0) for name in INDICATORS}
+    # mirrored directory: its players are moved one seat, its team is the other one
+    for (dir_name, dir_team) in [(f'{ew_agent}-vs-{ns_agent}', team), (f'{ns_agent}-vs-{ew_agent}', OTHER_TEAM[team])]:
+        dir_path = os.path.join(DATA_PATH, dir_name)
+        if not os.path.exists(os.path.join(dir_path, 'tricks_data.csv')):
+            continue
+        for experiment in refresh_metrics_state(dir_path, chunksize=chunksize)['experiments'].values():
+            aggregates = merge_aggregates(aggregates, experiment['aggregates'][dir_team])
+    return finalize_indicators(aggregates)
 
 
 def print_indicator(
         name: str, value: float, percentage: bool = True,
-        nb_samples: Optional[int] = None, confidences: List[float] = []):
+        nb_samples: Optional[int] = None, confidences: List[float] = [],
+        intervals: Optional[Dict[float, Tuple[float, float]]] = None):
+    """intervals (by confidence level, e.g. bootstrap ones) replace the normal approximation of confidences"""
     report = f'{name}: '
     if percentage:
         report += f'{value*100:.2f}%'
     else:
         report += f'{value:.2f}'
-    for confidence in confidences:
-        inf, sup = compute_confidence_intervals(
-            estimator=value, nb_samples=nb_samples, required_confidence_level=confidence
-        )
+    if intervals is None:
+        intervals = {
+            confidence: compute_confidence_intervals(
+                estimator=value, nb_samples=nb_samples, required_confidence_level=confidence
+            )
+            for confidence in confidences
+        }
+    for (confidence, (inf, sup)) in intervals.items():
         if percentage:
             report += f'\n\t{100*confidence}% confidence interval: [{100*inf:.2f}%, {100*sup:.2f}%]'
         else:
@@ -283,96 +681,211 @@ def print_indicator(
     print(report)
 
 
-def generate_report(tricks_df: pd.DataFrame, auctions_df: pd.DataFrame, team: str, detailed=True):
-    # Compute indicators
-    pc_games_won, nb_games = compute_pc_games_won(tricks_df=tricks_df, team=team)
-    pc_rounds_won, nb_rounds = compute_pc_rounds_won(tricks_df=tricks_df, auctions_df=auctions_df, team=team)
-    pc_tricks_won, nb_tricks = compute_pc_tricks_won(tricks_df=tricks_df, team=team)
-    pc_contracted_rounds, nb_rounds = compute_pc_contracted_rounds(auctions_df=auctions_df, team=team)
-    pc_contracted_rounds_won, nb_contracted_rounds = compute_pc_contracted_rounds_won(
-        tricks_df=tricks_df, auctions_df=auctions_df, team=team)
-    avg_game_score = compute_avg_game_score(tricks_df=tricks_df, team=team)
-    avg_contract = compute_avg_contract(auctions_df=auctions_df, team=team)
-    avg_positive_margin = compute_avg_positive_margin(tricks_df=tricks_df, auctions_df=auctions_df, team=team)
-    avg_negative_margin = compute_avg_negative_margin(tricks_df=tricks_df, auctions_df=auctions_df, team=team)
+def generate_report(
+        tricks_df: pd.DataFrame, auctions_df: pd.DataFrame, team: str, detailed=True,
+        deals_df: Optional[pd.DataFrame] = None):
+    """
+    detailed: bootstrap confidence intervals of every indicator,
+    games replaying the same deals of deals_df being resampled together (cf bootstrap_confidence_intervals)
+    """
+    facts = build_dataset_facts(tricks_df=tricks_df, auctions_df=auctions_df)
+    game_deals = get_game_deals(deals_df) if deals_df is not None else None
+    intervals = bootstrap_confidence_intervals(
+        facts, team=team, confidence_levels=[0.95, 0.99], game_deals=game_deals
+    ) if detailed else None
+    print_report(compute_indicators(facts, team=team), detailed=detailed, intervals=intervals)
+
+
+def generate_streaming_report(
+        ew_agent: str, ns_agent: str, team: str, detailed=True, chunksize: int = STREAMING_CHUNKSIZE):
+    """
+    generate_report of prepare_datasets(ew_agent, ns_agent), without loading the whole dataset
+    (confidence intervals of percentages only, by normal approximation)
+    """
+    indicators = stream_indicators(ew_agent=ew_agent, ns_agent=ns_agent, team=team, chunksize=chunksize)
+    print_report(indicators, detailed=detailed)
+
+
+def print_report(
+        indicators: Dict[str, Tuple[float, Optional[int]]], detailed=True,
+        intervals: Optional[Dict[str, Dict[float, Tuple[float, float]]]] = None):
+    """intervals: by indicator, cf bootstrap_confidence_intervals"""
+    intervals = intervals or {}
+    pc_games_won, nb_games = indicators['pc_games_won']
+    pc_rounds_won, nb_rounds = indicators['pc_rounds_won']
+    pc_tricks_won, nb_tricks = indicators['pc_tricks_won']
+    pc_contracted_rounds, nb_rounds = indicators['pc_contracted_rounds']
+    pc_contracted_rounds_won, nb_contracted_rounds = indicators['pc_contracted_rounds_won']
+    avg_game_score = indicators['avg_game_score'][0]
+    avg_contract = indicators['avg_contract'][0]
+    avg_positive_margin = indicators['avg_positive_margin'][0]
+    avg_negative_margin = indicators['avg_negative_margin'][0]
 
     confidences = [0.95, 0.99] if detailed else []
 
     # Print reports
     print(f'\t>> Analysis based on {nb_games} games <<')
     print_indicator(
-        name='Games won', value=pc_games_won, percentage=True, nb_samples=nb_games, confidences=confidences)
+        name='Games won', value=pc_games_won, percentage=True, nb_samples=nb_games, confidences=confidences,
+        intervals=intervals.get('pc_games_won'))
     print_indicator(
-        name='Rounds won', value=pc_rounds_won, percentage=True, nb_samples=nb_rounds, confidences=confidences)
+        name='Rounds won', value=pc_rounds_won, percentage=True, nb_samples=nb_rounds, confidences=confidences,
+        intervals=intervals.get('pc_rounds_won'))
     print_indicator(
-        name='Tricks won', value=pc_tricks_won, percentage=True, nb_samples=nb_tricks, confidences=confidences)
+        name='Tricks won', value=pc_tricks_won, percentage=True, nb_samples=nb_tricks, confidences=confidences,
+        intervals=intervals.get('pc_tricks_won'))
     print_indicator(
         name='Contracted rounds', value=pc_contracted_rounds, percentage=True, nb_samples=nb_rounds,
-        confidences=confidences)
+        confidences=confidences, intervals=intervals.get('pc_contracted_rounds'))
     print_indicator(
         name='Contracted rounds won', value=pc_contracted_rounds_won,
-        percentage=True, nb_samples=nb_contracted_rounds, confidences=confidences)
-    print_indicator(name='Average game score', value=avg_game_score, percentage=False)
-    print_indicator(name='Average contract', value=avg_contract, percentage=False)
-    print_indicator(name='Average positive margin', value=avg_positive_margin, percentage=False)
-    print_indicator(name='Average negative margin', value=avg_negative_margin, percentage=False)
-
-
-def generate_heatmaps(agents: List[str], dir_path: str, min_games=1000):
+        percentage=True, nb_samples=nb_contracted_rounds, confidences=confidences,
+        intervals=intervals.get('pc_contracted_rounds_won'))
+    print_indicator(
+        name='Average game score', value=avg_game_score, percentage=False, intervals=intervals.get('avg_game_score'))
+    print_indicator(
+        name='Average contract', value=avg_contract, percentage=False, intervals=intervals.get('avg_contract'))
+    print_indicator(
+        name='Average positive margin', value=avg_positive_margin, percentage=False,
+        intervals=intervals.get('avg_positive_margin'))
+    print_indicator(
+        name='Average negative margin', value=avg_negative_margin, percentage=False,
+        intervals=intervals.get('avg_negative_margin'))
+
+
+def _init_heatmap_worker(data_path: str):
+    # workers read the datasets of the parent process, even when they are not forked from it
+    global DATA_PATH
+    DATA_PATH = data_path
+
+
+def compute_pair_indicators(
+        task: Tuple[str, str, str, Optional[int], Optional[float], bool, bool]
+) -> Tuple[str, str, Tuple[Tuple[float, Optional[int]], ...], Optional[Dict[str, Tuple[float, float]]]]:
+    """
+    indicators of agent_A (as team) vs agent_B, in INDICATORS order (compact result of a worker),
+    with the bootstrap intervals of the percentages at bootstrap_confidence when given;
+    round_sampling: pc_games_won is estimated from the round scores instead (cf estimate_games_won)
+    """
+    agent_A, agent_B, team, chunksize, bootstrap_confidence, incremental, round_sampling = task
+    intervals = None
+    if incremental:
+        indicators = load_incremental_indicators(
+            ew_agent=agent_A, ns_agent=agent_B, team=team, chunksize=chunksize or STREAMING_CHUNKSIZE
+        )
+    elif chunksize is None:
+        facts = load_dataset_facts(ew_agent=agent_A, ns_agent=agent_B)
+        indicators = compute_indicators(facts, team=team)
+        if bootstrap_confidence is not None:
+            intervals = {
+                name: name_intervals[bootstrap_confidence]
+                for (name, name_intervals) in bootstrap_confidence_intervals(
+                    facts, team=team, confidence_levels=[bootstrap_confidence]
+                ).items() if name.startswith('pc_')
+            }
+    else:
+        indicators = stream_indicators(ew_agent=agent_A, ns_agent=agent_B, team=team, chunksize=chunksize)
+    if round_sampling:
+        indicators = {**indicators, 'pc_games_won': estimate_games_won(ew_agent=agent_A, ns_agent=agent_B, team=team)}
+        if intervals is not None:
+            intervals.pop('pc_games_won', None)  # intervals of the games actually played
+    return agent_A, agent_B, tuple(indicators[name] for name in INDICATORS), intervals
+
+
+def estimate_games_won(ew_agent: str, ns_agent: str, team: str) -> Tuple[float, int]:
+    """
+    pc_games_won of team derived from the round scores of the pair, with the number of games they amount to
+    (cf analysis.round_sampling): rounds of sampling experiments count as well as those of full games
+    """
+    from analysis.round_sampling import estimate_pc_games_won, load_round_scores  # imports this module
+    round_scores = load_round_scores(ew_agent=ew_agent, ns_agent=ns_agent, data_path=DATA_PATH)
+    if len(round_scores) == 0:
+        return np.nan, 0
+    pc_games_won, nb_rounds_per_game = estimate_pc_games_won(round_scores, team=team)
+    return pc_games_won, int(len(round_scores) / nb_rounds_per_game)
+
+
+def compute_heatmap_matrices(
+        agents: List[str], min_games=1000, early_stop_confidence: Optional[float] = None,
+        chunksize: Optional[int] = None, bootstrap_confidence: Optional[float] = None,
+        nb_processes: Optional[int] = None, incremental: bool = False, team: str = 'east/west',
+        metrics_db_path: Optional[str] = None, round_sampling: bool = False
+) -> Optional[Dict[str, np.ndarray]]:
+    """
+    (agents x agents) matrix of every indicator, row agent being team; pairs are computed in a pool of nb_processes
+    (all CPUs by default, in this process when 1, which keeps the facts cached; workers of (A, B) and (B, A) read
+    the same directories concurrently, cf read_typed_csv and refresh_metrics_state), or queried from the metrics store
+    at metrics_db_path when given (cf analysis.metrics_store); None when a pair lacks games;
+    round_sampling: games won are estimated from round scores (cf estimate_games_won), min_games then applying to
+    the games these rounds amount to; not with metrics_db_path, whose store holds the games actually played
+    """
+    if round_sampling and metrics_db_path is not None:
+        raise ValueError('round sampling estimates are not stored in the metrics store')
+    tasks = [
+        (agent_A, agent_B, team, chunksize, bootstrap_confidence, incremental, round_sampling)
+        for agent_A in agents for agent_B in agents
+    ]
+    if metrics_db_path is not None:
+        from analysis.metrics_store import connect, query_heatmap_indicators  # imports this module
+        connection = connect(metrics_db_path)
+        try:
+            results = query_heatmap_indicators(connection, agents=agents, team=team)
+        finally:
+            connection.close()
+    elif nb_processes == 1:
+        results = [compute_pair_indicators(task) for task in tasks]
+    else:
+        with Pool(processes=nb_processes, initializer=_init_heatmap_worker, initargs=(DATA_PATH,)) as pool:
+            results = pool.map(compute_pair_indicators, tasks)
+
+    positions = {agent: position for (position, agent) in enumerate(agents)}
+    matrices = {name: np.full((len(agents), len(agents)), np.nan) for name in INDICATORS}
+    for (agent_A, agent_B, indicators, intervals) in results:
+        print(f"{agent_A} vs. {agent_B}")
+        if intervals is not None:
+            for (name, (inf, sup)) in intervals.items():
+                print(f'\t{name}: [{100 * inf:.1f}%, {100 * sup:.1f}%]')
+        pc_games_won_A_B, nb_games_A_B = indicators[INDICATORS.index('pc_games_won')]
+        resolved_A_B = (early_stop_confidence is not None) and is_win_rate_resolved(
+            estimator=pc_games_won_A_B, nb_samples=nb_games_A_B, required_confidence_level=early_stop_confidence
+        )
+        if (nb_games_A_B < min_games) and not resolved_A_B:
+            print(f"WARNING: not enough games between {agent_A} & {agent_B} ({nb_games_A_B} < {min_games})")
+            return None
+        for (name, (value, _)) in zip(INDICATORS, indicators):
+            matrices[name][positions[agent_A], positions[agent_B]] = 100 * value if name.startswith('pc_') else value
+    return matrices
+
+
+def generate_heatmaps(
+        agents: List[str], dir_path: str, min_games=1000, early_stop_confidence: Optional[float] = None,
+        chunksize: Optional[int] = None, bootstrap_confidence: Optional[float] = None,
+        nb_processes: Optional[int] = None, incremental: bool = False, metrics_db_path: Optional[str] = None,
+        round_sampling: bool = False):
+    """
+    datasets are read by chunks of chunksize rows when given (cf stream_indicators), loaded at once otherwise;
+    bootstrap_confidence: bootstrap intervals of the percentages of every cell are printed (datasets loaded at once);
+    incremental: only games written since the last refresh are read (cf load_incremental_indicators);
+    round_sampling: % games won are estimated from round scores (cf analysis.round_sampling);
+    pairs of agents are computed in parallel, or queried from the metrics store (cf compute_heatmap_matrices)
+    """
     # generate data
-    team = "east/west"
-    pc_games_won = []
-    pc_rounds_won = []
-    pc_tricks_won = []
-    pc_contracted_rounds = []
-    pc_contracted_rounds_won = []
-    avg_game_score = []
-    avg_contract = []
-    avg_positive_margin = []
-    avg_negative_margin = []
-    for agent_A in agents:
-        pc_games_won_line = []
-        pc_rounds_won_line = []
-        pc_tricks_won_line = []
-        pc_contracted_rounds_line = []
-        pc_contracted_rounds_won_line = []
-        avg_game_score_line = []
-        avg_contract_line = []
-        avg_positive_margin_line = []
-        avg_negative_margin_line = []
-        for agent_B in agents:
-            print(f"{agent_A} vs. {agent_B}")
-            auctions_df, tricks_df = prepare_datasets(ew_agent=agent_A, ns_agent=agent_B)
-            pc_games_won_A_B, nb_games_A_B = compute_pc_games_won(tricks_df=tricks_df, team=team)
-            if nb_games_A_B < min_games:
-                print(f"WARNING: not enough games between {agent_A} & {agent_B} ({nb_games_A_B} < {min_games})")
-                return None
-            pc_games_won_line.append(100 * pc_games_won_A_B)
-            pc_rounds_won_line.append(
-                100 * compute_pc_rounds_won(tricks_df=tricks_df, auctions_df=auctions_df, team=team)[0]
-            )
-            pc_tricks_won_line.append(100 * compute_pc_tricks_won(tricks_df=tricks_df, team=team)[0])
-            pc_contracted_rounds_line.append(100 * compute_pc_contracted_rounds(auctions_df=auctions_df, team=team)[0])
-            pc_contracted_rounds_won_line.append(
-                100 * compute_pc_contracted_rounds_won(tricks_df=tricks_df, auctions_df=auctions_df, team=team)[0]
-            )
-            avg_game_score_line.append(compute_avg_game_score(tricks_df=tricks_df, team=team))
-            avg_contract_line.append(compute_avg_contract(auctions_df=auctions_df, team=team))
-            avg_positive_margin_line.append(
-                compute_avg_positive_margin(tricks_df=tricks_df, auctions_df=auctions_df, team=team)
-            )
-            avg_negative_margin_line.append(
-                compute_avg_negative_margin(tricks_df=tricks_df, auctions_df=auctions_df, team=team)
-            )
-        pc_games_won.append(pc_games_won_line)
-        pc_rounds_won.append(pc_rounds_won_line)
-        pc_tricks_won.append(pc_tricks_won_line)
-        pc_contracted_rounds.append(pc_contracted_rounds_line)
-        pc_contracted_rounds_won.append(pc_contracted_rounds_won_line)
-        avg_game_score.append(avg_game_score_line)
-        avg_contract.append(avg_contract_line)
-        avg_positive_margin.append(avg_positive_margin_line)
-        avg_negative_margin.append(avg_negative_margin_line)
+    matrices = compute_heatmap_matrices(
+        agents=agents, min_games=min_games, early_stop_confidence=early_stop_confidence, chunksize=chunksize,
+        bootstrap_confidence=bootstrap_confidence, nb_processes=nb_processes, incremental=incremental,
+        metrics_db_path=metrics_db_path, round_sampling=round_sampling
+    )
+    if matrices is None:
+        return None
+    pc_games_won = matrices['pc_games_won']
+    pc_rounds_won = matrices['pc_rounds_won']
+    pc_tricks_won = matrices['pc_tricks_won']
+    pc_contracted_rounds = matrices['pc_contracted_rounds']
+    pc_contracted_rounds_won = matrices['pc_contracted_rounds_won']
+    avg_game_score = matrices['avg_game_score']
+    avg_contract = matrices['avg_contract']
+    avg_positive_margin = matrices['avg_positive_margin']
+    avg_negative_margin = matrices['avg_negative_margin']
 
     # generate graphs
     fig, ((ax, ax2, ax3), (ax4, ax5, ax6), (ax7, ax8, ax9)) = plt.subplots(3, 3, figsize=(11, 9))
@@ -423,6 +936,7 @@ if __name__ == '__main__':
     #
     # auctions_df, tricks_df = prepare_datasets(ew_agent=agent_A, ns_agent=agent_B)
     # generate_report(tricks_df=tricks_df, auctions_df=auctions_df, team=team, detailed=True)
+    # generate_streaming_report(ew_agent=agent_A, ns_agent=agent_B, team=team, detailed=True)  # larger than memory
     generate_heatmaps(
         agents=["RANDOM", "HIGHEST_CARD", "HIGHEST_CARD_W_EXP_BET", "EXPERT_W_HC_BET", "EXPERT"],
         dir_path=HEATMAPS_PATH
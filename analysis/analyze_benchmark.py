@@ -0,0 +1,313 @@
+# Benchmark of the indicators of analysis.analyze on synthetic auctions / tricks tables
+# (same columns and dtypes as the CSV files of analysis.experiment, read back with pandas):
+#   python -m analysis.analyze_benchmark --nb-rounds 100000   (3.2 million tricks rows)
+# Every indicator is computed by its vectorized version and by the former row-wise one (DataFrame.apply),
+# both being kept below as references of analysis.analyze: results are checked to be equal.
+import argparse
+from time import perf_counter
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from analysis.analyze import MIRROR_PLAYER, MIRROR_TEAM, PLAYER_TO_TEAM, count_distinct, is_team_player, mirror_values
+
+PLAYERS = np.array(['west', 'south', 'east', 'north'], dtype=object)
+TEAMS = np.array(['east/west', 'north/south'], dtype=object)
+ROUNDS_PER_GAME = 20
+BIDS_PER_ROUND = 4
+
+
+def build_synthetic_tables(nb_rounds: int, seed: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    round_index = np.arange(nb_rounds)
+
+    # auctions: BIDS_PER_ROUND actions per round, the contractor being the last one to bet
+    bid_round = np.repeat(round_index, BIDS_PER_ROUND)
+    bet = rng.random(len(bid_round)) < 0.4
+    auctions_df = pd.DataFrame({
+        'experiment_id': 'exp',
+        'game_id': bid_round // ROUNDS_PER_GAME,
+        'round_id': bid_round % ROUNDS_PER_GAME,
+        'player': PLAYERS[np.arange(len(bid_round)) % 4],
+        'action': np.where(bet, 'bet', 'pass'),
+        'value': np.where(bet, 80 + 10 * rng.integers(0, 9, len(bid_round)), np.nan),
+    })
+
+    # tricks: 8 tricks of 4 cards per round, end of trick / round / game columns are only filled on last rows
+    row = np.arange(32 * nb_rounds)
+    trick_round = row // 32
+    is_last_in_trick = row % 4 == 3
+    is_last_in_round = row % 32 == 31
+    is_last_in_game = is_last_in_round & ((trick_round % ROUNDS_PER_GAME == ROUNDS_PER_GAME - 1)
+                                          | (trick_round == nb_rounds - 1))
+    east_west_points = rng.integers(0, 163, len(row))
+    tricks_df = pd.DataFrame({
+        'experiment_id': 'exp',
+        'game_id': trick_round // ROUNDS_PER_GAME,
+        'round_id': trick_round % ROUNDS_PER_GAME,
+        'trick_id': (row // 4) % 8,
+        'player': PLAYERS[row % 4],
+        'is_last_in_trick': is_last_in_trick,
+        'trick_winner': np.where(is_last_in_trick, PLAYERS[rng.integers(0, 4, len(row))], None),
+        'is_last_in_round': is_last_in_round,
+        'east/west_points': np.where(is_last_in_round, east_west_points, np.nan),
+        'north/south_points': np.where(is_last_in_round, 162 - east_west_points, np.nan),
+        'belote_team': np.where(is_last_in_round & (rng.random(len(row)) < 0.2),
+                                TEAMS[rng.integers(0, 2, len(row))], None),
+        'contract': np.where(is_last_in_round, 80 + 10 * rng.integers(0, 9, len(row)), np.nan),
+        'contract_reached': np.where(is_last_in_round, rng.random(len(row)) < 0.6, None),
+        'is_last_in_game': is_last_in_game,
+        'game_winners': np.where(is_last_in_game, TEAMS[rng.integers(0, 2, len(row))], None),
+        'east/west_score': np.where(is_last_in_game, rng.integers(1000, 3500, len(row)), np.nan),
+        'north/south_score': np.where(is_last_in_game, rng.integers(1000, 3500, len(row)), np.nan),
+    })
+    return auctions_df, tricks_df
+
+
+# former row-wise versions, as references
+def rowwise_mirror_values(values: pd.Series, mirror: Dict[str, str]) -> pd.Series:
+    return values.apply(lambda v: mirror.get(v))
+
+
+def _rowwise_contracted_df(auctions_df: pd.DataFrame, team: str) -> pd.DataFrame:
+    contractor_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(
+        ['experiment_id', 'game_id', 'round_id'], keep='last'
+    )
+    return contractor_df[contractor_df.apply(lambda row: PLAYER_TO_TEAM[row['player']] == team, axis=1)]
+
+
+def rowwise_pc_rounds_won(tricks_df: pd.DataFrame, auctions_df: pd.DataFrame, team: str) -> Tuple[float, int]:
+    nb_rounds = len(pd.unique(
+        tricks_df['experiment_id'].astype(str) + '-' + tricks_df['game_id'].astype(str)
+        + '-' + tricks_df['round_id'].astype(str)
+    ))
+    contractor_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(
+        ['experiment_id', 'game_id', 'round_id'], keep='last'
+    )[['experiment_id', 'game_id', 'round_id', 'player']].rename(columns={'player': 'player_'})
+    round_end_with_contract_df = tricks_df[tricks_df['is_last_in_round']].merge(
+        contractor_df, how='inner', on=['experiment_id', 'game_id', 'round_id']
+    )
+
+    def round_won(row):
+        if row['contract_reached']:
+            return PLAYER_TO_TEAM[row['player_']] == team
+        else:
+            return PLAYER_TO_TEAM[row['player_']] != team
+    nb_won_rounds = round_end_with_contract_df[round_end_with_contract_df.apply(round_won, axis=1)].shape[0]
+    return nb_won_rounds / nb_rounds, nb_rounds
+
+
+def rowwise_pc_tricks_won(tricks_df: pd.DataFrame, team: str) -> Tuple[float, int]:
+    nb_tricks = len(pd.unique(
+        tricks_df['experiment_id'].astype(str) + '-' + tricks_df['game_id'].astype(str)
+        + '-' + tricks_df['round_id'].astype(str)
+        + '-' + tricks_df['trick_id'].astype(str)
+    ))
+    trick_end_df = tricks_df[tricks_df['is_last_in_trick']]
+    nb_won_tricks = trick_end_df[
+        trick_end_df.apply(lambda row: PLAYER_TO_TEAM[row['trick_winner']] == team, axis=1)
+    ].shape[0]
+    return nb_won_tricks / nb_tricks, nb_tricks
+
+
+def rowwise_avg_contract(auctions_df: pd.DataFrame, team: str) -> float:
+    return _rowwise_contracted_df(auctions_df, team)['value'].mean()
+
+
+def rowwise_avg_positive_margin(auctions_df: pd.DataFrame, tricks_df: pd.DataFrame, team: str) -> float:
+    contracted_df = _rowwise_contracted_df(auctions_df, team)[['experiment_id', 'game_id', 'round_id']]
+    succeeded_df = tricks_df[tricks_df['is_last_in_round'] & tricks_df['contract_reached']].merge(
+        contracted_df, how='inner', on=['experiment_id', 'game_id', 'round_id']
+    )
+    return succeeded_df.apply(lambda row: row[f'{team}_points'] - row['contract'], axis=1).mean()
+
+
+
+# former vectorized versions, one per indicator (analysis.analyze computes them all at once from the facts of a
+# dataset, cf analyze.compute_indicators), as references
+def compute_pc_games_won(tricks_df: pd.DataFrame, team: str) -> Tuple[float, int]:
+    nb_games = count_distinct(tricks_df, ['experiment_id', 'game_id'])
+    nb_won_games = tricks_df[tricks_df['game_winners'] == team].shape[0]
+    return nb_won_games / nb_games, nb_games
+
+
+def compute_pc_rounds_won(tricks_df: pd.DataFrame, auctions_df: pd.DataFrame, team: str) -> Tuple[float, int]:
+    nb_rounds = count_distinct(tricks_df, ['experiment_id', 'game_id', 'round_id'])
+    round_end_df = tricks_df[tricks_df['is_last_in_round']]
+    contractor_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(
+        ['experiment_id', 'game_id', 'round_id'], keep='last'
+    )[['experiment_id', 'game_id', 'round_id', 'player']]
+    contractor_df = contractor_df.rename(
+        columns={'experiment_id': 'experiment_id_', 'game_id': 'game_id_', 'round_id': 'round_id_', 'player': 'player_'}
+    )
+    round_end_with_contract_df = round_end_df.merge(
+        right=contractor_df,
+        how='inner',
+        left_on=['experiment_id', 'game_id', 'round_id'],
+        right_on=['experiment_id_', 'game_id_', 'round_id_']
+    )
+    # a round is won by the contracting team when the contract is reached, by the other team otherwise
+    contracted_by_team = is_team_player(round_end_with_contract_df['player_'], team)
+    round_won = np.where(
+        round_end_with_contract_df['contract_reached'].astype(bool), contracted_by_team, ~contracted_by_team
+    )
+    nb_won_rounds = int(round_won.sum())
+
+    return nb_won_rounds / nb_rounds, nb_rounds
+
+
+def compute_pc_tricks_won(tricks_df: pd.DataFrame, team: str) -> Tuple[float, int]:
+    nb_tricks = count_distinct(tricks_df, ['experiment_id', 'game_id', 'round_id', 'trick_id'])
+    trick_end_df = tricks_df[tricks_df['is_last_in_trick']]
+    nb_won_tricks = int(is_team_player(trick_end_df['trick_winner'], team).sum())
+
+    return nb_won_tricks / nb_tricks, nb_tricks
+
+
+def compute_pc_contracted_rounds(auctions_df: pd.DataFrame, team: str) -> Tuple[float, int]:
+    nb_rounds = count_distinct(auctions_df, ['experiment_id', 'game_id', 'round_id'])
+    contractor_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(
+        ['experiment_id', 'game_id', 'round_id'], keep='last'
+    )
+    nb_contracted_rounds = int(is_team_player(contractor_df['player'], team).sum())
+
+    return nb_contracted_rounds / nb_rounds, nb_rounds
+
+
+def compute_pc_contracted_rounds_won(
+        tricks_df: pd.DataFrame, auctions_df: pd.DataFrame, team: str) -> Tuple[float, int]:
+    contractor_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(
+        ['experiment_id', 'game_id', 'round_id'], keep='last'
+    )[['experiment_id', 'game_id', 'round_id', 'player']]
+    contracted_df = contractor_df[is_team_player(contractor_df['player'], team)]
+    nb_contracted_rounds = contracted_df.shape[0]
+
+    round_end_df = tricks_df[tricks_df['is_last_in_round']]
+    contracted_df = contracted_df.rename(
+        columns={'experiment_id': 'experiment_id_', 'game_id': 'game_id_', 'round_id': 'round_id_', 'player': 'player_'}
+    )
+    round_end_with_contracted_df = round_end_df.merge(
+        right=contracted_df,
+        how='inner',
+        left_on=['experiment_id', 'game_id', 'round_id'],
+        right_on=['experiment_id_', 'game_id_', 'round_id_']
+    )
+    nb_contracted_rounds_won = round_end_with_contracted_df[round_end_with_contracted_df['contract_reached']].shape[0]
+
+    return nb_contracted_rounds_won / nb_contracted_rounds, nb_contracted_rounds
+
+
+def compute_avg_game_score(tricks_df: pd.DataFrame, team: str) -> float:
+    return tricks_df[tricks_df['is_last_in_game']][f'{team}_score'].mean()
+
+
+def compute_avg_contract(auctions_df: pd.DataFrame, team: str) -> float:
+    contractor_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(
+        ['experiment_id', 'game_id', 'round_id'], keep='last'
+    )
+    contracted_df = contractor_df[is_team_player(contractor_df['player'], team)]
+    return contracted_df['value'].mean()
+
+
+def compute_avg_positive_margin(auctions_df: pd.DataFrame, tricks_df: pd.DataFrame, team: str) -> float:
+    contractor_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(
+        ['experiment_id', 'game_id', 'round_id'], keep='last'
+    )
+    contracted_df = contractor_df[
+        is_team_player(contractor_df['player'], team)
+    ][['experiment_id', 'game_id', 'round_id', 'player']]
+    contracted_df = contracted_df.rename(
+        columns={'experiment_id': 'experiment_id_', 'game_id': 'game_id_', 'round_id': 'round_id_', 'player': 'player_'}
+    )
+    succeeded_round_end_df = tricks_df[tricks_df['is_last_in_round'] & tricks_df['contract_reached']]
+    succeeded_round_end_with_contracted_df = succeeded_round_end_df.merge(
+        right=contracted_df,
+        how='inner',
+        left_on=['experiment_id', 'game_id', 'round_id'],
+        right_on=['experiment_id_', 'game_id_', 'round_id_']
+    )
+
+    return (
+        succeeded_round_end_with_contracted_df[f'{team}_points'] - succeeded_round_end_with_contracted_df['contract']
+    ).mean()
+
+
+def compute_avg_negative_margin(auctions_df: pd.DataFrame, tricks_df: pd.DataFrame, team: str) -> float:
+    contractor_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(
+        ['experiment_id', 'game_id', 'round_id'], keep='last'
+    )
+    contracted_df = contractor_df[
+        is_team_player(contractor_df['player'], team)
+    ][['experiment_id', 'game_id', 'round_id', 'player']]
+    contracted_df = contracted_df.rename(
+        columns={'experiment_id': 'experiment_id_', 'game_id': 'game_id_', 'round_id': 'round_id_', 'player': 'player_'}
+    )
+    round_end_df = tricks_df[tricks_df['is_last_in_round']]
+    failed_round_end_df = round_end_df[~round_end_df['contract_reached'].astype(bool)]
+    failed_round_end_with_contracted_df = failed_round_end_df.merge(
+        right=contracted_df,
+        how='inner',
+        left_on=['experiment_id', 'game_id', 'round_id'],
+        right_on=['experiment_id_', 'game_id_', 'round_id_']
+    )
+
+    return (
+        failed_round_end_with_contracted_df['contract'] - failed_round_end_with_contracted_df[f'{team}_points']
+    ).mean()
+
+
+def time_call(function: Callable, *args, **kwargs) -> Tuple[float, object]:
+    start = perf_counter()
+    result = function(*args, **kwargs)
+    return perf_counter() - start, result
+
+
+def run_benchmark(nb_rounds: int, team: str = 'east/west') -> pd.DataFrame:
+    auctions_df, tricks_df = build_synthetic_tables(nb_rounds)
+    cases = {
+        'mirror players': (
+            lambda: mirror_values(tricks_df['trick_winner'], MIRROR_PLAYER),
+            lambda: rowwise_mirror_values(tricks_df['trick_winner'], MIRROR_PLAYER),
+        ),
+        'mirror teams': (
+            lambda: mirror_values(tricks_df['game_winners'], MIRROR_TEAM),
+            lambda: rowwise_mirror_values(tricks_df['game_winners'], MIRROR_TEAM),
+        ),
+        'pc rounds won': (
+            lambda: compute_pc_rounds_won(tricks_df=tricks_df, auctions_df=auctions_df, team=team),
+            lambda: rowwise_pc_rounds_won(tricks_df=tricks_df, auctions_df=auctions_df, team=team),
+        ),
+        'pc tricks won': (
+            lambda: compute_pc_tricks_won(tricks_df=tricks_df, team=team),
+            lambda: rowwise_pc_tricks_won(tricks_df=tricks_df, team=team),
+        ),
+        'avg contract': (
+            lambda: compute_avg_contract(auctions_df=auctions_df, team=team),
+            lambda: rowwise_avg_contract(auctions_df=auctions_df, team=team),
+        ),
+        'avg positive margin': (
+            lambda: compute_avg_positive_margin(auctions_df=auctions_df, tricks_df=tricks_df, team=team),
+            lambda: rowwise_avg_positive_margin(auctions_df=auctions_df, tricks_df=tricks_df, team=team),
+        ),
+    }
+    rows = []
+    for (name, (vectorized, rowwise)) in cases.items():
+        vectorized_time, vectorized_result = time_call(vectorized)
+        rowwise_time, rowwise_result = time_call(rowwise)
+        if isinstance(vectorized_result, pd.Series):
+            pd.testing.assert_series_equal(vectorized_result, rowwise_result.where(rowwise_result.notna(), np.nan),
+                                           check_dtype=False)
+        else:
+            np.testing.assert_allclose(vectorized_result, rowwise_result)
+        rows.append({'indicator': name, 'rowwise': rowwise_time, 'vectorized': vectorized_time,
+                     'speedup': rowwise_time / vectorized_time})
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the indicators of analysis.analyze')
+    parser.add_argument('--nb-rounds', type=int, default=100_000, help='32 tricks rows per round')
+    nb_rounds = parser.parse_args().nb_rounds
+    print(f'{nb_rounds} rounds, {32 * nb_rounds} tricks rows')
+    print(run_benchmark(nb_rounds).to_string(index=False, float_format='{:.3f}'.format))
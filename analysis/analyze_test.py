@@ -0,0 +1,295 @@
+import os
+import shutil
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import analyze
+from analysis.analyze_benchmark import (
+    build_synthetic_tables, compute_avg_contract, compute_avg_game_score, compute_avg_negative_margin,
+    compute_avg_positive_margin, compute_pc_contracted_rounds, compute_pc_contracted_rounds_won, compute_pc_games_won,
+    compute_pc_rounds_won, compute_pc_tricks_won, rowwise_avg_contract, rowwise_avg_positive_margin,
+    rowwise_pc_rounds_won, rowwise_pc_tricks_won, run_benchmark
+)
+from analysis.deal_pool import DEALS_PER_GAME, generate_deal_pool
+from analysis.experiment import run_experiment, update_config_data
+from analysis.typed_csv import CACHE_DIR_NAME
+
+
+def test_vectorized_indicators_match_rowwise_ones():
+    benchmark_df = run_benchmark(nb_rounds=500)  # results are compared in run_benchmark
+    assert len(benchmark_df) == 6
+
+
+@pytest.fixture(scope='module')
+def experiment_data(tmp_path_factory):
+    data_path = tmp_path_factory.mktemp('data')
+    run_experiment('RANDOM', 'HIGHEST_CARD', nb_games=1, batch_size=1, data_path=str(data_path))
+    run_experiment('HIGHEST_CARD', 'RANDOM', nb_games=1, batch_size=1, data_path=str(data_path))
+    return str(data_path)
+
+
+@pytest.mark.parametrize('team', ['east/west', 'north/south'])
+def test_indicators_on_experiment_data(experiment_data, monkeypatch, team):
+    monkeypatch.setattr(analyze, 'DATA_PATH', experiment_data)
+    auctions_df, tricks_df = analyze.prepare_datasets(ew_agent='RANDOM', ns_agent='HIGHEST_CARD')
+    assert set(tricks_df['trick_winner'].dropna()) <= set(analyze.PLAYER_TO_TEAM)
+    assert set(tricks_df['game_winners'].dropna()) <= set(analyze.TEAM_TO_PLAYERS)
+    assert compute_pc_games_won(tricks_df, team)[1] == 2
+    assert compute_pc_rounds_won(tricks_df, auctions_df, team) == rowwise_pc_rounds_won(
+        tricks_df, auctions_df, team
+    )
+    assert compute_pc_tricks_won(tricks_df, team) == rowwise_pc_tricks_won(tricks_df, team)
+    np.testing.assert_allclose(compute_avg_contract(auctions_df, team), rowwise_avg_contract(auctions_df, team))
+    np.testing.assert_allclose(
+        compute_avg_positive_margin(auctions_df, tricks_df, team),
+        rowwise_avg_positive_margin(auctions_df, tricks_df, team)
+    )
+
+
+def test_update_config_data(tmp_path):
+    path = str(tmp_path / 'config_data.csv')
+    pd.DataFrame({'experiment_id': ['a', 'b'], 'nb_games': [5, 10]}).to_csv(path, sep=';', index=False)
+    update_config_data(path, 'b', 15)
+    assert pd.read_csv(path, sep=';')['nb_games'].tolist() == [5, 15]
+
+
+def compute_indicators_separately(tricks_df: pd.DataFrame, auctions_df: pd.DataFrame, team: str):
+    return {
+        'pc_games_won': compute_pc_games_won(tricks_df, team),
+        'pc_rounds_won': compute_pc_rounds_won(tricks_df, auctions_df, team),
+        'pc_tricks_won': compute_pc_tricks_won(tricks_df, team),
+        'pc_contracted_rounds': compute_pc_contracted_rounds(auctions_df, team),
+        'pc_contracted_rounds_won': compute_pc_contracted_rounds_won(tricks_df, auctions_df, team),
+        'avg_game_score': (compute_avg_game_score(tricks_df, team), None),
+        'avg_contract': (compute_avg_contract(auctions_df, team), None),
+        'avg_positive_margin': (compute_avg_positive_margin(auctions_df, tricks_df, team), None),
+        'avg_negative_margin': (compute_avg_negative_margin(auctions_df, tricks_df, team), None),
+    }
+
+
+def assert_same_indicators(indicators, expected_indicators):
+    assert indicators.keys() == expected_indicators.keys()
+    for (name, (value, nb_samples)) in indicators.items():
+        expected_value, expected_nb_samples = expected_indicators[name]
+        assert nb_samples == expected_nb_samples, name
+        np.testing.assert_allclose(value, expected_value, err_msg=name)
+
+
+@pytest.mark.parametrize('team', ['east/west', 'north/south'])
+def test_dataset_facts_on_experiment_data(experiment_data, monkeypatch, team):
+    monkeypatch.setattr(analyze, 'DATA_PATH', experiment_data)
+    auctions_df, tricks_df = analyze.prepare_datasets(ew_agent='RANDOM', ns_agent='HIGHEST_CARD')
+    facts = analyze.build_dataset_facts(tricks_df=tricks_df, auctions_df=auctions_df)
+    assert facts.rounds['played'].all() and len(facts.games) == 2
+    assert (facts.rounds['east/west_tricks'] + facts.rounds['north/south_tricks'] == 8).all()
+    assert_same_indicators(
+        analyze.compute_indicators(facts, team), compute_indicators_separately(tricks_df, auctions_df, team)
+    )
+
+
+def test_dataset_facts_on_synthetic_tables():
+    auctions_df, tricks_df = build_synthetic_tables(nb_rounds=500)
+    indicators = analyze.compute_indicators(analyze.build_dataset_facts(tricks_df, auctions_df), 'east/west')
+    expected_indicators = compute_indicators_separately(tricks_df, auctions_df, 'east/west')
+    for name in ['avg_positive_margin', 'avg_negative_margin']:  # synthetic contracts differ from the bids
+        del indicators[name], expected_indicators[name]
+    assert_same_indicators(indicators, expected_indicators)
+
+
+def test_dataset_facts_are_cached_until_files_change(experiment_data, monkeypatch):
+    monkeypatch.setattr(analyze, 'DATA_PATH', experiment_data)
+    facts = analyze.load_dataset_facts(ew_agent='RANDOM', ns_agent='HIGHEST_CARD')
+    assert analyze.load_dataset_facts(ew_agent='RANDOM', ns_agent='HIGHEST_CARD') is facts
+    run_experiment('RANDOM', 'HIGHEST_CARD', nb_games=1, batch_size=1, data_path=experiment_data)
+    new_facts = analyze.load_dataset_facts(ew_agent='RANDOM', ns_agent='HIGHEST_CARD')
+    assert len(new_facts.games) == len(facts.games) + 1
+
+
+def test_iter_whole_games():
+    df = pd.DataFrame({'experiment_id': ['a'] * 5 + ['b'] * 3, 'game_id': [0, 0, 1, 1, 1, 0, 0, 0], 'x': range(8)})
+    chunks = [df.iloc[start:start + 2] for start in range(0, len(df), 2)]
+    whole_games = list(analyze.iter_whole_games(chunks))
+    assert [chunk['x'].tolist() for chunk in whole_games] == [[0, 1], [2, 3, 4], [5, 6, 7]]
+
+
+def test_stream_indicators(tmp_path, monkeypatch):
+    run_experiment('RANDOM', 'HIGHEST_CARD', nb_games=2, batch_size=1, data_path=str(tmp_path))
+    run_experiment('RANDOM', 'HIGHEST_CARD', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    run_experiment('HIGHEST_CARD', 'RANDOM', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    monkeypatch.setattr(analyze, 'DATA_PATH', str(tmp_path))
+    auctions_df, tricks_df = analyze.prepare_datasets(ew_agent='RANDOM', ns_agent='HIGHEST_CARD')
+    facts = analyze.build_dataset_facts(tricks_df=tricks_df, auctions_df=auctions_df)
+    for chunksize in [100, 1000, 10 ** 6]:  # games are split between chunks, or chunks hold several games
+        for team in ['east/west', 'north/south']:
+            indicators = analyze.stream_indicators('RANDOM', 'HIGHEST_CARD', team=team, chunksize=chunksize)
+            assert indicators['pc_games_won'][1] == 4
+            assert_same_indicators(indicators, analyze.compute_indicators(facts, team))
+
+
+def test_aggregate_indicators_by_game():
+    auctions_df, tricks_df = build_synthetic_tables(nb_rounds=500)
+    facts = analyze.build_dataset_facts(tricks_df, auctions_df)
+    units, totals, counts = analyze.aggregate_indicators_by(facts, 'east/west', keys=analyze.GAME_KEYS)
+    assert totals.shape == (25, len(analyze.INDICATORS))
+    assert units['game_id'].tolist() == list(range(25))
+    aggregates = analyze.aggregate_indicators(facts, 'east/west')
+    np.testing.assert_allclose(totals.sum(axis=0), [aggregates[name][0] for name in analyze.INDICATORS])
+    np.testing.assert_allclose(counts.sum(axis=0), [aggregates[name][1] for name in analyze.INDICATORS])
+
+
+@pytest.mark.parametrize('estimator, nb_samples, confidence_level, resolved', [
+    (0.5, 10_000, 0.99, False),  # no winner
+    (0.9, 10, 0.95, True),
+    (0.1, 10, 0.95, True),  # won by the other team
+    (0.6, 100, 0.95, True),  # interval [0.502, 0.698]
+    (0.6, 100, 0.99, False),  # interval [0.471, 0.729]
+    (0.6, 10, 0.95, False),
+    (1., 0, 0.95, False),  # no game played yet
+])
+def test_is_win_rate_resolved(estimator, nb_samples, confidence_level, resolved):
+    assert analyze.is_win_rate_resolved(estimator, nb_samples, confidence_level) == resolved
+
+
+def test_bootstrap_confidence_intervals():
+    auctions_df, tricks_df = build_synthetic_tables(nb_rounds=2000)
+    facts = analyze.build_dataset_facts(tricks_df, auctions_df)
+    indicators = analyze.compute_indicators(facts, 'east/west')
+    intervals = analyze.bootstrap_confidence_intervals(facts, 'east/west', confidence_levels=[0.5, 0.99])
+    assert intervals.keys() == indicators.keys()
+    for (name, (value, _)) in indicators.items():
+        (inf_50, sup_50), (inf_99, sup_99) = intervals[name][0.5], intervals[name][0.99]
+        assert inf_99 <= inf_50 <= value <= sup_50 <= sup_99, name
+    # games won by a coin flip: the normal approximation is a good reference
+    normal_inf, normal_sup = analyze.compute_confidence_intervals(
+        indicators['pc_games_won'][0], indicators['pc_games_won'][1], 0.99
+    )
+    np.testing.assert_allclose(intervals['pc_games_won'][0.99], (normal_inf, normal_sup), atol=0.03)
+    # games resampled by deal: every game starting with a deal of its own is resampled alone
+    game_deals = facts.games[analyze.GAME_KEYS].astype({'experiment_id': str}).assign(
+        game_deal=lambda df: df['game_id'].astype(str)
+    )
+    paired_intervals = analyze.bootstrap_confidence_intervals(
+        facts, 'east/west', confidence_levels=[0.99], game_deals=game_deals
+    )
+    assert paired_intervals['avg_contract'][0.99] == intervals['avg_contract'][0.99]
+
+
+def test_bootstrap_by_blocks(monkeypatch):
+    auctions_df, tricks_df = build_synthetic_tables(nb_rounds=200)
+    facts = analyze.build_dataset_facts(tricks_df, auctions_df)
+    intervals = analyze.bootstrap_confidence_intervals(facts, 'east/west', confidence_levels=[0.9], nb_samples=50)
+    # resamplings drawn 3 by 3 come from the same random stream
+    monkeypatch.setattr(analyze, 'BOOTSTRAP_BLOCK_SIZE', 3 * len(facts.games))
+    assert analyze.bootstrap_confidence_intervals(
+        facts, 'east/west', confidence_levels=[0.9], nb_samples=50
+    ) == intervals
+
+
+def test_bootstrap_pairs_games_by_deal(tmp_path, monkeypatch):
+    pool_path = str(tmp_path / 'deal_pool.npy')
+    generate_deal_pool(path=pool_path, nb_deals=2 * DEALS_PER_GAME, seed=7)
+    run_experiment('RANDOM', 'HIGHEST_CARD', nb_games=2, batch_size=2, data_path=str(tmp_path),
+                   deal_pool_path=pool_path)
+    run_experiment('HIGHEST_CARD', 'RANDOM', nb_games=2, batch_size=2, data_path=str(tmp_path),
+                   deal_pool_path=pool_path)
+    # a work queue shard starting at the second game of the pool: its game_id 0 replays game_id 1
+    run_experiment('HIGHEST_CARD', 'RANDOM', nb_games=1, batch_size=1, data_path=str(tmp_path),
+                   deal_pool_path=pool_path, first_deal=DEALS_PER_GAME)
+    monkeypatch.setattr(analyze, 'DATA_PATH', str(tmp_path))
+    game_deals = analyze.get_game_deals(analyze.prepare_deals_dataset(ew_agent='RANDOM', ns_agent='HIGHEST_CARD'))
+    assert len(game_deals) == 5
+    games_by_deal = game_deals.groupby('game_deal')['game_id'].apply(sorted).tolist()
+    assert sorted(games_by_deal) == [[0, 0], [0, 1, 1]]
+
+    auctions_df, tricks_df = analyze.prepare_datasets(ew_agent='RANDOM', ns_agent='HIGHEST_CARD')
+    facts = analyze.build_dataset_facts(tricks_df, auctions_df)
+    paired_facts = analyze.DatasetFacts(
+        rounds=analyze.add_game_deals(facts.rounds, game_deals), games=analyze.add_game_deals(facts.games, game_deals)
+    )
+    keys, totals, counts = analyze.aggregate_indicators_by(paired_facts, 'east/west', keys=['game_deal'])
+    assert len(keys) == 2
+    np.testing.assert_allclose(totals.sum(axis=0), [total for (total, _) in analyze.aggregate_indicators(
+        facts, 'east/west').values()])
+    intervals = analyze.bootstrap_confidence_intervals(
+        facts, 'east/west', confidence_levels=[0.95], game_deals=game_deals
+    )
+    inf, sup = intervals['pc_tricks_won'][0.95]
+    assert 0 <= inf <= analyze.compute_indicators(facts, 'east/west')['pc_tricks_won'][0] <= sup <= 1
+
+
+def test_compute_heatmap_matrices(experiment_data, monkeypatch):
+    monkeypatch.setattr(analyze, 'DATA_PATH', experiment_data)
+    agents = ['RANDOM', 'HIGHEST_CARD']
+    matrices = analyze.compute_heatmap_matrices(agents, min_games=0, nb_processes=2, bootstrap_confidence=0.95)
+    assert matrices.keys() == set(analyze.INDICATORS)
+    assert np.isnan(matrices['pc_games_won'][0, 0])  # RANDOM never played against itself
+    facts = analyze.load_dataset_facts(ew_agent='RANDOM', ns_agent='HIGHEST_CARD')
+    indicators = analyze.compute_indicators(facts, 'east/west')
+    assert matrices['pc_games_won'][0, 1] == 100 * indicators['pc_games_won'][0]
+    assert matrices['avg_contract'][0, 1] == indicators['avg_contract'][0]
+    serial_matrices = analyze.compute_heatmap_matrices(agents, min_games=0, nb_processes=1)
+    for name in analyze.INDICATORS:
+        np.testing.assert_array_equal(matrices[name], serial_matrices[name])
+    assert analyze.compute_heatmap_matrices(agents, min_games=1, nb_processes=1) is None
+
+
+def test_compute_heatmap_matrices_on_cold_cache(tmp_path, monkeypatch):
+    # pairs (A, B) and (B, A) read the same directories from different workers
+    monkeypatch.setattr(analyze, 'DATA_PATH', str(tmp_path))
+    run_experiment('RANDOM', 'HIGHEST_CARD', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    run_experiment('HIGHEST_CARD', 'RANDOM', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    agents = ['RANDOM', 'HIGHEST_CARD']
+    serial_matrices = analyze.compute_heatmap_matrices(agents, min_games=0, nb_processes=1)
+    for _ in range(5):
+        for dir_name in os.listdir(tmp_path):
+            shutil.rmtree(tmp_path / dir_name / CACHE_DIR_NAME, ignore_errors=True)
+        matrices = analyze.compute_heatmap_matrices(agents, min_games=0, nb_processes=4)
+        for name in analyze.INDICATORS:
+            np.testing.assert_array_equal(matrices[name], serial_matrices[name])
+
+
+def test_incremental_indicators(tmp_path, monkeypatch):
+    monkeypatch.setattr(analyze, 'DATA_PATH', str(tmp_path))
+    run_experiment('RANDOM', 'HIGHEST_CARD', nb_games=2, batch_size=1, data_path=str(tmp_path))
+    run_experiment('HIGHEST_CARD', 'RANDOM', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    dir_path = str(tmp_path / 'RANDOM-vs-HIGHEST_CARD')
+    config_path = os.path.join(dir_path, 'config_data.csv')
+
+    def assert_same_as_full_analysis():
+        auctions_df, tricks_df = analyze.prepare_datasets(ew_agent='RANDOM', ns_agent='HIGHEST_CARD')
+        facts = analyze.build_dataset_facts(tricks_df=tricks_df, auctions_df=auctions_df)
+        for team in analyze.TEAMS:
+            indicators = analyze.load_incremental_indicators('RANDOM', 'HIGHEST_CARD', team=team, chunksize=100)
+            assert_same_indicators(indicators, analyze.compute_indicators(facts, team))
+
+    # second game not written yet: rows are folded up to its first one
+    config_df = pd.read_csv(config_path, sep=';')
+    config_df.assign(nb_games=1).to_csv(config_path, sep=';', index=False)
+    state = analyze.refresh_metrics_state(dir_path)
+    assert [experiment['nb_games'] for experiment in state['experiments'].values()] == [1]
+    assert state['offsets']['tricks_data.csv'] < os.path.getsize(os.path.join(dir_path, 'tricks_data.csv'))
+
+    config_df.to_csv(config_path, sep=';', index=False)
+    run_experiment('RANDOM', 'HIGHEST_CARD', nb_games=1, batch_size=1, experiment_id='next', data_path=str(tmp_path))
+    assert_same_as_full_analysis()
+    state = analyze.load_metrics_state(dir_path)
+    nb_games = {experiment_id: experiment['nb_games'] for (experiment_id, experiment) in state['experiments'].items()}
+    assert nb_games == {config_df['experiment_id'].iloc[0]: 2, 'next': 1}
+    for file_name in ['auctions_data.csv', 'tricks_data.csv']:
+        assert state['offsets'][file_name] == os.path.getsize(os.path.join(dir_path, file_name))
+
+
+def test_concurrent_metrics_state_refreshes(tmp_path):
+    run_experiment('RANDOM', 'HIGHEST_CARD', nb_games=2, batch_size=1, data_path=str(tmp_path))
+    dir_path = str(tmp_path / 'RANDOM-vs-HIGHEST_CARD')
+    expected_state = analyze.refresh_metrics_state(dir_path)
+    with Pool(processes=6) as pool:
+        for _ in range(5):  # new state every time
+            os.remove(os.path.join(dir_path, analyze.METRICS_STATE_FILE_NAME))
+            for state in pool.map(analyze.refresh_metrics_state, [dir_path] * 12):
+                assert state == expected_state
+    assert analyze.load_metrics_state(dir_path) == expected_state
+    assert not [file_name for file_name in os.listdir(dir_path) if file_name.endswith('.tmp')]
@@ -0,0 +1,101 @@
+# AUCTION-ONLY SIMULATION
+#
+# Deals and runs the auction only, then scores the final contract with a fixed play policy
+# (the same agent at the 4 seats) instead of the agents of the experiment.
+# HIGHEST_CARD and EXPERT play deterministically, so one rollout gives the exact outcome of the
+# contract under that policy; RANDOM needs several rollouts to estimate a make probability.
+import os
+from datetime import datetime
+from time import time
+from typing import Optional, Tuple, Dict, List
+
+import pandas as pd
+
+from analysis.card_codes import decode_hands
+from analysis.deal_pool import load_deal_pool
+from analysis.experiment import DATA_PATH
+from analysis.simulation import ALL_PLAYERS, run_auction, play_round, is_contract_reached
+from helpers.structures import Game, Player, Card, PLAYER_TO_TEAM
+
+AUCTION_ONLY_COLUMNS = [
+    'experiment_id', 'deal_id', 'first_player', 'contractor', 'contractor_agent', 'contract_team', 'color',
+    'contract', 'nb_bids', 'estimation_agent', 'nb_rollouts', 'estimated_make_probability',
+    'estimated_contract_team_points',
+]
+
+
+def estimate_contract(
+        hands: Dict[Player, List[Card]], first_player: Player, contractor: Player, color: str, contract: int,
+        estimation_agent: str, nb_rollouts: int
+) -> Tuple[float, float]:
+    contract_team = PLAYER_TO_TEAM[contractor]
+    agents = {player: estimation_agent for player in Player}
+    nb_made_contracts = 0
+    contract_team_points = 0
+    for _ in range(nb_rollouts):
+        round_, _ = play_round(
+            hands=hands, first_player=first_player, trump_color=color, contract_team=contract_team, agents=agents
+        )
+        nb_made_contracts += is_contract_reached(round_, contract_team, contract)
+        contract_team_points += round_.score[contract_team]
+    return nb_made_contracts / nb_rollouts, contract_team_points / nb_rollouts
+
+
+def run_auction_experiment(
+        east_west_agents: str, north_south_agents: str, nb_deals: int,
+        estimation_agent: str = 'HIGHEST_CARD', nb_rollouts: int = 1,
+        deal_pool_path: Optional[str] = None, data_path: str = DATA_PATH
+) -> pd.DataFrame:
+    experiment_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    agents = {
+        Player.ONE: east_west_agents, Player.TWO: north_south_agents,
+        Player.THREE: east_west_agents, Player.FOUR: north_south_agents,
+    }
+    deal_pool = load_deal_pool(deal_pool_path) if deal_pool_path is not None else None
+
+    rows = []
+    for deal_id in range(nb_deals):
+        hands = decode_hands(deal_pool[deal_id % len(deal_pool)]) if deal_pool is not None else Game.deal()
+        first_player = ALL_PLAYERS[deal_id % 4]
+        auction, bids_history = run_auction(hands=hands, first_player=first_player, agents=agents)
+        row = {
+            'experiment_id': experiment_id,
+            'deal_id': deal_id,
+            'first_player': first_player.value,
+            'nb_bids': sum(action == 'bet' for (_, action, _, _) in bids_history),
+        }
+        contractor = auction.current_best
+        if contractor is not None:
+            color = auction.get_best_color()
+            contract = auction.bids[contractor].value
+            make_probability, contract_team_points = estimate_contract(
+                hands=hands, first_player=first_player, contractor=contractor, color=color, contract=contract,
+                estimation_agent=estimation_agent, nb_rollouts=nb_rollouts
+            )
+            row.update({
+                'contractor': contractor.value,
+                'contractor_agent': agents[contractor],
+                'contract_team': PLAYER_TO_TEAM[contractor].value,
+                'color': color,
+                'contract': contract,
+                'estimation_agent': estimation_agent,
+                'nb_rollouts': nb_rollouts,
+                'estimated_make_probability': make_probability,
+                'estimated_contract_team_points': contract_team_points,
+            })
+        rows.append(row)
+    auction_only_df = pd.DataFrame(rows, columns=AUCTION_ONLY_COLUMNS)
+
+    output_dir = os.path.join(data_path, f'{east_west_agents}-vs-{north_south_agents}')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, 'auction_only_data.csv')
+    auction_only_df.to_csv(output_path, sep=';', mode='a', header=not os.path.exists(output_path), index=False)
+
+    return auction_only_df
+
+
+if __name__ == "__main__":
+    start_time = time()
+    df = run_auction_experiment(east_west_agents='EXPERT', north_south_agents='HIGHEST_CARD', nb_deals=1000)
+    print(df.groupby('contractor_agent')[['contract', 'estimated_make_probability']].mean())
+    print(f'elapsed time: {time()-start_time} sec')
@@ -0,0 +1,66 @@
+import os
+
+import pandas as pd
+
+from analysis.auction_simulation import AUCTION_ONLY_COLUMNS, estimate_contract, run_auction_experiment
+from analysis.card_codes import decode_hands
+from analysis.deal_pool import generate_deal_pool, load_deal_pool
+from analysis.simulation import ALL_PLAYERS, is_contract_reached, play_round, run_auction
+from helpers.structures import Player, PLAYER_TO_TEAM
+
+
+def test_run_auction_experiment(tmp_path):
+    pool_path = str(tmp_path / 'deal_pool.npy')
+    generate_deal_pool(path=pool_path, nb_deals=12, seed=13)
+    df = run_auction_experiment(
+        east_west_agents='EXPERT', north_south_agents='HIGHEST_CARD', nb_deals=12, deal_pool_path=pool_path,
+        data_path=str(tmp_path)
+    )
+    assert list(df.columns) == AUCTION_ONLY_COLUMNS
+    assert df['deal_id'].tolist() == list(range(12))
+    assert df['first_player'].tolist() == [ALL_PLAYERS[deal_id % 4].value for deal_id in range(12)]
+    contracted_df = df[df['contractor'].notna()]
+    assert not contracted_df.empty
+    assert (contracted_df['contractor'].map(lambda player: PLAYER_TO_TEAM[Player(player)].value)
+            == contracted_df['contract_team']).all()
+    assert (contracted_df['contractor_agent'] == contracted_df['contract_team'].map(
+        {'east/west': 'EXPERT', 'north/south': 'HIGHEST_CARD'})).all()
+    assert (df['contract'].isna() == (df['nb_bids'] == 0)).all()
+    # a deterministic estimation agent gives the outcome of the contract
+    assert contracted_df['estimated_make_probability'].isin([0., 1.]).all()
+
+    # agents are deterministic: the same pool gives the same auctions and estimations
+    output_path = os.path.join(tmp_path, 'EXPERT-vs-HIGHEST_CARD', 'auction_only_data.csv')
+    same_df = run_auction_experiment(
+        east_west_agents='EXPERT', north_south_agents='HIGHEST_CARD', nb_deals=12, deal_pool_path=pool_path,
+        data_path=str(tmp_path)
+    )
+    pd.testing.assert_frame_equal(same_df.drop(columns='experiment_id'), df.drop(columns='experiment_id'))
+    assert len(pd.read_csv(output_path, sep=';')) == 24
+
+
+def test_estimate_contract_matches_played_round(tmp_path):
+    pool_path = str(tmp_path / 'deal_pool.npy')
+    generate_deal_pool(path=pool_path, nb_deals=20, seed=13)
+    deal_pool = load_deal_pool(pool_path)
+    agents = {player: 'HIGHEST_CARD' for player in Player}
+    nb_estimated_contracts = 0
+    for codes in deal_pool:
+        hands = decode_hands(codes)
+        auction, _ = run_auction(hands=hands, first_player=Player.ONE, agents=agents)
+        if auction.current_best is None:
+            continue
+        contract_team = PLAYER_TO_TEAM[auction.current_best]
+        contract = auction.bids[auction.current_best].value
+        make_probability, contract_team_points = estimate_contract(
+            hands=hands, first_player=Player.ONE, contractor=auction.current_best, color=auction.get_best_color(),
+            contract=contract, estimation_agent='HIGHEST_CARD', nb_rollouts=2
+        )
+        round_, _ = play_round(
+            hands=hands, first_player=Player.ONE, trump_color=auction.get_best_color(), contract_team=contract_team,
+            agents=agents
+        )
+        assert make_probability == is_contract_reached(round_, contract_team, contract)
+        assert contract_team_points == round_.score[contract_team]
+        nb_estimated_contracts += 1
+    assert nb_estimated_contracts > 0
@@ -0,0 +1,55 @@
+# Writes experiment data (cf analysis.experiment.save_and_flush_data) in a dedicated thread, so that the
+# simulation goes on while pandas formats the CSV lines and the disk writes them.
+# Jobs go through a bounded queue and are run in submission order: when max_pending_jobs jobs are waiting,
+# submitting blocks the simulation until the writer catches up (backpressure, bounded memory).
+import queue
+import threading
+from typing import Callable, Optional
+
+
+class BackgroundWriter:
+    def __init__(self, max_pending_jobs: int = 16):
+        self.jobs = queue.Queue(maxsize=max_pending_jobs)
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self._run, name='background-writer', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            function, args = job
+            if self.error is None:  # after a failure, later jobs are dropped rather than written out of order
+                try:
+                    function(*args)
+                except BaseException as e:
+                    self.error = e
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise RuntimeError('Background writing failed') from self.error
+
+    def submit(self, function: Callable, *args):
+        """args must not be modified afterwards: they are used by the writer thread"""
+        self._raise_error()
+        self.jobs.put((function, args))
+
+    def close(self):
+        """wait for every submitted job to be done"""
+        if self.thread.is_alive():
+            self.jobs.put(None)
+            self.thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:  # data written so far is still flushed, without hiding the original exception
+            try:
+                self.close()
+            except RuntimeError:
+                pass
@@ -0,0 +1,44 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from analysis.background_writer import BackgroundWriter
+from analysis.experiment import save_and_flush_df
+
+
+def test_jobs_run_in_order(tmp_path):
+    path = str(tmp_path / 'data.csv')
+    with BackgroundWriter(max_pending_jobs=2) as writer:
+        for i in range(20):
+            df = save_and_flush_df(pd.DataFrame({'a': [i], 'b': [2 * i]}), path, writer)
+            assert df.empty and list(df.columns) == ['a', 'b']
+    assert pd.read_csv(path, sep=';', header=None)[0].tolist() == list(range(20))
+
+
+def test_submit_blocks_when_queue_is_full():
+    release = threading.Event()
+    writer = BackgroundWriter(max_pending_jobs=1)
+    writer.submit(release.wait)  # taken by the writer thread, which then waits
+    time.sleep(0.1)
+    writer.submit(lambda: None)  # fills the queue
+    submitted = threading.Event()
+    threading.Thread(target=lambda: (writer.submit(lambda: None), submitted.set()), daemon=True).start()
+    assert not submitted.wait(0.2)
+    release.set()
+    assert submitted.wait(1)
+    writer.close()
+
+
+def test_errors_are_raised_in_the_caller():
+    def fail():
+        raise OSError('disk full')
+
+    done = []
+    writer = BackgroundWriter()
+    writer.submit(fail)
+    writer.submit(done.append, 1)
+    with pytest.raises(RuntimeError):
+        writer.close()
+    assert done == []
@@ -0,0 +1,50 @@
+# Compact integer representation of cards: code = NB_VALUES * color index + value index,
+# following the order used by Game.deal (constants.COLORS x constants.PLAIN_POINTS)
+from itertools import product
+from typing import Dict, List, Iterable
+
+import numpy as np
+
+from helpers import constants
+from helpers.structures import Card, Player
+
+NB_CARDS = 32
+NB_VALUES = len(constants.PLAIN_POINTS)  # cards of a color
+HAND_SIZE = 8
+CARDS = [(value, color) for (color, value) in product(constants.COLORS, constants.PLAIN_POINTS.keys())]
+PLAIN_CARDS = [f'{value}{color}' for (value, color) in CARDS]
+PLAIN_CARD_TO_CODE = {card: code for (code, card) in enumerate(PLAIN_CARDS)}
+DESCRIBED_CARD_TO_CODE = {
+    Card(value=value, color=color).describe(): code for (code, (value, color)) in enumerate(CARDS)
+}
+
+
+def encode_card(card: Card) -> int:
+    return PLAIN_CARD_TO_CODE[card.describe_plain()]
+
+
+def decode_card(code: int) -> Card:
+    value, color = CARDS[code]
+    return Card(value=value, color=color)
+
+
+def encode_hands(hands: Dict[Player, List[Card]]) -> np.ndarray:
+    """hands are concatenated following Player order (west, south, east, north)"""
+    return np.array([encode_card(card) for player in Player for card in hands[player]], dtype=np.uint8)
+
+
+def encode_deal(hands: Dict[Player, List[Card]]) -> str:
+    """hexadecimal string of the 32 card codes (2 characters per card)"""
+    return encode_hands(hands).tobytes().hex()
+
+
+def decode_deals(deals: Iterable[str]) -> np.ndarray:
+    """(nb_deals, 32) array of card codes from their hexadecimal strings"""
+    return np.frombuffer(bytes.fromhex(''.join(deals)), dtype=np.uint8).reshape(-1, NB_CARDS)
+
+
+def decode_hands(codes: np.ndarray) -> Dict[Player, List[Card]]:
+    return {
+        player: [decode_card(code) for code in codes[HAND_SIZE * i: HAND_SIZE * (i + 1)]]
+        for (i, player) in enumerate(Player)
+    }
@@ -0,0 +1,139 @@
+# CARD-LEVEL STATISTICS
+#
+# Outcomes of the cards played in tricks_df (cf analysis.typed_csv.TRICKS_DTYPES), by card, trick position and
+# whether the card is a trump, and the first leads of rounds by team (the agent of the team, for the datasets of
+# analysis.analyze.prepare_datasets).
+# Every column is handled as integer codes (categorical codes of card, player and color, card code being
+# NB_VALUES * color index + value index, cf analysis.card_codes), statistics being np.bincount over a flat cell index:
+# no string is compared or grouped on. Rows of a trick are contiguous (4 rows, trick end on the last one) and
+# the trump of a round is the color of its last bet in auctions_df (rounds without one are left out).
+#   python -m analysis.card_stats EW_AGENT NS_AGENT
+import argparse
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from analysis.analyze import PLAYER_TO_TEAM, prepare_datasets
+from analysis.card_codes import NB_CARDS, NB_VALUES, PLAIN_CARDS
+from analysis.typed_csv import PLAYER_DTYPE, TEAM_DTYPE
+
+NB_TRICK_POSITIONS = 4
+TEAMS = list(TEAM_DTYPE.categories)
+PLAYER_TEAM_CODES = np.array([TEAMS.index(PLAYER_TO_TEAM[player]) for player in PLAYER_DTYPE.categories])
+CARD_STATS_COLUMNS = ['card', 'trick_position', 'is_trump', 'nb_plays', 'pc_tricks_won', 'avg_points_captured']
+FIRST_LEADS_COLUMNS = ['team', 'card', 'is_trump', 'nb_leads', 'pc_leads']
+
+
+class PlayedCards(NamedTuple):
+    # one element per played card (rows of tricks_df whose round has a trump)
+    card: np.ndarray  # card code
+    trick_position: np.ndarray
+    team: np.ndarray  # team code of the player
+    is_trump: np.ndarray
+    won: np.ndarray  # player won the trick
+    points_captured: np.ndarray  # points of the trick when won, 0 otherwise
+    is_first_lead: np.ndarray  # first card of the round
+
+
+def get_round_keys(experiment_codes: np.ndarray, game_ids: np.ndarray, round_ids: np.ndarray) -> np.ndarray:
+    return (experiment_codes.astype(np.int64) << 40) | (game_ids.astype(np.int64) << 16) | round_ids.astype(np.int64)
+
+
+def get_trump_codes(tricks_df: pd.DataFrame, auctions_df: pd.DataFrame) -> np.ndarray:
+    """color code of the trump of the round of every row of tricks_df, -1 when its round has no bet"""
+    bets = auctions_df[(auctions_df['action'] == 'bet').to_numpy()]
+    # experiment codes of auctions_df are translated into the categories of tricks_df
+    experiment_codes = tricks_df['experiment_id'].cat.categories.get_indexer(
+        bets['experiment_id'].cat.categories
+    )[bets['experiment_id'].cat.codes.to_numpy()]
+    bet_keys = get_round_keys(experiment_codes, bets['game_id'].to_numpy(), bets['round_id'].to_numpy())
+    # last bet of every round: first occurrence of its key in reversed bets
+    round_keys, reversed_positions = np.unique(bet_keys[::-1], return_index=True)
+    round_trumps = bets['color'].cat.codes.to_numpy()[::-1][reversed_positions]
+    if len(round_keys) == 0:
+        return np.full(len(tricks_df), -1, dtype=np.int8)
+
+    row_keys = get_round_keys(
+        tricks_df['experiment_id'].cat.codes.to_numpy(), tricks_df['game_id'].to_numpy(),
+        tricks_df['round_id'].to_numpy()
+    )
+    # rows of a round are contiguous: keys are looked up once per round
+    round_starts = np.flatnonzero(np.diff(row_keys, prepend=-1) != 0)
+    start_keys = row_keys[round_starts]
+    positions = np.searchsorted(round_keys, start_keys).clip(max=len(round_keys) - 1)
+    start_trumps = np.where(round_keys[positions] == start_keys, round_trumps[positions], -1)
+    return np.repeat(start_trumps, np.diff(np.append(round_starts, len(row_keys))))
+
+
+def encode_played_cards(tricks_df: pd.DataFrame, auctions_df: pd.DataFrame) -> PlayedCards:
+    trump_codes = get_trump_codes(tricks_df, auctions_df)
+    cards = tricks_df['card'].cat.codes.to_numpy().astype(np.int64)
+    players = tricks_df['player'].cat.codes.to_numpy()
+    trick_positions = tricks_df['trick_position'].to_numpy().astype(np.int64)
+
+    # trick of every row, winner and points being read on the last row of the trick
+    trick_indexes = np.cumsum(trick_positions == 0) - 1
+    trick_ends = tricks_df['is_last_in_trick'].to_numpy()
+    nb_tricks = trick_indexes[-1] + 1 if len(trick_indexes) else 0
+    trick_winners = np.full(nb_tricks, -1, dtype=np.int8)
+    trick_winners[trick_indexes[trick_ends]] = tricks_df['trick_winner'].cat.codes.to_numpy()[trick_ends]
+    trick_points = np.zeros(nb_tricks)
+    trick_points[trick_indexes[trick_ends]] = np.nan_to_num(tricks_df['trick_points'].to_numpy(dtype=float)[trick_ends])
+    won = trick_winners[trick_indexes] == players
+
+    mask = trump_codes >= 0
+    return PlayedCards(
+        card=cards[mask], trick_position=trick_positions[mask], team=PLAYER_TEAM_CODES[players[mask]],
+        is_trump=(cards[mask] // NB_VALUES) == trump_codes[mask], won=won[mask],
+        points_captured=np.where(won, trick_points[trick_indexes], 0.)[mask],
+        is_first_lead=((tricks_df['trick_id'].to_numpy() == 0) & (trick_positions == 0))[mask]
+    )
+
+
+def compute_card_statistics(played_cards: PlayedCards) -> pd.DataFrame:
+    """one row per (card, trick position, is_trump) played at least once"""
+    cells = (played_cards.card * NB_TRICK_POSITIONS + played_cards.trick_position) * 2 + played_cards.is_trump
+    nb_cells = NB_CARDS * NB_TRICK_POSITIONS * 2
+    nb_plays = np.bincount(cells, minlength=nb_cells)
+    nb_won = np.bincount(cells, weights=played_cards.won, minlength=nb_cells)
+    points_captured = np.bincount(cells, weights=played_cards.points_captured, minlength=nb_cells)
+    played = np.flatnonzero(nb_plays)
+    return pd.DataFrame({
+        'card': np.array(PLAIN_CARDS)[played // (2 * NB_TRICK_POSITIONS)],
+        'trick_position': (played // 2) % NB_TRICK_POSITIONS,
+        'is_trump': (played % 2).astype(bool),
+        'nb_plays': nb_plays[played],
+        'pc_tricks_won': nb_won[played] / nb_plays[played],
+        'avg_points_captured': points_captured[played] / nb_plays[played],
+    }, columns=CARD_STATS_COLUMNS)
+
+
+def compute_first_leads(played_cards: PlayedCards) -> pd.DataFrame:
+    """distribution of the first card of rounds by team of its player: one row per (team, card, is_trump) led"""
+    leads = played_cards.is_first_lead
+    cells = (played_cards.team[leads] * NB_CARDS + played_cards.card[leads]) * 2 + played_cards.is_trump[leads]
+    nb_leads = np.bincount(cells, minlength=len(TEAMS) * NB_CARDS * 2).reshape(len(TEAMS), -1)
+    pc_leads = nb_leads / np.maximum(nb_leads.sum(axis=1, keepdims=True), 1)
+    led = np.flatnonzero(nb_leads)
+    return pd.DataFrame({
+        'team': np.array(TEAMS)[led // (2 * NB_CARDS)],
+        'card': np.array(PLAIN_CARDS)[(led // 2) % NB_CARDS],
+        'is_trump': (led % 2).astype(bool),
+        'nb_leads': nb_leads.ravel()[led],
+        'pc_leads': pc_leads.ravel()[led],
+    }, columns=FIRST_LEADS_COLUMNS)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Card-level statistics of the games of two agents')
+    parser.add_argument('ew_agent')
+    parser.add_argument('ns_agent')
+    args = parser.parse_args()
+
+    auctions, tricks = prepare_datasets(ew_agent=args.ew_agent, ns_agent=args.ns_agent)
+    cards = encode_played_cards(tricks, auctions)
+    print(compute_card_statistics(cards).to_string(index=False, float_format='{:.3f}'.format))
+    first_leads_df = compute_first_leads(cards)
+    first_leads_df['team'] = first_leads_df['team'].map({'east/west': args.ew_agent, 'north/south': args.ns_agent})
+    print(first_leads_df.rename(columns={'team': 'agent'}).to_string(index=False, float_format='{:.3f}'.format))
@@ -0,0 +1,139 @@
+# Benchmark of analysis.card_stats on synthetic typed auctions / tricks tables (cf analysis.typed_csv):
+#   python -m analysis.card_stats_benchmark --nb-rounds 400000   (12.8 million tricks rows)
+# Played cards, card statistics and first leads are computed from integer codes (cf analysis.card_stats) and by
+# a reference on string columns, with merges and groupby, which is kept below: results are checked to be equal.
+import argparse
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from analysis import analyze
+from analysis.analyze_benchmark import time_call
+from analysis.card_codes import NB_CARDS
+from analysis.card_stats import (
+    CARD_STATS_COLUMNS, FIRST_LEADS_COLUMNS, NB_TRICK_POSITIONS, compute_card_statistics, compute_first_leads,
+    encode_played_cards
+)
+from analysis.typed_csv import AUCTIONS_DTYPES, CARD_DTYPE, PLAYER_DTYPE
+
+ROUNDS_PER_GAME = 20
+BIDS_PER_ROUND = 4
+NB_TRICKS = NB_CARDS // NB_TRICK_POSITIONS
+
+
+def build_synthetic_tables(nb_rounds: int, seed: int = 0) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """typed frames of prepare_datasets (columns read by analysis.card_stats only)"""
+    rng = np.random.default_rng(seed)
+
+    # auctions: BIDS_PER_ROUND actions per round, the trump being the color of the last bet (if any)
+    bid_round = np.repeat(np.arange(nb_rounds), BIDS_PER_ROUND)
+    bet = rng.random(len(bid_round)) < 0.4
+    auctions_df = pd.DataFrame({
+        'experiment_id': pd.Categorical.from_codes(np.zeros(len(bid_round), dtype=np.int8), categories=['exp']),
+        'game_id': (bid_round // ROUNDS_PER_GAME).astype(np.int32),
+        'round_id': (bid_round % ROUNDS_PER_GAME).astype(np.int16),
+        'player': pd.Categorical.from_codes(np.arange(len(bid_round)) % 4, dtype=PLAYER_DTYPE),
+        'action': pd.Categorical.from_codes(np.where(bet, 0, 1), dtype=AUCTIONS_DTYPES['action']),
+        'color': pd.Categorical.from_codes(
+            np.where(bet, rng.integers(0, 4, len(bid_round)), -1), dtype=AUCTIONS_DTYPES['color']
+        ),
+    })
+
+    # tricks: the 32 cards of a round in a random order, 4 per trick from a random opener,
+    # winner and points being only filled on the last row of a trick
+    row = np.arange(NB_CARDS * nb_rounds)
+    trick_round = row // NB_CARDS
+    trick_position = row % NB_TRICK_POSITIONS
+    is_last_in_trick = trick_position == NB_TRICK_POSITIONS - 1
+    openers = np.repeat(rng.integers(0, 4, NB_TRICKS * nb_rounds), NB_TRICK_POSITIONS)
+    cards = rng.permuted(np.tile(np.arange(NB_CARDS, dtype=np.int8), (nb_rounds, 1)), axis=1).ravel()
+    tricks_df = pd.DataFrame({
+        'experiment_id': pd.Categorical.from_codes(np.zeros(len(row), dtype=np.int8), categories=['exp']),
+        'game_id': (trick_round // ROUNDS_PER_GAME).astype(np.int32),
+        'round_id': (trick_round % ROUNDS_PER_GAME).astype(np.int16),
+        'trick_id': ((row // NB_TRICK_POSITIONS) % NB_TRICKS).astype(np.int8),
+        'player': pd.Categorical.from_codes((openers + trick_position) % 4, dtype=PLAYER_DTYPE),
+        'trick_position': trick_position.astype(np.int8),
+        'card': pd.Categorical.from_codes(cards, dtype=CARD_DTYPE),
+        'is_last_in_trick': is_last_in_trick,
+        'trick_winner': pd.Categorical.from_codes(
+            np.where(is_last_in_trick, rng.integers(0, 4, len(row)), -1), dtype=PLAYER_DTYPE
+        ),
+        'trick_points': np.where(is_last_in_trick, rng.integers(0, 60, len(row)), np.nan).astype(np.float32),
+    })
+    return auctions_df, tricks_df
+
+
+# reference on string columns, with merges and groupby
+def reference_played_cards(tricks_df: pd.DataFrame, auctions_df: pd.DataFrame) -> pd.DataFrame:
+    """one row per played card, with string columns and merges"""
+    trumps = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(analyze.ROUND_KEYS, keep='last')[
+        analyze.ROUND_KEYS + ['color']
+    ].astype({'experiment_id': str, 'color': str})
+    trick_keys = analyze.ROUND_KEYS + ['trick_id']
+    trick_ends = tricks_df[tricks_df['is_last_in_trick']][trick_keys + ['trick_winner', 'trick_points']]
+    df = tricks_df[trick_keys + ['player', 'trick_position', 'card']].astype({'experiment_id': str}).merge(
+        trick_ends.astype({'experiment_id': str}), on=trick_keys
+    ).merge(trumps, on=analyze.ROUND_KEYS)
+    df['card'] = df['card'].astype(str)
+    df['is_trump'] = df['card'].str[-1] == df['color']
+    df['won'] = df['player'].astype(str) == df['trick_winner'].astype(str)
+    df['points_captured'] = np.where(df['won'], df['trick_points'], 0.)
+    df['team'] = df['player'].astype(str).map(analyze.PLAYER_TO_TEAM)
+    return df
+
+
+def reference_card_statistics(reference_df: pd.DataFrame) -> pd.DataFrame:
+    return reference_df.groupby(['card', 'trick_position', 'is_trump']).agg(
+        nb_plays=('won', 'size'), pc_tricks_won=('won', 'mean'), avg_points_captured=('points_captured', 'mean')
+    ).reset_index()[CARD_STATS_COLUMNS]
+
+
+def reference_first_leads(reference_df: pd.DataFrame) -> pd.DataFrame:
+    leads_df = reference_df[(reference_df['trick_id'] == 0) & (reference_df['trick_position'] == 0)]
+    first_leads_df = leads_df.groupby(['team', 'card', 'is_trump']).size().rename('nb_leads').reset_index()
+    first_leads_df['pc_leads'] = first_leads_df['nb_leads'] / first_leads_df.groupby('team')['nb_leads'].transform(
+        'sum'
+    )
+    return first_leads_df[FIRST_LEADS_COLUMNS]
+
+
+def assert_same_frames(df: pd.DataFrame, reference_df: pd.DataFrame, keys: List[str]):
+    pd.testing.assert_frame_equal(
+        df.sort_values(keys).reset_index(drop=True), reference_df.sort_values(keys).reset_index(drop=True),
+        check_dtype=False
+    )
+
+
+def run_benchmark(nb_rounds: int, check_reference: bool = True) -> pd.DataFrame:
+    auctions_df, tricks_df = build_synthetic_tables(nb_rounds)
+    played_cards_time, played_cards = time_call(encode_played_cards, tricks_df, auctions_df)
+    card_stats_time, card_stats_df = time_call(compute_card_statistics, played_cards)
+    first_leads_time, first_leads_df = time_call(compute_first_leads, played_cards)
+    rows = [
+        {'step': 'played cards', 'codes': played_cards_time},
+        {'step': 'card statistics', 'codes': card_stats_time},
+        {'step': 'first leads', 'codes': first_leads_time},
+    ]
+    if check_reference:
+        rows[0]['reference'], reference_df = time_call(reference_played_cards, tricks_df, auctions_df)
+        rows[1]['reference'], reference_card_stats_df = time_call(reference_card_statistics, reference_df)
+        rows[2]['reference'], reference_first_leads_df = time_call(reference_first_leads, reference_df)
+        assert len(played_cards.card) == len(reference_df)
+        assert_same_frames(card_stats_df, reference_card_stats_df, keys=['card', 'trick_position', 'is_trump'])
+        assert_same_frames(first_leads_df, reference_first_leads_df, keys=['team', 'card', 'is_trump'])
+    benchmark_df = pd.DataFrame(rows, columns=['step', 'reference', 'codes'])
+    benchmark_df['speedup'] = benchmark_df['reference'] / benchmark_df['codes']
+    return benchmark_df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the card-level statistics of analysis.card_stats')
+    parser.add_argument('--nb-rounds', type=int, default=400_000, help='32 tricks rows per round')
+    parser.add_argument('--no-reference', action='store_true', help='only time the statistics on integer codes')
+    args = parser.parse_args()
+    print(f'{args.nb_rounds} rounds, {NB_CARDS * args.nb_rounds} tricks rows')
+    benchmark_df = run_benchmark(args.nb_rounds, check_reference=not args.no_reference)
+    print(benchmark_df.to_string(index=False, float_format='{:.3f}'.format))
+    print(f"{NB_CARDS * args.nb_rounds / benchmark_df['codes'].sum() / 1e6:.1f} million rows per second")
@@ -0,0 +1,48 @@
+import numpy as np
+
+from analysis import analyze
+from analysis.card_stats import (
+    CARD_STATS_COLUMNS, FIRST_LEADS_COLUMNS, compute_card_statistics, compute_first_leads, encode_played_cards
+)
+from analysis.card_stats_benchmark import (
+    assert_same_frames, reference_card_statistics, reference_first_leads, reference_played_cards, run_benchmark
+)
+from analysis.experiment import run_experiment
+
+
+def test_card_statistics_match_reference_on_synthetic_tables():
+    benchmark_df = run_benchmark(nb_rounds=500)  # results are compared in run_benchmark
+    assert benchmark_df['step'].tolist() == ['played cards', 'card statistics', 'first leads']
+    assert benchmark_df['reference'].notna().all()
+
+
+def test_card_statistics_match_reference(tmp_path, monkeypatch):
+    run_experiment('RANDOM', 'HIGHEST_CARD', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    run_experiment('HIGHEST_CARD', 'RANDOM', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    monkeypatch.setattr(analyze, 'DATA_PATH', str(tmp_path))
+    auctions_df, tricks_df = analyze.prepare_datasets(ew_agent='RANDOM', ns_agent='HIGHEST_CARD')
+    played_cards = encode_played_cards(tricks_df, auctions_df)
+    reference_df = reference_played_cards(tricks_df, auctions_df)
+    assert len(played_cards.card) == len(tricks_df) == len(reference_df)
+
+    card_stats_df = compute_card_statistics(played_cards)
+    assert list(card_stats_df.columns) == CARD_STATS_COLUMNS
+    assert_same_frames(
+        card_stats_df, reference_card_statistics(reference_df), keys=['card', 'trick_position', 'is_trump']
+    )
+    # every card is counted once, every trick has one winner
+    assert card_stats_df['nb_plays'].sum() == len(tricks_df)
+    np.testing.assert_allclose((card_stats_df['pc_tricks_won'] * card_stats_df['nb_plays']).sum(), len(tricks_df) // 4)
+
+    first_leads_df = compute_first_leads(played_cards)
+    assert list(first_leads_df.columns) == FIRST_LEADS_COLUMNS
+    assert_same_frames(first_leads_df, reference_first_leads(reference_df), keys=['team', 'card', 'is_trump'])
+    assert first_leads_df['nb_leads'].sum() == analyze.count_distinct(tricks_df, analyze.ROUND_KEYS)
+
+
+def test_card_statistics_of_empty_datasets(tmp_path, monkeypatch):
+    monkeypatch.setattr(analyze, 'DATA_PATH', str(tmp_path))
+    auctions_df, tricks_df = analyze.prepare_datasets(ew_agent='RANDOM', ns_agent='RANDOM')
+    played_cards = encode_played_cards(tricks_df, auctions_df)
+    assert compute_card_statistics(played_cards).empty
+    assert compute_first_leads(played_cards).empty
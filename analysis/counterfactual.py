@@ -0,0 +1,204 @@
+# COUNTERFACTUAL EVALUATION
+#
+# Audits logged play decisions (cf analysis.game_log): the round of a decision is rebuilt from its deal record
+# (auction and cards played before the decision, previous rounds are not replayed), then every legal card of the
+# deciding player is played in a copy of that state and the round is rolled out to its end by continuation agents.
+# Rollouts of a card only differ by the seed of the random choices of the agents: deterministic agents
+# (HIGHEST_CARD, EXPERT) need a single one.
+# The outcome of a rollout is the round score of the deciding team minus the one of the other team
+# (cf analysis.simulation.compute_round_score); deltas compare every card to the logged one.
+import os
+import random
+from collections import defaultdict
+from multiprocessing import Pool
+from time import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from analysis.card_codes import decode_card, decode_hands
+from analysis.experiment import Agent
+from analysis.game_log import DealRecord, GameRecord, iter_game_log, run_logged_experiment
+from analysis.simulation import NB_TRICKS, compute_round_score, continue_round
+from helpers.structures import Auction, Card, Player, Round, Team, PLAYER_TO_TEAM
+
+COUNTERFACTUAL_COLUMNS = [
+    'experiment_id', 'game_id', 'deal_id', 'position', 'trick_id', 'player', 'played_card', 'card',
+    'nb_rollouts', 'mean_outcome', 'std_outcome', 'delta',
+]
+ROLLOUTS_PER_TASK = 50
+
+
+class DecisionPoint(NamedTuple):
+    round_: Round  # state just before the decision, branches are played on copies (cf copy_round)
+    contract_team: Team
+    contract: int
+    game_history: Dict[str, List[str]]
+    tricks_first_player: List[str]
+    plays: List[Tuple[Player, Card]]
+    player: Player
+    played_card: Card  # logged decision
+
+
+def copy_round(round_: Round) -> Round:
+    """independent copy of the state of a round (cards are shared, they are never updated)"""
+    copy = Round(hands={player: list(hand.cards) for (player, hand) in round_.hands.items()},
+                 trick_opener=round_.trick_opener)
+    copy.trick_cards.cards = dict(round_.trick_cards.cards)
+    copy.trick_cards.leader = round_.trick_cards.leader
+    copy.trick = round_.trick
+    copy.score = dict(round_.score)
+    copy.belote = list(round_.belote)
+    copy.trump = round_.trump
+    return copy
+
+
+def play_card(
+        round_: Round, player: Player, card: Card, game_history: Dict[str, List[str]],
+        tricks_first_player: List[str], plays: List[Tuple[Player, Card]]
+):
+    """play a given card, history being updated as analysis.simulation.continue_round does"""
+    if len(tricks_first_player) == round_.trick:
+        tricks_first_player.append(round_.trick_opener.value)
+    trick_cards = {player_: card_ for (player_, card_) in round_.trick_cards.cards.items() if card_ is not None}
+    trick_cards[player] = card
+    round_.update(player=player, card_index=round_.hands[player].cards.index(card))
+    plays.append((player, card))
+    if len(trick_cards) == 4:
+        for (player_, card_) in trick_cards.items():
+            game_history[player_.value].append(card_.describe_plain())
+
+
+def rebuild_decision_point(deal: DealRecord, position: int) -> DecisionPoint:
+    """state of the round before its position-th card (0 to 31) was played"""
+    if not 0 <= position < len(deal.plays):
+        raise ValueError(f'Position ({position}) is not a played card of the deal ({len(deal.plays)} cards)')
+    auction = Auction()
+    for (player, action, color, value) in deal.bids:
+        auction.update(player=player, passed=(action == 'pass'), color=color, value=value)
+    round_ = Round(hands=decode_hands(np.frombuffer(deal.codes, dtype=np.uint8)), trick_opener=deal.first_player)
+    round_.set_trump(auction.get_best_color())
+    game_history = {player.value: [] for player in Player}
+    tricks_first_player, plays = [], []
+    for (player, code) in deal.plays[:position]:
+        play_card(round_, player, decode_card(code), game_history, tricks_first_player, plays)
+    player, code = deal.plays[position]
+    return DecisionPoint(
+        round_=round_, contract_team=PLAYER_TO_TEAM[auction.current_best],
+        contract=auction.bids[auction.current_best].value, game_history=game_history,
+        tricks_first_player=tricks_first_player, plays=plays, player=player, played_card=decode_card(code)
+    )
+
+
+def iter_decision_points(
+        games: Iterator[GameRecord], trick_ids: Sequence[int] = range(NB_TRICKS),
+        players: Sequence[Player] = tuple(Player)
+) -> Iterator[Tuple[Dict, DecisionPoint]]:
+    """(keys, decision point) of the plays of the given players in the given tricks"""
+    for game in games:
+        for (deal_id, deal) in enumerate(game.deals):
+            for (position, (player, _)) in enumerate(deal.plays):
+                if (position // 4 in trick_ids) and (player in players):
+                    keys = {'experiment_id': game.experiment_id, 'game_id': game.game_id, 'deal_id': deal_id,
+                            'position': position, 'trick_id': position // 4, 'player': player.value}
+                    yield keys, rebuild_decision_point(deal, position)
+
+
+def get_legal_cards(decision_point: DecisionPoint) -> List[Card]:
+    hand = decision_point.round_.hands[decision_point.player].cards
+    playability = decision_point.round_.get_cards_playability(decision_point.player)
+    return [card for (card, playable) in zip(hand, playability) if playable]
+
+
+def rollout(decision_point: DecisionPoint, card: Card, agents: Dict[Player, Agent], seed: int) -> int:
+    """outcome of the round when card is played at the decision point, then agents play the remaining cards"""
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+    round_ = copy_round(decision_point.round_)
+    game_history = {player: list(cards) for (player, cards) in decision_point.game_history.items()}
+    tricks_first_player = list(decision_point.tricks_first_player)
+    plays = list(decision_point.plays)
+    play_card(round_, decision_point.player, card, game_history, tricks_first_player, plays)
+    continue_round(
+        round_=round_, contract_team=decision_point.contract_team, agents=agents, game_history=game_history,
+        tricks_first_player=tricks_first_player, plays=plays
+    )
+    round_score = compute_round_score(round_, decision_point.contract_team, decision_point.contract)
+    team = PLAYER_TO_TEAM[decision_point.player]
+    other_team = Team.TWO if team == Team.ONE else Team.ONE
+    return round_score[team] - round_score[other_team]
+
+
+def rollout_card(task: Tuple[int, DecisionPoint, Card, Dict[Player, Agent], List[int]]) -> Tuple[int, str, List[int]]:
+    decision_id, decision_point, card, agents, seeds = task
+    return decision_id, card.describe_plain(), [rollout(decision_point, card, agents, seed) for seed in seeds]
+
+
+def evaluate_decisions(
+        decision_points: List[Tuple[Dict, DecisionPoint]], agents: Dict[Player, Agent], nb_rollouts: int = 100,
+        seed: int = 0, nb_processes: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    one row per decision point and legal card: mean (and std) outcome of its rollouts,
+    delta with the mean outcome of the logged card (rollouts use the same seeds for every card)
+    """
+    tasks = [
+        (decision_id, decision_point, card, agents,
+         list(range(seed + first_rollout, seed + min(first_rollout + ROLLOUTS_PER_TASK, nb_rollouts))))
+        for (decision_id, (_, decision_point)) in enumerate(decision_points)
+        for card in get_legal_cards(decision_point)
+        for first_rollout in range(0, nb_rollouts, ROLLOUTS_PER_TASK)
+    ]
+    outcomes = defaultdict(list)
+    with Pool(processes=nb_processes) as pool:
+        for (decision_id, card, card_outcomes) in pool.imap_unordered(rollout_card, tasks):
+            outcomes[(decision_id, card)].extend(card_outcomes)
+
+    rows = []
+    for (decision_id, (keys, decision_point)) in enumerate(decision_points):
+        played_card = decision_point.played_card.describe_plain()
+        played_mean_outcome = np.mean(outcomes[(decision_id, played_card)])
+        for card in get_legal_cards(decision_point):
+            card_outcomes = outcomes[(decision_id, card.describe_plain())]
+            rows.append({
+                **keys,
+                'played_card': played_card,
+                'card': card.describe_plain(),
+                'nb_rollouts': len(card_outcomes),
+                'mean_outcome': np.mean(card_outcomes),
+                'std_outcome': np.std(card_outcomes),
+                'delta': np.mean(card_outcomes) - played_mean_outcome,
+            })
+    return pd.DataFrame(rows, columns=COUNTERFACTUAL_COLUMNS)
+
+
+def run_counterfactual_audit(
+        log_path: str, agents: Dict[Player, Agent], trick_ids: Sequence[int] = range(NB_TRICKS),
+        players: Sequence[Player] = tuple(Player), max_decisions: Optional[int] = None, nb_rollouts: int = 100,
+        seed: int = 0, nb_processes: Optional[int] = None
+) -> pd.DataFrame:
+    """evaluates the logged decisions and appends them to counterfactual_data.csv, next to the game log"""
+    decision_points = []
+    for decision_point in iter_decision_points(iter_game_log(log_path), trick_ids=trick_ids, players=players):
+        if (max_decisions is not None) and (len(decision_points) >= max_decisions):
+            break
+        decision_points.append(decision_point)
+    counterfactual_df = evaluate_decisions(
+        decision_points, agents=agents, nb_rollouts=nb_rollouts, seed=seed, nb_processes=nb_processes
+    )
+    output_path = os.path.join(os.path.dirname(log_path), 'counterfactual_data.csv')
+    counterfactual_df.to_csv(output_path, sep=';', mode='a', header=not os.path.exists(output_path), index=False)
+    return counterfactual_df
+
+
+if __name__ == '__main__':
+    start_time = time()
+    path = run_logged_experiment(east_west_agents='EXPERT', north_south_agents='EXPERT', nb_games=2)
+    df = run_counterfactual_audit(
+        log_path=path, agents={player: 'EXPERT' for player in Player}, trick_ids=[3],
+        players=[Player.ONE, Player.THREE], nb_rollouts=1
+    )
+    print(f"{(df['delta'] > 0).sum()} better alternatives found")
+    print(df.sort_values('delta', ascending=False).head(10).to_string(index=False))
+    print(f'elapsed time: {time()-start_time} sec')
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from analysis.counterfactual import (
+    evaluate_decisions, get_legal_cards, iter_decision_points, rebuild_decision_point, rollout,
+    run_counterfactual_audit
+)
+from analysis.card_codes import encode_card
+from analysis.game_log import play_recorded_game, run_logged_experiment
+from helpers.structures import Player, Team, PLAYER_TO_TEAM
+
+HIGHEST_CARD_AGENTS = {player: 'HIGHEST_CARD' for player in Player}
+RANDOM_AGENTS = {player: 'RANDOM' for player in Player}
+
+
+@pytest.fixture(scope='module')
+def played_deal():
+    game = play_recorded_game(HIGHEST_CARD_AGENTS, 'exp', 0, seed=3)
+    return next(deal for deal in game.deals if deal.plays)
+
+
+def test_rebuild_decision_point(played_deal):
+    decision_point = rebuild_decision_point(played_deal, position=13)
+    assert decision_point.round_.trick == 3
+    assert len(decision_point.tricks_first_player) == 4
+    assert all(len(cards) == 3 for cards in decision_point.game_history.values())
+    assert sum(card is not None for card in decision_point.round_.trick_cards.cards.values()) == 1
+    assert (decision_point.player, encode_card(decision_point.played_card)) == played_deal.plays[13]
+    assert decision_point.played_card in get_legal_cards(decision_point)
+    with pytest.raises(ValueError):
+        rebuild_decision_point(played_deal, position=32)
+
+
+def test_rollout_of_logged_card_replays_the_round(played_deal):
+    # agents of the log are deterministic: every decision point of the round leads to the same outcome
+    east_west_outcomes = set()
+    for position in [0, 6, 13, 31]:
+        decision_point = rebuild_decision_point(played_deal, position)
+        outcome = rollout(decision_point, decision_point.played_card, HIGHEST_CARD_AGENTS, seed=0)
+        east_west_outcomes.add(outcome if PLAYER_TO_TEAM[decision_point.player] == Team.ONE else -outcome)
+    assert len(east_west_outcomes) == 1
+
+
+def test_rollouts_do_not_update_the_decision_point(played_deal):
+    decision_point = rebuild_decision_point(played_deal, position=9)
+    hands = {player: list(hand.cards) for (player, hand) in decision_point.round_.hands.items()}
+    plays = list(decision_point.plays)
+    for card in get_legal_cards(decision_point):
+        rollout(decision_point, card, RANDOM_AGENTS, seed=0)
+    assert {player: hand.cards for (player, hand) in decision_point.round_.hands.items()} == hands
+    assert decision_point.plays == plays and decision_point.round_.trick == 2
+
+
+def test_evaluate_decisions():
+    game = play_recorded_game(HIGHEST_CARD_AGENTS, 'exp', 0, seed=3)
+    decision_points = list(iter_decision_points([game], trick_ids=[2], players=[Player.ONE]))
+    assert {keys['trick_id'] for (keys, _) in decision_points} == {2}
+    df = evaluate_decisions(decision_points, RANDOM_AGENTS, nb_rollouts=3, nb_processes=1)
+    assert len(df) == sum(len(get_legal_cards(decision_point)) for (_, decision_point) in decision_points)
+    assert (df['nb_rollouts'] == 3).all()
+    assert (df.loc[df['card'] == df['played_card'], 'delta'] == 0).all()
+
+
+def test_run_counterfactual_audit(tmp_path):
+    log_path = run_logged_experiment('HIGHEST_CARD', 'HIGHEST_CARD', nb_games=1, data_path=str(tmp_path))
+    df = run_counterfactual_audit(
+        log_path, HIGHEST_CARD_AGENTS, trick_ids=[3], max_decisions=2, nb_rollouts=1, nb_processes=1
+    )
+    assert df[['game_id', 'deal_id', 'position']].drop_duplicates().shape[0] == 2
+    assert os.path.exists(os.path.join(os.path.dirname(log_path), 'counterfactual_data.csv'))
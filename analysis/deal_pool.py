@@ -0,0 +1,76 @@
+# Pool of pre-shuffled deals stored as a memory-mapped (n_deals, 32) uint8 array of card codes.
+# Replaying the same pool for every pair of agents gives common random numbers across pairs.
+from typing import Dict, List, Optional, Callable, Union
+
+import numpy as np
+
+from analysis.card_codes import NB_CARDS, decode_hands
+from helpers.structures import Game, Player, Card, Describable
+
+DEAL_POOL_PATH = './data/deal_pool.npy'
+DEALS_PER_GAME = 64  # game g starts reading the pool at g * DEALS_PER_GAME, whatever the pair of agents
+GENERATION_CHUNK_SIZE = 100_000
+
+
+def generate_deal_pool(path: str, nb_deals: int, seed: Optional[int] = None):
+    rng = np.random.default_rng(seed)
+    deal_pool = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=(nb_deals, NB_CARDS))
+    for start in range(0, nb_deals, GENERATION_CHUNK_SIZE):
+        stop = min(start + GENERATION_CHUNK_SIZE, nb_deals)
+        # argsort of uniform noise gives one independent permutation per line
+        deal_pool[start:stop] = np.argsort(rng.random((stop - start, NB_CARDS)), axis=1)
+    deal_pool.flush()
+    del deal_pool
+
+
+def load_deal_pool(path: str) -> np.ndarray:
+    return np.load(path, mmap_mode='r')
+
+
+def pool_dealer(deal_pool: np.ndarray, first_deal: int) -> Callable[[], Dict[Player, List[Card]]]:
+    """
+    deal function (cf analysis.simulation.play_game) reading the deals of a game from first_deal onwards,
+    wrapping around the pool as PooledGame does (a game may need more than DEALS_PER_GAME deals)
+    """
+    next_deal = first_deal
+
+    def deal():
+        nonlocal next_deal
+        codes = deal_pool[next_deal % len(deal_pool)]
+        next_deal += 1
+        return decode_hands(codes)
+    return deal
+
+
+def seeded_dealer(seed: Union[int, List[int]]) -> Callable[[], Dict[Player, List[Card]]]:
+    """
+    deal function (cf analysis.simulation.play_game) shuffling with its own generator: deals only depend on seed,
+    not on the random choices of the agents (which share the global random streams with Game.deal)
+    """
+    rng = np.random.default_rng(seed)
+
+    def deal():
+        return decode_hands(rng.permutation(NB_CARDS))
+    return deal
+
+
+class PooledGame(Game):
+    """Game whose successive deals are read from a deal pool instead of being shuffled"""
+    def __init__(self, first_player: Player, deal_pool: np.ndarray, first_deal: int = 0):
+        self.deal_pool = deal_pool
+        self.next_deal = first_deal
+        super().__init__(first_player=first_player)
+
+    def deal(self) -> Dict[Player, List[Card]]:
+        codes = self.deal_pool[self.next_deal % len(self.deal_pool)]
+        self.next_deal += 1
+        return decode_hands(codes)
+
+    def describe(self):
+        return {
+            k: Describable._describe(v) for k, v in self.__dict__.items() if k not in ['deal_pool', 'next_deal']
+        }
+
+
+if __name__ == '__main__':
+    generate_deal_pool(path=DEAL_POOL_PATH, nb_deals=1_000_000, seed=13)
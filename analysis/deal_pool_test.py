@@ -0,0 +1,61 @@
+import random
+
+import numpy as np
+
+from analysis.card_codes import NB_CARDS, encode_hands
+from analysis.deal_pool import (
+    DEALS_PER_GAME, generate_deal_pool, load_deal_pool, pool_dealer, seeded_dealer, PooledGame
+)
+from helpers.structures import Game, Player
+
+
+def test_generate_deal_pool(tmp_path):
+    path = str(tmp_path / 'deal_pool.npy')
+    generate_deal_pool(path=path, nb_deals=100, seed=13)
+    deal_pool = load_deal_pool(path)
+    assert deal_pool.shape == (100, NB_CARDS)
+    assert not deal_pool.flags.writeable
+    assert (np.sort(deal_pool, axis=1) == np.arange(NB_CARDS)).all()
+
+
+def test_encode_hands_is_consistent_with_game_deal():
+    hands = Game.deal()
+    assert sorted(encode_hands(hands).tolist()) == list(range(NB_CARDS))
+
+
+def test_pooled_games_replay_same_deals(tmp_path):
+    path = str(tmp_path / 'deal_pool.npy')
+    generate_deal_pool(path=path, nb_deals=10, seed=13)
+    deal_pool = load_deal_pool(path)
+    game_1 = PooledGame(first_player=Player.ONE, deal_pool=deal_pool, first_deal=3)
+    game_2 = PooledGame(first_player=Player.ONE, deal_pool=deal_pool, first_deal=3)
+    assert game_1.describe() == game_2.describe()
+    assert encode_hands({p: hand.cards for p, hand in game_1.round.hands.items()}).tolist() == deal_pool[3].tolist()
+    # redeal after 4 passes reads next deal of the pool
+    for player in [Player.ONE, Player.TWO, Player.THREE, Player.FOUR]:
+        game_1.update(player=player, passed=True, color=None, value=None)
+    assert encode_hands({p: hand.cards for p, hand in game_1.round.hands.items()}).tolist() == deal_pool[4].tolist()
+
+
+def test_pool_dealer_reads_deals_like_pooled_games(tmp_path):
+    path = str(tmp_path / 'deal_pool.npy')
+    generate_deal_pool(path=path, nb_deals=10, seed=13)
+    deal_pool = load_deal_pool(path)
+    deal = pool_dealer(deal_pool, first_deal=3)
+    game = PooledGame(first_player=Player.ONE, deal_pool=deal_pool, first_deal=3)
+    assert encode_hands(deal()).tolist() == deal_pool[3].tolist()  # first deal of the game, read in its constructor
+    for _ in range(DEALS_PER_GAME + 5):  # e.g. many redeals after 4 passes
+        assert encode_hands(deal()).tolist() == encode_hands(game.deal()).tolist()
+
+
+def test_seeded_dealer_ignores_global_random_streams():
+    deal = seeded_dealer([0, 1])
+    first_deals = [encode_hands(deal()).tolist() for _ in range(3)]
+    assert all(sorted(codes) == list(range(NB_CARDS)) for codes in first_deals)
+    deal = seeded_dealer([0, 1])
+    same_deals = []
+    for _ in range(3):
+        random.random(), np.random.random()  # random choices of agents between deals
+        same_deals.append(encode_hands(deal()).tolist())
+    assert same_deals == first_deals
+    assert encode_hands(seeded_dealer([0, 2])()).tolist() != first_deals[0]
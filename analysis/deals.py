@@ -0,0 +1,94 @@
+# DEALS TABLE
+#
+# deals_data.csv holds one line per deal with its 32 card codes (cf analysis.card_codes).
+# auctions_data.csv lines reference it by (experiment_id, game_id, round_id, deal_id),
+# tricks_data.csv lines by (experiment_id, game_id, round_id): the played deal of a round is its last one.
+import os
+from ast import literal_eval
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from analysis.card_codes import HAND_SIZE, DESCRIBED_CARD_TO_CODE, decode_deals
+from analysis.experiment import AUCTIONS_COLUMNS, DEALS_COLUMNS
+from helpers.structures import Player
+
+ROUND_KEYS = ['experiment_id', 'game_id', 'round_id']
+DEAL_KEYS = ROUND_KEYS + ['deal_id']
+ALL_PLAYERS = list(Player)
+PLAYER_INDEX = {player.value: i for (i, player) in enumerate(ALL_PLAYERS)}
+
+
+def get_played_deals(deals_df: pd.DataFrame) -> pd.DataFrame:
+    return deals_df.sort_values(DEAL_KEYS).drop_duplicates(ROUND_KEYS, keep='last')
+
+
+def add_player_hands(df: pd.DataFrame, deals_df: pd.DataFrame, keys: List[str] = DEAL_KEYS,
+                     player_column: str = 'player') -> pd.DataFrame:
+    """add the 8 card codes of the hand of player_column (hand_0, ..., hand_7) to every line of df"""
+    deals_df = deals_df[keys + ['deal']].reset_index(drop=True)
+    hands = decode_deals(deals_df['deal']).reshape(-1, len(Player), HAND_SIZE)
+    deal_index_df = deals_df[keys].assign(deal_index=np.arange(len(deals_df)))
+    merged_df = df.merge(deal_index_df, how='left', on=keys)
+    player_hands = hands[merged_df['deal_index'].to_numpy(), merged_df[player_column].map(PLAYER_INDEX).to_numpy()]
+    hand_columns = [f'hand_{i}' for i in range(HAND_SIZE)]
+    return merged_df.drop(columns='deal_index').join(pd.DataFrame(player_hands, columns=hand_columns))
+
+
+def _assign_deal_ids(round_df: pd.DataFrame) -> List[int]:
+    deal_ids = []
+    deal_id = 0
+    current_hands = {}
+    for (player, cards) in round_df[['player', 'cards']].values:
+        if current_hands.get(player, cards) != cards:  # same player with another hand: cards were dealt again
+            deal_id += 1
+            current_hands = {}
+        current_hands[player] = cards
+        deal_ids.append(deal_id)
+    return deal_ids
+
+
+def normalize_auctions_data(dir_path: str):
+    """
+    migrate an auctions_data.csv file storing the hand of the bidder on every line (`cards` column)
+    to the deals_data.csv + auctions_data.csv (with `deal_id` column) format; former file is kept as a .bak
+    """
+    auctions_path = os.path.join(dir_path, 'auctions_data.csv')
+    deals_path = os.path.join(dir_path, 'deals_data.csv')
+    auctions_df = pd.read_csv(auctions_path, sep=';', header='infer')
+    if 'cards' not in auctions_df.columns:
+        return
+    deal_ids = []
+    for _, round_df in auctions_df.groupby(ROUND_KEYS, sort=False):
+        deal_ids += _assign_deal_ids(round_df)
+    auctions_df['deal_id'] = deal_ids
+
+    deals = []
+    for (deal_key, deal_df) in auctions_df.groupby(DEAL_KEYS, sort=False):
+        hands = dict(deal_df.drop_duplicates('player')[['player', 'cards']].values)
+        codes = bytes(DESCRIBED_CARD_TO_CODE[card] for player in Player for card in literal_eval(hands[player.value]))
+        deals.append((*deal_key, deal_df.iloc[0]['player'], codes.hex()))
+    deals_df = pd.DataFrame(deals, columns=DEALS_COLUMNS)
+    # first bidder may differ from the first player of the deal: the latter is derived from tricks when known,
+    # the first player moving one seat at every deal of a round (the played one being opened by its first player)
+    tricks_path = os.path.join(dir_path, 'tricks_data.csv')
+    if os.path.exists(tricks_path):
+        tricks_df = pd.read_csv(tricks_path, sep=';', header='infer', usecols=ROUND_KEYS + ['trick_id', 'player'])
+        openers_df = tricks_df[tricks_df['trick_id'] == 0].drop_duplicates(ROUND_KEYS, keep='first')
+        played_deals_df = get_played_deals(deals_df)[DEAL_KEYS].merge(openers_df, how='inner', on=ROUND_KEYS)
+        deals_df = deals_df.merge(
+            played_deals_df.rename(columns={'deal_id': 'played_deal_id'})[ROUND_KEYS + ['played_deal_id', 'player']],
+            how='left', on=ROUND_KEYS
+        )
+        known = deals_df['player'].notna()
+        seats = (
+            deals_df.loc[known, 'player'].map(PLAYER_INDEX)
+            - (deals_df.loc[known, 'played_deal_id'] - deals_df.loc[known, 'deal_id'])
+        ).astype(int) % len(Player)
+        deals_df.loc[known, 'first_player'] = [ALL_PLAYERS[seat].value for seat in seats]
+        deals_df = deals_df[DEALS_COLUMNS]
+
+    os.rename(auctions_path, f'{auctions_path}.bak')
+    auctions_df[AUCTIONS_COLUMNS].to_csv(auctions_path, sep=';', index=False)
+    deals_df.to_csv(deals_path, sep=';', index=False)
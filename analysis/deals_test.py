@@ -0,0 +1,131 @@
+import os
+import random
+from ast import literal_eval
+
+import pandas as pd
+import pytest
+
+from analysis import analyze
+from analysis.card_codes import DESCRIBED_CARD_TO_CODE, HAND_SIZE, PLAIN_CARDS, decode_deals, decode_hands
+from analysis.deals import DEAL_KEYS, ROUND_KEYS, add_player_hands, get_played_deals, normalize_auctions_data
+from analysis import experiment
+from analysis.experiment import AUCTIONS_COLUMNS, handle_auction_step, run_experiment
+from helpers.structures import Game, Player, NEXT_PLAYER, OK_CODE, VALIDATION_ERROR_CODE
+
+HAND_COLUMNS = [f'hand_{i}' for i in range(HAND_SIZE)]
+
+
+def read_data(dir_path: str, data: str) -> pd.DataFrame:
+    return pd.read_csv(os.path.join(dir_path, f'{data}_data.csv'), sep=';', header='infer')
+
+
+def assert_played_cards_in_hands(tricks_df: pd.DataFrame, deals_df: pd.DataFrame):
+    """every played card belongs to the hand of its player, first player of the played deal opens its round"""
+    played_deals_df = get_played_deals(deals_df)
+    tricks_df = add_player_hands(tricks_df, played_deals_df, keys=ROUND_KEYS)
+    played_codes = tricks_df['card'].map(PLAIN_CARDS.index)
+    assert tricks_df[HAND_COLUMNS].eq(played_codes, axis=0).any(axis=1).all()
+    openers_df = tricks_df[tricks_df['trick_id'] == 0].drop_duplicates(ROUND_KEYS)
+    merged_df = openers_df[ROUND_KEYS + ['player']].merge(played_deals_df, on=ROUND_KEYS)
+    assert len(merged_df) == len(openers_df)
+    assert (merged_df['player'] == merged_df['first_player']).all()
+
+
+@pytest.fixture
+def experiment_dir(tmp_path) -> str:
+    """RANDOM often passes: rounds of this experiment have several deals"""
+    random.seed(3)
+    run_experiment('RANDOM', 'HIGHEST_CARD', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    dir_path = os.path.join(tmp_path, 'RANDOM-vs-HIGHEST_CARD')
+    assert read_data(dir_path, 'deals')['deal_id'].max() > 0
+    return dir_path
+
+
+def write_baseline_auctions(dir_path: str):
+    """former format: no deals_data.csv, hand of the bidder on every line of auctions_data.csv"""
+    auctions_df = read_data(dir_path, 'auctions')
+    deals_df = read_data(dir_path, 'deals')
+    deal_hands = {
+        tuple(deal_key): decode_hands(codes)
+        for (deal_key, codes) in zip(deals_df[DEAL_KEYS].values, decode_deals(deals_df['deal']))
+    }
+    auctions_df['cards'] = [
+        str([card.describe() for card in deal_hands[tuple(deal_key)][Player(player)]])
+        for (deal_key, player) in zip(auctions_df[DEAL_KEYS].values, auctions_df['player'])
+    ]
+    auctions_df.drop(columns='deal_id').to_csv(os.path.join(dir_path, 'auctions_data.csv'), sep=';', index=False)
+    os.remove(os.path.join(dir_path, 'deals_data.csv'))
+
+
+def test_normalize_auctions_data(experiment_dir):
+    auctions_df = read_data(experiment_dir, 'auctions')
+    deals_df = read_data(experiment_dir, 'deals')
+    write_baseline_auctions(experiment_dir)
+    baseline_auctions_df = read_data(experiment_dir, 'auctions')
+
+    normalize_auctions_data(experiment_dir)
+    # deal ids are found back from the changes of hands, first players from the bidders and trick openers
+    pd.testing.assert_frame_equal(read_data(experiment_dir, 'auctions'), auctions_df)
+    pd.testing.assert_frame_equal(read_data(experiment_dir, 'deals'), deals_df)
+    backup_df = pd.read_csv(os.path.join(experiment_dir, 'auctions_data.csv.bak'), sep=';', header='infer')
+    pd.testing.assert_frame_equal(backup_df, baseline_auctions_df)
+
+    # normalized folders are left untouched
+    normalize_auctions_data(experiment_dir)
+    assert list(read_data(experiment_dir, 'auctions').columns) == AUCTIONS_COLUMNS
+    pd.testing.assert_frame_equal(read_data(experiment_dir, 'deals'), deals_df)
+
+
+def test_add_player_hands(experiment_dir):
+    auctions_df = read_data(experiment_dir, 'auctions')
+    deals_df = read_data(experiment_dir, 'deals')
+    bidders_df = add_player_hands(auctions_df, deals_df)
+    assert len(bidders_df) == len(auctions_df)
+    write_baseline_auctions(experiment_dir)
+    # hand of the bidder, as stored on every line of the former format
+    baseline_hands = [
+        [DESCRIBED_CARD_TO_CODE[card] for card in literal_eval(cards)]
+        for cards in read_data(experiment_dir, 'auctions')['cards']
+    ]
+    assert bidders_df[HAND_COLUMNS].values.tolist() == baseline_hands
+
+    assert_played_cards_in_hands(read_data(experiment_dir, 'tricks'), deals_df)
+    # a round is played with its last deal
+    played_deals_df = get_played_deals(deals_df)
+    assert len(played_deals_df) == len(deals_df.drop_duplicates(ROUND_KEYS))
+    assert played_deals_df['deal_id'].tolist() == deals_df.groupby(ROUND_KEYS)['deal_id'].max().tolist()
+
+
+def test_prepare_deals_dataset_mirrors_hands(tmp_path, monkeypatch):
+    random.seed(3)
+    run_experiment('HIGHEST_CARD', 'RANDOM', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    monkeypatch.setattr(analyze, 'DATA_PATH', str(tmp_path))
+    deals_df = analyze.prepare_deals_dataset(ew_agent='RANDOM', ns_agent='HIGHEST_CARD')
+    _, tricks_df = analyze.prepare_datasets(ew_agent='RANDOM', ns_agent='HIGHEST_CARD')
+    assert len(deals_df) == len(read_data(os.path.join(tmp_path, 'HIGHEST_CARD-vs-RANDOM'), 'deals'))
+    # mirrored tricks are played with the mirrored hands
+    assert_played_cards_in_hands(tricks_df.astype({'experiment_id': str, 'player': str, 'card': str}), deals_df)
+    # RANDOM sits east/west in the mirrored deals: the hand of the former west player is now the one of south
+    mirror_deals_df = read_data(os.path.join(tmp_path, 'HIGHEST_CARD-vs-RANDOM'), 'deals')
+    former_hands = decode_deals(mirror_deals_df['deal']).reshape(-1, len(Player), HAND_SIZE)
+    hands = decode_deals(deals_df['deal']).reshape(-1, len(Player), HAND_SIZE)
+    assert (hands[:, list(Player).index(Player.TWO)] == former_hands[:, list(Player).index(Player.ONE)]).all()
+
+
+def test_handle_auction_step_detects_new_deals(monkeypatch):
+    actions = iter([('bet', 'h', 85), ('pass', None, None), ('pass', None, None), ('pass', None, None),
+                    ('pass', None, None)])
+    monkeypatch.setattr(experiment, 'get_agent_bet_or_pass', lambda **kwargs: next(actions))
+    game = Game(first_player=Player.ONE)
+    game_description, player, auctions_df = game.describe(), Player.ONE, pd.DataFrame(columns=AUCTIONS_COLUMNS)
+    dealt_again_steps = []
+    for _ in range(5):
+        game_description, player, auctions_df, dealt_again = handle_auction_step(
+            game=game, game_description=game_description, player=player, agent='RANDOM', experiment_id='test',
+            game_id=0, round_id=0, deal_id=0, auctions_df=auctions_df
+        )
+        dealt_again_steps.append(dealt_again)
+    # an invalid first bid leaves the auction as new, only the 4th pass deals the cards again
+    assert auctions_df['action_code'].tolist() == [VALIDATION_ERROR_CODE] + [OK_CODE] * 4
+    assert dealt_again_steps == [False, False, False, False, True]
+    assert game.first_player == NEXT_PLAYER[Player.ONE]
@@ -0,0 +1,129 @@
+# DECISION LATENCY
+#
+# Opt-in timing of agents' decisions in run_experiment (cf latency_recorder argument):
+# one histogram per agent, decision (bet_or_pass / play) and trick position (0 to 3, -1 for bets).
+# Buckets are powers of 2 microseconds, percentiles are the upper bound of the bucket where they fall.
+# Decisions longer than slow_threshold (in seconds) are appended to a replay file (JSON lines)
+# with their full input, in the payload format of the API (cf analysis.pipe_agent): those states can then
+# be benchmarked in isolation with replay_slow_decisions.
+import json
+from bisect import bisect_left
+from collections import defaultdict
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from analysis.experiment import get_agent_name
+from analysis.pipe_agent import PipeAgent, bet_or_pass_request_data, play_request_data
+from analysis.pipe_agent_server import answer_request
+
+BUCKETS_UPPER_BOUNDS = [2 ** k * 1e-6 for k in range(25)] + [float('inf')]  # from 1µs to 16.8s
+SUMMARY_COLUMNS = [
+    'agent', 'decision', 'trick_position', 'nb_decisions', 'mean', 'p50', 'p90', 'p99', 'max', 'nb_slow_decisions'
+]
+HISTOGRAMS_COLUMNS = ['agent', 'decision', 'trick_position', 'bucket_upper_bound', 'nb_decisions']
+BET_POSITION = -1
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_UPPER_BOUNDS)
+        self.nb_decisions = 0
+        self.total = 0.
+        self.max = 0.
+
+    def add(self, elapsed: float):
+        self.counts[bisect_left(BUCKETS_UPPER_BOUNDS, elapsed)] += 1
+        self.nb_decisions += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+
+    def percentile(self, q: float) -> float:
+        rank = q * self.nb_decisions
+        cumulated_count = 0
+        for (upper_bound, count) in zip(BUCKETS_UPPER_BOUNDS, self.counts):
+            cumulated_count += count
+            if cumulated_count >= rank:
+                return min(upper_bound, self.max)
+        return self.max
+
+
+class LatencyRecorder:
+    def __init__(self, slow_threshold: Optional[float] = None, replay_path: Optional[str] = None):
+        if (slow_threshold is None) != (replay_path is None):
+            raise ValueError('slow_threshold and replay_path must be given together')
+        self.slow_threshold = slow_threshold
+        self.replay_path = replay_path
+        self.histograms: Dict[Tuple[str, str, int], LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.nb_slow_decisions: Dict[Tuple[str, str, int], int] = defaultdict(int)
+
+    def _record(self, agent, route: str, trick_position: int, elapsed: float, data_fn, **kwargs):
+        key = (get_agent_name(agent), route, trick_position)
+        self.histograms[key].add(elapsed)
+        if (self.slow_threshold is not None) and (elapsed > self.slow_threshold):
+            # input is serialized right away, as game history is updated in place afterwards
+            self.nb_slow_decisions[key] += 1
+            with open(self.replay_path, 'a') as f:
+                f.write(json.dumps(
+                    {'agent': key[0], 'route': route, 'trick_position': trick_position, 'elapsed': elapsed,
+                     'data': data_fn(**kwargs)}
+                ) + '\n')
+
+    def record_bet_or_pass(self, agent, elapsed: float, **kwargs):
+        """kwargs are the ones of analysis.pipe_agent.bet_or_pass_request_data"""
+        self._record(agent, 'bet_or_pass', BET_POSITION, elapsed, bet_or_pass_request_data, **kwargs)
+
+    def record_play(self, agent, trick_position: int, elapsed: float, **kwargs):
+        """kwargs are the ones of analysis.pipe_agent.play_request_data"""
+        self._record(agent, 'play', trick_position, elapsed, play_request_data, **kwargs)
+
+    def summary(self) -> pd.DataFrame:
+        return pd.DataFrame([
+            {
+                'agent': agent, 'decision': route, 'trick_position': trick_position,
+                'nb_decisions': histogram.nb_decisions, 'mean': histogram.total / histogram.nb_decisions,
+                'p50': histogram.percentile(.5), 'p90': histogram.percentile(.9), 'p99': histogram.percentile(.99),
+                'max': histogram.max, 'nb_slow_decisions': self.nb_slow_decisions[(agent, route, trick_position)],
+            }
+            for ((agent, route, trick_position), histogram) in sorted(self.histograms.items())
+        ], columns=SUMMARY_COLUMNS)
+
+    def histograms_df(self) -> pd.DataFrame:
+        """non-empty buckets only"""
+        return pd.DataFrame([
+            {
+                'agent': agent, 'decision': route, 'trick_position': trick_position,
+                'bucket_upper_bound': upper_bound, 'nb_decisions': count,
+            }
+            for ((agent, route, trick_position), histogram) in sorted(self.histograms.items())
+            for (upper_bound, count) in zip(BUCKETS_UPPER_BOUNDS, histogram.counts) if count > 0
+        ], columns=HISTOGRAMS_COLUMNS)
+
+
+def load_slow_decisions(replay_path: str) -> List[Dict]:
+    with open(replay_path) as f:
+        return [json.loads(line) for line in f]
+
+
+def replay_slow_decisions(
+        replay_path: str, agents: Optional[Dict[str, Union[str, PipeAgent]]] = None, nb_repeats: int = 5
+) -> pd.DataFrame:
+    """
+    time again every captured decision (best of nb_repeats), e.g. after optimizing a strategy;
+    agents maps recorded names to the agents to replay (by default, recorded names are agents of this package)
+    """
+    agents = agents or {}
+    rows = []
+    for (decision_id, decision) in enumerate(load_slow_decisions(replay_path)):
+        agent = agents.get(decision['agent'], decision['agent'])
+        timings = []
+        for _ in range(nb_repeats):
+            start = perf_counter()
+            answer_request(agent, decision['route'], decision['data'])
+            timings.append(perf_counter() - start)
+        rows.append({
+            'decision_id': decision_id, 'agent': decision['agent'], 'decision': decision['route'],
+            'trick_position': decision['trick_position'], 'recorded': decision['elapsed'], 'replayed': min(timings),
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,43 @@
+import pytest
+
+from analysis.decision_latency import (
+    BET_POSITION, LatencyHistogram, LatencyRecorder, load_slow_decisions, replay_slow_decisions
+)
+from analysis.experiment import run_experiment
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for elapsed in [1e-6] * 90 + [1e-3] * 9 + [0.5]:
+        histogram.add(elapsed)
+    assert histogram.nb_decisions == 100
+    assert histogram.percentile(.5) == 1e-6
+    assert 1e-3 <= histogram.percentile(.99) < 2e-3
+    assert histogram.percentile(1.) == histogram.max == 0.5
+
+
+def test_threshold_needs_replay_path():
+    with pytest.raises(ValueError):
+        LatencyRecorder(slow_threshold=0.1)
+
+
+def test_experiment_latencies_and_replay(tmp_path):
+    replay_path = str(tmp_path / 'slow_decisions.jsonl')
+    recorder = LatencyRecorder(slow_threshold=0., replay_path=replay_path)
+    run_experiment('EXPERT', 'RANDOM', nb_games=1, batch_size=1, data_path=str(tmp_path), latency_recorder=recorder)
+    summary = recorder.summary()
+    assert set(summary['agent']) == {'EXPERT', 'RANDOM'}
+    assert set(summary.loc[summary['decision'] == 'play', 'trick_position']) == {0, 1, 2, 3}
+    assert set(summary.loc[summary['decision'] == 'bet_or_pass', 'trick_position']) == {BET_POSITION}
+    assert (summary['p50'] <= summary['p99']).all() and (summary['p99'] <= summary['max']).all()
+    histograms = recorder.histograms_df()
+    assert histograms['nb_decisions'].sum() == summary['nb_decisions'].sum()
+
+    decisions = load_slow_decisions(replay_path)  # every decision is slow with a null threshold
+    assert len(decisions) == summary['nb_slow_decisions'].sum() == summary['nb_decisions'].sum()
+    expert_plays = [
+        decision for decision in decisions if (decision['agent'] == 'EXPERT') and (decision['route'] == 'play')
+    ]
+    assert {'gameHistory', 'roundsFirstPlayer', 'cardsPlayability'} <= set(expert_plays[-1]['data'])
+    replayed = replay_slow_decisions(replay_path, nb_repeats=1)
+    assert len(replayed) == len(decisions) and (replayed['replayed'] > 0).all()
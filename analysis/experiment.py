@@ -1,21 +1,34 @@
+import math
 import os
 from datetime import datetime
-from time import time
-from typing import Dict, Tuple, List, Optional
+from time import perf_counter, time
+from typing import Dict, Tuple, List, Optional, NamedTuple, Union, TYPE_CHECKING
 
 import pandas as pd
 
+from analysis.analyze import is_win_rate_resolved
+from analysis.background_writer import BackgroundWriter
+from analysis.card_codes import encode_deal
+from analysis.deal_pool import DEALS_PER_GAME, PooledGame, load_deal_pool
+from analysis.memory_profiling import MemoryProfiler
+from analysis.metrics_store import import_directory
+from analysis.pipe_agent import PipeAgent, bet_or_pass_pipe_strategy, play_pipe_strategy
 from expert.bet_or_pass.strategy import bet_or_pass_expert_strategy
 from expert.play.strategy import play_expert_strategy
 from helpers.common_helpers import extract_color, extract_value
 from highest_card_agent import bet_or_pass_highest_card_strategy, play_highest_card_strategy
 from random_agent import bet_or_pass_random_strategy, play_random_strategy
-from helpers.structures import Game, Player, NEXT_PLAYER, PLAYER_TO_TEAM, derive_leader, Card
+from helpers.structures import Game, Player, NEXT_PLAYER, PLAYER_TO_TEAM, derive_leader, Card, OK_CODE
+
+if TYPE_CHECKING:  # analysis.decision_latency imports this module (cf get_agent_name)
+    from analysis.decision_latency import LatencyRecorder
 
 CONFIG_COLUMNS = ['experiment_id', 'nb_games', 'west_agent', 'south_agent', 'east_agent', 'north_agent']
 AUCTIONS_COLUMNS = [
-    'experiment_id', 'game_id', 'round_id', 'player', 'action_code', 'action', 'color', 'value', 'cards'
+    'experiment_id', 'game_id', 'round_id', 'player', 'action_code', 'action', 'color', 'value', 'deal_id'
 ]
+# one line per deal, a round has several deals when everybody passed (the played one has the highest deal_id)
+DEALS_COLUMNS = ['experiment_id', 'game_id', 'round_id', 'deal_id', 'first_player', 'deal']
 TRICKS_COLUMNS = [
     'experiment_id', 'game_id', 'round_id', 'trick_id', 'player', 'trick_position', 'action_code',
     'card',
@@ -26,35 +39,74 @@ TRICKS_COLUMNS = [
 ]
 GAME_LIMIT = 3000
 TOTAL_POINTS = 162
+DATA_PATH = './data'
+
+
+class AgentVariant(NamedTuple):
+    """
+    one of the agents above (base) with some of the constants of its strategies overridden:
+    params are passed as keyword arguments to its bet_or_pass / play strategies (none by default), module globals
+    are left untouched
+    """
+    name: str
+    base: str
+    bet_or_pass_params: Optional[Dict] = None
+    play_params: Optional[Dict] = None
+
+
+Agent = Union[str, AgentVariant, PipeAgent]
+
+
+def get_agent_name(agent: Agent) -> str:
+    """name of the agent in data folders, config files and reports"""
+    return agent if isinstance(agent, str) else agent.name
 
 
 def get_agent_bet_or_pass(
-    agent: str, players_bids: Dict[str, Dict], player_cards: List[str], player: str
+    agent: Agent, players_bids: Dict[str, Dict], player_cards: List[str], player: str
 ) -> Tuple[str, Optional[str], Optional[int]]:
+    params = {}
+    if isinstance(agent, PipeAgent):
+        return bet_or_pass_pipe_strategy(
+            agent=agent, players_bids=players_bids, player_cards=player_cards, player=player
+        )
+    elif isinstance(agent, AgentVariant):
+        agent, params = agent.base, agent.bet_or_pass_params or {}
     if agent == 'RANDOM':
-        return bet_or_pass_random_strategy(players_bids=players_bids)
+        return bet_or_pass_random_strategy(players_bids=players_bids, **params)
     elif agent in ['HIGHEST_CARD', 'EXPERT_W_HC_BET']:
-        return bet_or_pass_highest_card_strategy(player_cards=player_cards, players_bids=players_bids)
+        return bet_or_pass_highest_card_strategy(player_cards=player_cards, players_bids=players_bids, **params)
     elif agent in ['EXPERT', 'HIGHEST_CARD_W_EXP_BET']:
-        return bet_or_pass_expert_strategy(player=player, player_cards=player_cards, players_bids=players_bids)
+        return bet_or_pass_expert_strategy(
+            player=player, player_cards=player_cards, players_bids=players_bids, **params
+        )
 
 
 def get_agent_play(
-    agent: str, player_cards: List[str], cards_playability: List[bool], trump_color: str,
+    agent: Agent, player_cards: List[str], cards_playability: List[bool], trump_color: str,
     player: str, contract_team: str, trick_cards: Dict[str, Optional[str]], trick_color: Optional[str],
     trick_id: int, game_history: Dict[str, List[str]], tricks_first_player: list[str]
 ) -> str:
+    params = {}
+    if isinstance(agent, PipeAgent):
+        return play_pipe_strategy(
+            agent=agent, player_cards=player_cards, cards_playability=cards_playability, trump_color=trump_color,
+            player=player, contract_team=contract_team, trick_cards=trick_cards, trick_color=trick_color,
+            trick_id=trick_id, game_history=game_history, tricks_first_player=tricks_first_player
+        )
+    elif isinstance(agent, AgentVariant):
+        agent, params = agent.base, agent.play_params or {}
     if agent == 'RANDOM':
-        return play_random_strategy(player_cards=player_cards, cards_playability=cards_playability)
+        return play_random_strategy(player_cards=player_cards, cards_playability=cards_playability, **params)
     elif agent in ['HIGHEST_CARD', 'HIGHEST_CARD_W_EXP_BET']:
         return play_highest_card_strategy(
-            player_cards=player_cards, cards_playability=cards_playability, trump_color=trump_color
+            player_cards=player_cards, cards_playability=cards_playability, trump_color=trump_color, **params
         )
     elif agent in ['EXPERT', 'EXPERT_W_HC_BET']:
         return play_expert_strategy(
             player=player, contract_team=contract_team, player_cards=player_cards, cards_playability=cards_playability,
             round_cards=trick_cards, trump_color=trump_color, round_color=trick_color, round=trick_id,
-            game_history=game_history, rounds_first_player=tricks_first_player
+            game_history=game_history, rounds_first_player=tricks_first_player, **params
         )
 
 
@@ -63,19 +115,42 @@ def update_game_history(game_history: Dict[str, List[str]], trick_cards: Dict[Pl
         game_history[player.value].append(card.describe_plain())
 
 
+def handle_deal(
+        game: Game, experiment_id: str, game_id: int, round_id: int, deal_id: int, deals_df: pd.DataFrame
+) -> pd.DataFrame:
+    return deals_df.append(
+        {
+            'experiment_id': experiment_id,
+            'game_id': game_id,
+            'round_id': round_id,
+            'deal_id': deal_id,
+            'first_player': game.first_player.value,
+            'deal': encode_deal({player: hand.cards for (player, hand) in game.round.hands.items()}),
+        },
+        ignore_index=True
+    )
+
+
 def handle_auction_step(
         game: Game, game_description: Dict, player: Player, agent: str,
-        experiment_id: str, game_id: int, round_id: int, auctions_df: pd.DataFrame
-) -> Tuple[Dict, Player, pd.DataFrame]:
+        experiment_id: str, game_id: int, round_id: int, deal_id: int, auctions_df: pd.DataFrame,
+        latency_recorder: Optional['LatencyRecorder'] = None
+) -> Tuple[Dict, Player, pd.DataFrame, bool]:
+    """play the bid of player; last returned value tells whether everybody passed and cards were dealt again"""
     players_bids = {
         player_: bid
         if bid is not None else {'value': None, 'color': None}
         for player_, bid in game_description['auction']['bids'].items()
     }
     player_cards = [card.describe_plain() for card in game.round.hands[player].cards]
+    start = perf_counter()
     agent_action, color, value = get_agent_bet_or_pass(
         agent=agent, players_bids=players_bids, player_cards=player_cards, player=player.value
     )
+    if latency_recorder is not None:
+        latency_recorder.record_bet_or_pass(
+            agent, perf_counter() - start, players_bids=players_bids, player_cards=player_cards, player=player.value
+        )
     action = {'player': player, 'passed': (agent_action == 'pass'), 'color': color, 'value': value}
     action_code = game.update(**action)
     new_game_description = game.describe()
@@ -89,13 +164,18 @@ def handle_auction_step(
             'action': agent_action,
             'color': color,
             'value': value,
-            'cards': game_description['round']['hands'][player.value]['cards']
+            'deal_id': deal_id,
         },
         ignore_index=True
     )
     new_player = NEXT_PLAYER[player]
+    # an invalid action leaves the auction untouched (current_passed of a new auction included)
+    dealt_again = (
+        (action_code == OK_CODE) and action['passed'] and (new_game_description['state'] == 'auction')
+        and (new_game_description['auction']['current_passed'] == -1)
+    )
 
-    return new_game_description, new_player, new_auctions_df
+    return new_game_description, new_player, new_auctions_df, dealt_again
 
 
 def handle_end_of_trick(
@@ -158,7 +238,8 @@ def handle_end_of_trick(
 def handle_trick(
         game: Game, game_description: Dict, agent: str,
         experiment_id: str, game_id: int, round_id: int, tricks_df: pd.DataFrame,
-        game_history: Dict[str, List[str]], tricks_first_player: List[str]
+        game_history: Dict[str, List[str]], tricks_first_player: List[str],
+        latency_recorder: Optional['LatencyRecorder'] = None
 ) -> Tuple[Dict, Dict[Player, Card], pd.DataFrame]:
     trick_id = game_description['round']['trick']
     player = Player._value2member_map_[game_description['round']['trick_opener']]
@@ -183,12 +264,20 @@ def handle_trick(
         }
         first_plain_card = trick_plain_cards[game_description['round']['trick_opener']]
         current_trick_color = extract_color(first_plain_card) if first_plain_card else None
+        start = perf_counter()
         agent_card = get_agent_play(
             agent=agent, player_cards=player_cards, cards_playability=cards_playability,
             trump_color=current_trump_color, player=player.value, contract_team=contract_team,
             trick_cards=trick_plain_cards, trick_color=current_trick_color, trick_id=trick_id,
             game_history=game_history, tricks_first_player=tricks_first_player
         )
+        if latency_recorder is not None:
+            latency_recorder.record_play(
+                agent, trick_position, perf_counter() - start, player_cards=player_cards,
+                cards_playability=cards_playability, trump_color=current_trump_color, player=player.value,
+                contract_team=contract_team, trick_cards=trick_plain_cards, trick_color=current_trick_color,
+                trick_id=trick_id, game_history=game_history, tricks_first_player=tricks_first_player
+            )
         trick_cards = game.round.trick_cards.cards.copy()
         trick_cards.update({player: Card(value=extract_value(agent_card), color=extract_color(agent_card))})
         trump_color = new_game_description['round']['trump']
@@ -227,26 +316,45 @@ def handle_trick(
 
 
 def prepare_data_folder(
-        agent_A: str, agent_B: str, config_df: pd.DataFrame, auctions_df: pd.DataFrame, tricks_df: pd.DataFrame
+        agent_A: str, agent_B: str, config_df: pd.DataFrame, auctions_df: pd.DataFrame, tricks_df: pd.DataFrame,
+        deals_df: pd.DataFrame, data_path: str = DATA_PATH
 ):
     def create_csv_if_not_exist(file_path, df):
         if not os.path.exists(file_path):
             df.to_csv(file_path, sep=';', header=True, index=False)
-    output_dir = f'./data/{agent_A}-vs-{agent_B}'
+        else:
+            with open(file_path) as f:
+                columns = f.readline().rstrip('\n').split(';')
+            if columns != list(df.columns):
+                raise ValueError(f'{file_path} columns ({columns}) differ from expected ones ({list(df.columns)}), '
+                                 f'older data may be migrated with analysis.deals.normalize_auctions_data')
+    for agent in [agent_A, agent_B]:
+        if (os.sep in agent) or ('-vs-' in agent):
+            raise ValueError(f'Agent name ({agent}) cannot be used in the name of a data directory')
+    output_dir = os.path.join(data_path, f'{agent_A}-vs-{agent_B}')
     if not os.path.exists(output_dir):
-        os.mkdir(output_dir)
+        os.makedirs(output_dir)
     config_path = os.path.join(output_dir, 'config_data.csv')
     auctions_path = os.path.join(output_dir, 'auctions_data.csv')
     tricks_path = os.path.join(output_dir, 'tricks_data.csv')
+    deals_path = os.path.join(output_dir, 'deals_data.csv')
     create_csv_if_not_exist(config_path, config_df)
     create_csv_if_not_exist(auctions_path, auctions_df)
     create_csv_if_not_exist(tricks_path, tricks_df)
+    create_csv_if_not_exist(deals_path, deals_df)
 
-    return config_path, auctions_path, tricks_path
+    return config_path, auctions_path, tricks_path, deals_path
 
 
-def save_and_flush_df(df: pd.DataFrame, path: str) -> pd.DataFrame:
+def save_df(df: pd.DataFrame, path: str):
     df.to_csv(path, sep=';', mode='a', header=False, index=False)
+
+
+def save_and_flush_df(df: pd.DataFrame, path: str, writer: Optional[BackgroundWriter] = None) -> pd.DataFrame:
+    if writer is not None:
+        writer.submit(save_df, df, path)
+    else:
+        save_df(df, path)
     return pd.DataFrame(columns=df.columns)
 
 
@@ -254,10 +362,7 @@ def update_config_data(path: str, experiment_id: str, played_games: int):
     config_df = pd.read_csv(path, sep=';')
     previously_played_games = config_df[config_df["experiment_id"] == experiment_id].iloc[0]["nb_games"]
     if previously_played_games != played_games:
-        config_df["nb_games"] = config_df.apply(
-            lambda row: played_games if row["experiment_id"] == experiment_id else row["nb_games"],
-            axis=1
-        )
+        config_df.loc[config_df["experiment_id"] == experiment_id, "nb_games"] = played_games
         config_df.to_csv(path, sep=';', index=False)
         print(f"...already played {played_games} games")
 
@@ -265,17 +370,45 @@ def update_config_data(path: str, experiment_id: str, played_games: int):
 def save_and_flush_data(
         experiment_id: str, played_games: int, config_path: str,
         auctions_df: pd.DataFrame, auctions_path: str,
-        tricks_df: pd.DataFrame, tricks_path: str
-) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    flushed_auctions_df = save_and_flush_df(auctions_df, auctions_path)
-    flushed_tricks_df = save_and_flush_df(tricks_df, tricks_path)
-    update_config_data(config_path, experiment_id, played_games)
+        tricks_df: pd.DataFrame, tricks_path: str,
+        deals_df: pd.DataFrame, deals_path: str, writer: Optional[BackgroundWriter] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """with a writer, files are written in its thread (in order) and returned DataFrames are new ones"""
+    flushed_auctions_df = save_and_flush_df(auctions_df, auctions_path, writer)
+    flushed_tricks_df = save_and_flush_df(tricks_df, tricks_path, writer)
+    flushed_deals_df = save_and_flush_df(deals_df, deals_path, writer)
+    if writer is not None:
+        writer.submit(update_config_data, config_path, experiment_id, played_games)
+    else:
+        update_config_data(config_path, experiment_id, played_games)
 
-    return flushed_auctions_df, flushed_tricks_df
+    return flushed_auctions_df, flushed_tricks_df, flushed_deals_df
 
 
-def run_experiment(east_west_agents, north_south_agents, nb_games, batch_size=5):
-    experiment_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+def import_batch(metrics_db_path: str, config_path: str, writer: Optional[BackgroundWriter] = None):
+    """imports the games written so far into the metrics store, after the writes of the batch (same writer)"""
+    if writer is not None:
+        writer.submit(import_directory, metrics_db_path, os.path.dirname(config_path))
+    else:
+        import_directory(metrics_db_path, os.path.dirname(config_path))
+
+
+def run_experiment(
+        east_west_agents, north_south_agents, nb_games, batch_size=5,
+        early_stop_confidence: Optional[float] = None, early_stop_min_games: int = 50,
+        deal_pool_path: Optional[str] = None, first_deal: int = 0,
+        experiment_id: Optional[str] = None, data_path: str = DATA_PATH, max_pending_writes: int = 16,
+        memory_profiler: Optional[MemoryProfiler] = None, latency_recorder: Optional['LatencyRecorder'] = None,
+        metrics_db_path: Optional[str] = None
+):
+    """
+    memory_profiler, when given (and started), reports the memory usage after every batch;
+    latency_recorder, when given, times every decision of the agents;
+    metrics_db_path, when given, is the SQLite metrics store where every written batch is imported
+    (cf analysis.metrics_store)
+    """
+    if experiment_id is None:
+        experiment_id = datetime.now().strftime('%Y%m%d_%H%M%S')
     agents = {
         'west_agent': east_west_agents,
         'south_agent': north_south_agents,
@@ -286,42 +419,92 @@ def run_experiment(east_west_agents, north_south_agents, nb_games, batch_size=5)
     config_df = pd.DataFrame(columns=CONFIG_COLUMNS)
     auctions_df = pd.DataFrame(columns=AUCTIONS_COLUMNS)
     tricks_df = pd.DataFrame(columns=TRICKS_COLUMNS)
-    config_path, auctions_path, tricks_path = prepare_data_folder(
-        agent_A=east_west_agents, agent_B=north_south_agents,
-        config_df=config_df, auctions_df=auctions_df, tricks_df=tricks_df
+    deals_df = pd.DataFrame(columns=DEALS_COLUMNS)
+    # directory and config columns use the names of the agents (variants and pipe agents are not strings)
+    config_path, auctions_path, tricks_path, deals_path = prepare_data_folder(
+        agent_A=get_agent_name(east_west_agents), agent_B=get_agent_name(north_south_agents),
+        config_df=config_df, auctions_df=auctions_df, tricks_df=tricks_df, deals_df=deals_df, data_path=data_path
+    )
+    config_df = config_df.append(
+        {"experiment_id": experiment_id, "nb_games": 0,
+         **{column: get_agent_name(agent) for (column, agent) in agents.items()}},
+        ignore_index=True
     )
-    config_df = config_df.append({"experiment_id": experiment_id, "nb_games": 0, **agents}, ignore_index=True)
     config_df.to_csv(config_path, sep=';', mode='a', header=False, index=False)
 
+    # win rate is checked once per batch: confidence is split between those looks (Bonferroni)
+    # so that the overall error rate of the sequential test stays below 1 - early_stop_confidence
+    if early_stop_confidence is not None:
+        nb_looks = max(1, math.ceil(nb_games / batch_size))
+        look_confidence = 1 - (1 - early_stop_confidence) / nb_looks
+    deal_pool = load_deal_pool(deal_pool_path) if deal_pool_path is not None else None
+    played_games = 0
+    east_west_won_games = 0
     first_player = Player.ONE
-    for game_id in range(nb_games):  # loop over games
-        game = Game(first_player=first_player)
-        game_description = game.describe()
-        player = first_player
-        round_id = 0
-        while max(game_description['score'].values()) < GAME_LIMIT:  # loop over rounds
-            game_history = {'west': [], 'south': [], 'east': [], 'north': []}
-            tricks_first_player = []
-            while game_description['state'] == 'auction':  # auction steps
-                game_description, player, auctions_df = handle_auction_step(
-                    game=game, game_description=game_description, player=player, agent=agents[f'{player.value}_agent'],
-                    experiment_id=experiment_id, game_id=game_id, round_id=round_id, auctions_df=auctions_df
+    # batches are written in the background while next games are played (4 jobs per batch)
+    with BackgroundWriter(max_pending_jobs=max_pending_writes) as writer:
+        for game_id in range(nb_games):  # loop over games
+            if deal_pool is not None:
+                game = PooledGame(
+                    first_player=first_player, deal_pool=deal_pool, first_deal=first_deal + game_id * DEALS_PER_GAME
                 )
-            while game_description['state'] == 'playing':  # tricks steps
-                tricks_first_player.append(game_description['round']['trick_opener'])
-                game_description, trick_cards, tricks_df = handle_trick(
-                    game=game, game_description=game_description, agent=agents[f'{player.value}_agent'],
-                    experiment_id=experiment_id, game_id=game_id, round_id=round_id, tricks_df=tricks_df,
-                    game_history=game_history, tricks_first_player=tricks_first_player
+            else:
+                game = Game(first_player=first_player)
+            game_description = game.describe()
+            player = first_player
+            round_id = 0
+            while max(game_description['score'].values()) < GAME_LIMIT:  # loop over rounds
+                game_history = {'west': [], 'south': [], 'east': [], 'north': []}
+                tricks_first_player = []
+                deal_id = 0
+                deals_df = handle_deal(game, experiment_id, game_id, round_id, deal_id, deals_df)
+                while game_description['state'] == 'auction':  # auction steps
+                    game_description, player, auctions_df, dealt_again = handle_auction_step(
+                        game=game, game_description=game_description, player=player,
+                        agent=agents[f'{player.value}_agent'], experiment_id=experiment_id, game_id=game_id,
+                        round_id=round_id, deal_id=deal_id, auctions_df=auctions_df, latency_recorder=latency_recorder
+                    )
+                    if dealt_again:
+                        deal_id += 1
+                        deals_df = handle_deal(game, experiment_id, game_id, round_id, deal_id, deals_df)
+                while game_description['state'] == 'playing':  # tricks steps
+                    tricks_first_player.append(game_description['round']['trick_opener'])
+                    game_description, trick_cards, tricks_df = handle_trick(
+                        game=game, game_description=game_description, agent=agents[f'{player.value}_agent'],
+                        experiment_id=experiment_id, game_id=game_id, round_id=round_id, tricks_df=tricks_df,
+                        game_history=game_history, tricks_first_player=tricks_first_player,
+                        latency_recorder=latency_recorder
+                    )
+                    update_game_history(game_history, trick_cards)
+                round_id += 1
+            played_games = game_id + 1
+            if game_description['score']['east/west'] > game_description['score']['north/south']:
+                east_west_won_games += 1
+            if played_games % batch_size == 0:
+                auctions_df, tricks_df, deals_df = save_and_flush_data(
+                    experiment_id, played_games, config_path, auctions_df, auctions_path, tricks_df, tricks_path,
+                    deals_df, deals_path, writer
                 )
-                update_game_history(game_history, trick_cards)
-            round_id += 1
-        played_games = game_id + 1
-        if played_games % batch_size == 0:
-            auctions_df, tricks_df = save_and_flush_data(
-                experiment_id, played_games, config_path, auctions_df, auctions_path, tricks_df, tricks_path
-            )
-    save_and_flush_data(experiment_id, nb_games, config_path, auctions_df, auctions_path, tricks_df, tricks_path)
+                if metrics_db_path is not None:
+                    import_batch(metrics_db_path, config_path, writer)
+                if memory_profiler is not None:
+                    memory_profiler.report_batch(played_games)
+                if (
+                        (early_stop_confidence is not None)
+                        and (played_games >= early_stop_min_games)
+                        and is_win_rate_resolved(
+                            estimator=east_west_won_games / played_games, nb_samples=played_games,
+                            required_confidence_level=look_confidence
+                        )
+                ):
+                    print(f"...win rate resolved after {played_games} games, stopping early")
+                    break
+        save_and_flush_data(
+            experiment_id, played_games, config_path, auctions_df, auctions_path, tricks_df, tricks_path,
+            deals_df, deals_path, writer
+        )
+        if metrics_db_path is not None:
+            import_batch(metrics_db_path, config_path, writer)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,37 @@
+import os
+import random
+
+import numpy as np
+import pandas as pd
+
+from analysis.experiment import AgentVariant, get_agent_bet_or_pass, get_agent_play, run_experiment
+from helpers.structures import Player
+
+PLAYER_CARDS = ['Jh', '9h', 'Ah', 'Qh', 'Ks', '7d', '8d', '7c']
+PLAYERS_BIDS = {player.value: {'value': None, 'color': None} for player in Player}
+
+
+def test_agent_variant_without_params_plays_as_its_base():
+    play_args = (PLAYER_CARDS, [True] * 8, 's', 'west', 'east/west', {player.value: None for player in Player}, None, 0,
+                 {player.value: [] for player in Player}, ['west'])
+    for base in ['HIGHEST_CARD', 'EXPERT']:
+        variant = AgentVariant(name=f'{base}_DEFAULT', base=base)
+        assert get_agent_bet_or_pass(variant, PLAYERS_BIDS, PLAYER_CARDS, 'west') == \
+            get_agent_bet_or_pass(base, PLAYERS_BIDS, PLAYER_CARDS, 'west')
+        assert get_agent_play(variant, *play_args) == get_agent_play(base, *play_args)
+
+
+def test_run_experiment_stops_early_on_lopsided_pairing(tmp_path):
+    random.seed(0)
+    np.random.seed(0)
+    # up to 5 looks at the win rate (one per batch), each one at a 75% confidence level
+    run_experiment('EXPERT', 'RANDOM', nb_games=20, batch_size=4, early_stop_confidence=0.75, early_stop_min_games=4,
+                   data_path=str(tmp_path))
+    dir_path = os.path.join(tmp_path, 'EXPERT-vs-RANDOM')
+    config_df = pd.read_csv(os.path.join(dir_path, 'config_data.csv'), sep=';')
+    tricks_df = pd.read_csv(os.path.join(dir_path, 'tricks_data.csv'), sep=';')
+    nb_games = config_df['nb_games'].iloc[0]
+    assert nb_games < 20
+    assert nb_games % 4 == 0  # win rate is checked once per batch
+    assert tricks_df['is_last_in_game'].sum() == tricks_df['game_id'].nunique() == nb_games
+    assert (tricks_df['game_winners'].dropna() == 'east/west').mean() > 0.5
@@ -0,0 +1,312 @@
+# BINARY GAME LOG
+#
+# Append-only binary record of simulated games, about 80 bytes per deal (before compression) instead of
+# the dozens of sparse CSV lines of auctions_data.csv / tricks_data.csv.
+# A log file is a sequence of segments, each one holding a batch of games:
+#   segment header: magic (4s), version (B), flags (B), nb_games (I), payload size (I), payload crc32 (I)
+#   payload (zlib compressed when flags & COMPRESSED): the games, one after the other
+#   game: experiment_id size (H) + experiment_id, game_id (I), seed (q, -1 when unknown), nb_deals (H), deals
+#   deal: first player (B), 32 card codes (cf analysis.card_codes), nb_bids (B) + (player, bid code) bytes,
+#         nb_plays (B, 0 when everybody passed) + one byte per card played: player << 5 | card code
+# Everything else (trump, contract, tricks winners, scores) is derived by replaying the game,
+# which is how to_tables converts a log to the deals / auctions / tricks tables of analysis.experiment.
+import mmap
+import os
+import random
+import struct
+import zlib
+from datetime import datetime
+from time import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Callable
+from uuid import uuid4
+
+import numpy as np
+import pandas as pd
+
+from analysis.card_codes import NB_CARDS, encode_card, decode_card, decode_hands, encode_hands
+from analysis.experiment import AUCTIONS_COLUMNS, DEALS_COLUMNS, TRICKS_COLUMNS, GAME_LIMIT, DATA_PATH
+from analysis.simulation import ALL_PLAYERS, play_game, derive_belote_team, is_contract_reached, compute_round_score
+from helpers.constants import COLORS
+from helpers.structures import (
+    Auction, Round, Game, Player, Team, PLAYER_TO_TEAM, OK_CODE, AUCTION_END_OK_CODE, AUCTION_END_KO_CODE,
+    ROUND_END_CODE, derive_leader,
+)
+
+MAGIC = b'BLOG'
+VERSION = 1
+COMPRESSED = 1
+SEGMENT_HEADER = struct.Struct('<4sBBIII')
+GAME_HEADER = struct.Struct('<IqH')
+PLAYER_INDEX = {player: i for (i, player) in enumerate(ALL_PLAYERS)}
+PASS_CODE = 0
+GAME_END_CODES = [AUCTION_END_OK_CODE, AUCTION_END_KO_CODE, ROUND_END_CODE]  # reported as OK_CODE by Game.update
+
+
+class CorruptedSegmentError(ValueError):
+    pass
+
+
+class DealRecord(NamedTuple):
+    first_player: Player
+    codes: bytes  # 32 card codes, hands in Player order
+    bids: List[Tuple[Player, str, Optional[str], Optional[int]]]  # (player, action, color, value)
+    plays: List[Tuple[Player, int]]  # (player, card code), empty when everybody passed
+
+
+class GameRecord(NamedTuple):
+    experiment_id: str
+    game_id: int
+    seed: Optional[int]
+    deals: List[DealRecord]
+
+
+def encode_bid(action: str, color: Optional[str], value: Optional[int]) -> int:
+    if action == 'pass':
+        return PASS_CODE
+    if (value is None) or (value < 80) or (value % 10 != 0) or (color not in COLORS):
+        raise ValueError(f'Bid ({color}, {value}) cannot be encoded')
+    return 1 + COLORS.index(color) + len(COLORS) * ((value - 80) // 10)
+
+
+def decode_bid(code: int) -> Tuple[str, Optional[str], Optional[int]]:
+    if code == PASS_CODE:
+        return 'pass', None, None
+    return 'bet', COLORS[(code - 1) % len(COLORS)], 80 + 10 * ((code - 1) // len(COLORS))
+
+
+def encode_game(game: GameRecord) -> bytes:
+    experiment_id = game.experiment_id.encode()
+    chunks = [struct.pack('<H', len(experiment_id)), experiment_id,
+              GAME_HEADER.pack(game.game_id, -1 if game.seed is None else game.seed, len(game.deals))]
+    for deal in game.deals:
+        chunks.append(bytes([PLAYER_INDEX[deal.first_player]]))
+        chunks.append(deal.codes)
+        chunks.append(bytes([len(deal.bids)]))
+        chunks.append(bytes(
+            byte for (player, action, color, value) in deal.bids
+            for byte in (PLAYER_INDEX[player], encode_bid(action, color, value))
+        ))
+        chunks.append(bytes([len(deal.plays)]))
+        chunks.append(bytes(PLAYER_INDEX[player] << 5 | code for (player, code) in deal.plays))
+    return b''.join(chunks)
+
+
+def decode_games(payload: bytes, nb_games: int) -> Iterator[GameRecord]:
+    offset = 0
+    for _ in range(nb_games):
+        experiment_id_size, = struct.unpack_from('<H', payload, offset)
+        offset += 2
+        experiment_id = bytes(payload[offset:offset + experiment_id_size]).decode()
+        offset += experiment_id_size
+        game_id, seed, nb_deals = GAME_HEADER.unpack_from(payload, offset)
+        offset += GAME_HEADER.size
+        deals = []
+        for _ in range(nb_deals):
+            first_player = ALL_PLAYERS[payload[offset]]
+            codes = bytes(payload[offset + 1:offset + 1 + NB_CARDS])
+            offset += 1 + NB_CARDS
+            nb_bids = payload[offset]
+            bids = [
+                (ALL_PLAYERS[payload[offset + 1 + 2 * i]], *decode_bid(payload[offset + 2 + 2 * i]))
+                for i in range(nb_bids)
+            ]
+            offset += 1 + 2 * nb_bids
+            nb_plays = payload[offset]
+            plays = [(ALL_PLAYERS[byte >> 5], byte & 31) for byte in payload[offset + 1:offset + 1 + nb_plays]]
+            offset += 1 + nb_plays
+            deals.append(DealRecord(first_player, codes, bids, plays))
+        yield GameRecord(experiment_id, game_id, None if seed == -1 else seed, deals)
+
+
+class GameLogWriter:
+    """appends games to a log file, one segment every games_per_segment games (and at close)"""
+    def __init__(self, path: str, compress: bool = True, games_per_segment: int = 64):
+        self.path = path
+        self.compress = compress
+        self.games_per_segment = games_per_segment
+        self.pending_games: List[bytes] = []
+
+    def add_game(self, game: GameRecord):
+        self.pending_games.append(encode_game(game))
+        if len(self.pending_games) >= self.games_per_segment:
+            self.flush()
+
+    def flush(self):
+        if not self.pending_games:
+            return
+        payload = b''.join(self.pending_games)
+        if self.compress:
+            payload = zlib.compress(payload)
+        header = SEGMENT_HEADER.pack(
+            MAGIC, VERSION, COMPRESSED if self.compress else 0, len(self.pending_games), len(payload),
+            zlib.crc32(payload)
+        )
+        with open(self.path, 'ab') as f:
+            f.write(header + payload)
+        self.pending_games = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def iter_game_log(path: str) -> Iterator[GameRecord]:
+    """memory-maps the log and yields its games lazily, checking (and decompressing) one segment at a time"""
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as log:
+        offset = 0
+        while offset < len(log):
+            if offset + SEGMENT_HEADER.size > len(log):
+                raise CorruptedSegmentError(f'Truncated segment header at offset {offset} of {path}')
+            magic, version, flags, nb_games, payload_size, crc = SEGMENT_HEADER.unpack_from(log, offset)
+            if (magic != MAGIC) or (version != VERSION):
+                raise CorruptedSegmentError(f'Unknown segment (magic {magic}, version {version}) at offset {offset}')
+            offset += SEGMENT_HEADER.size
+            payload = log[offset:offset + payload_size]
+            if (len(payload) != payload_size) or (zlib.crc32(payload) != crc):
+                raise CorruptedSegmentError(f'Checksum mismatch for the segment at offset {offset} of {path}')
+            if flags & COMPRESSED:
+                payload = zlib.decompress(payload)
+            yield from decode_games(payload, nb_games)
+            offset += payload_size
+
+
+def play_recorded_game(
+        agents: Dict[Player, str], experiment_id: str, game_id: int, seed: Optional[int] = None,
+        first_player: Player = Player.ONE, deal: Callable = Game.deal
+) -> GameRecord:
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed % 2 ** 32)
+    deals_history = []
+    play_game(agents=agents, first_player=first_player, deal=deal, deals_history=deals_history)
+    deals = [
+        DealRecord(
+            first_player=deal_first_player,
+            codes=encode_hands(hands).tobytes(),
+            # color and value of a pass are ignored by the auction, hence not logged
+            bids=[(player, action, color, value) if action == 'bet' else (player, action, None, None)
+                  for (player, action, color, value) in bids_history],
+            plays=[(player, encode_card(card)) for (player, card) in plays],
+        )
+        for (deal_first_player, hands, bids_history, plays) in deals_history
+    ]
+    return GameRecord(experiment_id, game_id, seed, deals)
+
+
+def _game_code(code: int) -> int:
+    return OK_CODE if code in GAME_END_CODES else code
+
+
+def to_tables(games: Iterator[GameRecord]) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """deals, auctions and tricks tables (cf analysis.experiment columns) of the games, by replaying them"""
+    deals_rows, auctions_rows, tricks_rows = [], [], []
+    for game in games:
+        keys = {'experiment_id': game.experiment_id, 'game_id': game.game_id}
+        score = {team: 0 for team in Team}
+        round_id, deal_id = 0, 0
+        for deal in game.deals:
+            hands = decode_hands(np.frombuffer(deal.codes, dtype=np.uint8))
+            deals_rows.append({**keys, 'round_id': round_id, 'deal_id': deal_id,
+                               'first_player': deal.first_player.value, 'deal': deal.codes.hex()})
+            auction = Auction()
+            for (player, action, color, value) in deal.bids:
+                action_code = auction.update(player=player, passed=(action == 'pass'), color=color, value=value)
+                auctions_rows.append({**keys, 'round_id': round_id, 'player': player.value,
+                                      'action_code': _game_code(action_code), 'action': action, 'color': color,
+                                      'value': value, 'deal_id': deal_id})
+            if not deal.plays:
+                deal_id += 1
+                continue
+            contractor = auction.current_best
+            contract_team = PLAYER_TO_TEAM[contractor]
+            contract = auction.bids[contractor].value
+            round_ = Round(hands=hands, trick_opener=deal.first_player)
+            round_.set_trump(auction.get_best_color())
+            for (position, (player, code)) in enumerate(deal.plays):
+                if position % 4 == 0:
+                    trick_cards = {}
+                    start_round_score = dict(round_.score)
+                trick_id = round_.trick
+                card = decode_card(code)
+                trick_cards[player] = card
+                action_code = round_.update(player=player, card_index=round_.hands[player].cards.index(card))
+                row = {**keys, 'round_id': round_id, 'trick_id': trick_id, 'player': player.value,
+                       'trick_position': position % 4, 'action_code': _game_code(action_code),
+                       'card': card.describe_plain(), 'is_last_in_trick': position % 4 == 3,
+                       'is_last_in_round': False, 'is_last_in_game': False}
+                if position % 4 == 3:
+                    trick_opener = next(iter(trick_cards))
+                    trick_winner = derive_leader(
+                        cards=trick_cards, trump_color=round_.trump, trick_color=trick_cards[trick_opener].color
+                    )
+                    trick_winner_team = PLAYER_TO_TEAM[trick_winner]
+                    row['trick_winner'] = trick_winner.value
+                    row['trick_points'] = round_.score[trick_winner_team] - start_round_score[trick_winner_team]
+                tricks_rows.append(row)
+            round_score = compute_round_score(round_, contract_team, contract)
+            for team in Team:
+                score[team] += round_score[team]
+            belote_team = derive_belote_team(round_)
+            round_points = {team: round_.score[team] + (20 if team == belote_team else 0) for team in Team}
+            tricks_rows[-1].update({
+                'is_last_in_round': True,
+                'east/west_points': round_points[Team.ONE],
+                'north/south_points': round_points[Team.TWO],
+                'belote_team': belote_team.value if belote_team is not None else None,
+                'contract': contract,
+                'contract_reached': is_contract_reached(round_, contract_team, contract),
+                'east/west_round_score': round_score[Team.ONE],
+                'north/south_round_score': round_score[Team.TWO],
+            })
+            if max(score.values()) >= GAME_LIMIT:
+                tricks_rows[-1].update({
+                    'is_last_in_game': True,
+                    'game_winners': (Team.ONE if score[Team.ONE] > score[Team.TWO] else Team.TWO).value,
+                    'east/west_score': score[Team.ONE],
+                    'north/south_score': score[Team.TWO],
+                })
+            round_id, deal_id = round_id + 1, 0
+    return (
+        pd.DataFrame(deals_rows, columns=DEALS_COLUMNS),
+        pd.DataFrame(auctions_rows, columns=AUCTIONS_COLUMNS),
+        pd.DataFrame(tricks_rows, columns=TRICKS_COLUMNS),
+    )
+
+
+def run_logged_experiment(
+        east_west_agents: str, north_south_agents: str, nb_games: int, seed: int = 0,
+        experiment_id: Optional[str] = None, data_path: str = DATA_PATH
+) -> str:
+    """
+    plays nb_games games (game g with seed + g) and appends them to the games.blog file of the pair of agents;
+    experiment_id defaults to the start time, with a random suffix as experiments started within the same second
+    append to the same file
+    """
+    if experiment_id is None:
+        experiment_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid4().hex[:8]}"
+    agents = {
+        Player.ONE: east_west_agents, Player.TWO: north_south_agents,
+        Player.THREE: east_west_agents, Player.FOUR: north_south_agents,
+    }
+    output_dir = os.path.join(data_path, f'{east_west_agents}-vs-{north_south_agents}')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, 'games.blog')
+    with GameLogWriter(output_path) as writer:
+        for game_id in range(nb_games):
+            writer.add_game(play_recorded_game(agents, experiment_id, game_id, seed=seed + game_id))
+    return output_path
+
+
+if __name__ == '__main__':
+    start_time = time()
+    path = run_logged_experiment(east_west_agents='EXPERT', north_south_agents='HIGHEST_CARD', nb_games=100)
+    deals_df, auctions_df, tricks_df = to_tables(iter_game_log(path))
+    print(f'{os.path.getsize(path) / len(deals_df):.1f} bytes per deal')
+    print(f'elapsed time: {time()-start_time} sec')
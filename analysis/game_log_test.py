@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from analysis.game_log import (
+    GameLogWriter, CorruptedSegmentError, iter_game_log, play_recorded_game, run_logged_experiment, to_tables,
+    encode_bid, decode_bid, encode_game,
+)
+from analysis.experiment import TRICKS_COLUMNS
+from helpers.structures import Player
+
+AGENTS = {Player.ONE: 'HIGHEST_CARD', Player.TWO: 'RANDOM', Player.THREE: 'HIGHEST_CARD', Player.FOUR: 'RANDOM'}
+
+
+@pytest.mark.parametrize('bid', [('pass', None, None), ('bet', 'h', 80), ('bet', 'c', 160), ('bet', 's', 250)])
+def test_bid_codes(bid):
+    assert decode_bid(encode_bid(*bid)) == bid
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_write_and_read_games(tmp_path, compress):
+    path = str(tmp_path / 'games.blog')
+    games = [play_recorded_game(AGENTS, 'exp', game_id, seed=game_id) for game_id in range(5)]
+    with GameLogWriter(path, compress=compress, games_per_segment=2) as writer:
+        for game in games:
+            writer.add_game(game)
+    assert list(iter_game_log(path)) == games
+    nb_deals = sum(len(game.deals) for game in games)
+    assert sum(len(encode_game(game)) for game in games) / nb_deals < 100
+
+
+def test_recorded_games_are_reproducible():
+    assert play_recorded_game(AGENTS, 'exp', 0, seed=13) == play_recorded_game(AGENTS, 'exp', 0, seed=13)
+
+
+def test_logged_experiments_get_distinct_ids(tmp_path):
+    # experiments of the same pair started within the same second append to the same file
+    for _ in range(2):
+        path = run_logged_experiment('HIGHEST_CARD', 'HIGHEST_CARD', nb_games=1, data_path=str(tmp_path))
+    run_logged_experiment('HIGHEST_CARD', 'HIGHEST_CARD', nb_games=1, experiment_id='exp', data_path=str(tmp_path))
+    experiment_ids = [game.experiment_id for game in iter_game_log(path)]
+    assert len(set(experiment_ids)) == 3
+    assert experiment_ids[-1] == 'exp'
+
+
+def test_corrupted_segment(tmp_path):
+    path = str(tmp_path / 'games.blog')
+    with GameLogWriter(path) as writer:
+        writer.add_game(play_recorded_game(AGENTS, 'exp', 0, seed=0))
+    with open(path, 'r+b') as f:
+        f.seek(os.path.getsize(path) - 1)
+        last_byte = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last_byte[0] ^ 0xFF]))
+    with pytest.raises(CorruptedSegmentError):
+        list(iter_game_log(path))
+
+
+def test_to_tables():
+    games = [play_recorded_game(AGENTS, 'exp', game_id, seed=game_id) for game_id in range(2)]
+    deals_df, auctions_df, tricks_df = to_tables(games)
+    assert list(tricks_df.columns) == TRICKS_COLUMNS
+    nb_played_deals = sum(bool(deal.plays) for game in games for deal in game.deals)
+    assert len(deals_df) == sum(len(game.deals) for game in games)
+    assert len(auctions_df) == sum(len(deal.bids) for game in games for deal in game.deals)
+    assert len(tricks_df) == 32 * nb_played_deals
+    assert tricks_df['is_last_in_trick'].sum() == 8 * nb_played_deals
+    round_end_df = tricks_df[tricks_df['is_last_in_round']]
+    assert (round_end_df['east/west_points'] + round_end_df['north/south_points']
+            - 20 * round_end_df['belote_team'].notna() == 162).all()
+    tricks_points = tricks_df.groupby(['game_id', 'round_id'])['trick_points'].sum()
+    assert (tricks_points == 162).all()
+    game_end_df = tricks_df[tricks_df['is_last_in_game']]
+    assert game_end_df['game_id'].tolist() == [0, 1]
+    assert (game_end_df[['east/west_score', 'north/south_score']].max(axis=1) >= 3000).all()
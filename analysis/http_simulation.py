@@ -0,0 +1,344 @@
+# HTTP AGENTS SIMULATION
+#
+# Plays games against agents hosted behind the HTTP contract of the README (/{agent}/bet_or_pass, /{agent}/play),
+# e.g. `python app.py` or a third party server. Games run concurrently in an asyncio event loop:
+# while a game waits for an answer, other games send their own requests.
+# Every agent server gets its own pool of keep-alive connections (HTTP/1.1, stdlib asyncio streams only),
+# bounded by a concurrency limit; requests are cancelled after a timeout and retried with exponential backoff.
+# Pipe agents (cf analysis.pipe_agent) can be played the same way: requests of all the games are batched.
+# Only the final score of every game is written (http_games_data.csv), not the auctions and tricks tables of
+# analysis.experiment: these games never reach the reports and heatmaps of analysis.analyze.
+import asyncio
+import json
+import os
+from datetime import datetime
+from time import time
+from typing import Dict, List, Optional, NamedTuple, Tuple, Callable, Union
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+from analysis.deal_pool import DEALS_PER_GAME, load_deal_pool, pool_dealer
+from analysis.experiment import DATA_PATH, GAME_LIMIT
+from analysis.pipe_agent import PipeAgent, PipeAgentBatcher
+from analysis.simulation import ALL_PLAYERS, NB_TRICKS, describe_bids, compute_round_score, derive_game_winners
+from helpers.structures import (
+    Auction, Round, Card, Game, Player, Team, PLAYER_TO_TEAM, NEXT_PLAYER, AUCTION_END_OK_CODE, AUCTION_END_KO_CODE,
+    CHECK_ERROR_CODE, VALIDATION_ERROR_CODE, UNKNOWN_ERROR_CODE,
+)
+
+HTTP_GAMES_COLUMNS = [
+    'experiment_id', 'game_id', 'east/west_agent', 'north/south_agent', 'first_player',
+    'east/west_score', 'north/south_score', 'game_winners', 'nb_requests', 'elapsed_time',
+]
+DEFAULT_TIMEOUT = 5.
+DEFAULT_NB_RETRIES = 2
+RETRY_BACKOFF = 0.1  # seconds before the first retry, doubled at every attempt
+UPDATE_ERROR_CODES = [CHECK_ERROR_CODE, VALIDATION_ERROR_CODE, UNKNOWN_ERROR_CODE]
+
+
+class HttpAgent(NamedTuple):
+    """agent served at {url}/bet_or_pass and {url}/play, e.g. HttpAgent('EXPERT', 'http://localhost:5000/expert')"""
+    name: str
+    url: str
+    max_concurrency: int = 8  # maximum number of simultaneous requests (and of open connections) to the agent
+
+
+class HttpAgentError(Exception):
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class InvalidAgentResponseError(Exception):
+    """answer of an agent (HTTP or pipe) that the game cannot apply: the game is stopped"""
+    def __init__(self, agent_name: str, route: str, response: Dict, reason: str):
+        super().__init__(f'{agent_name} answered {response} to {route}: {reason}')
+        self.agent_name = agent_name
+        self.response = response
+
+
+class AgentConnectionPool:
+    """keep-alive connections to one agent server, shared by all the games of the event loop"""
+    def __init__(self, agent: HttpAgent, timeout: float = DEFAULT_TIMEOUT, nb_retries: int = DEFAULT_NB_RETRIES):
+        url = urlsplit(agent.url)
+        if url.scheme != 'http':
+            raise ValueError(f'Only http:// agents are supported (got {agent.url})')
+        self.agent = agent
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.path = url.path.rstrip('/')
+        self.timeout = timeout
+        self.nb_retries = nb_retries
+        self.semaphore = asyncio.Semaphore(agent.max_concurrency)
+        self.idle_connections: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self.nb_requests = 0
+        self.nb_retried_requests = 0
+        self.nb_opened_connections = 0
+
+    async def post(self, route: str, payload: Dict) -> Dict:
+        body = json.dumps(payload).encode()
+        async with self.semaphore:
+            for attempt in range(self.nb_retries + 1):
+                try:
+                    self.nb_requests += 1
+                    return await asyncio.wait_for(self._post_once(route, body), self.timeout)
+                except (asyncio.TimeoutError, OSError, asyncio.IncompleteReadError, HttpAgentError) as e:
+                    if (attempt == self.nb_retries) or not getattr(e, 'retryable', True):
+                        raise
+                    self.nb_retried_requests += 1
+                    await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+    async def _post_once(self, route: str, body: bytes) -> Dict:
+        if self.idle_connections:
+            reader, writer = self.idle_connections.pop()
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            self.nb_opened_connections += 1
+        try:
+            writer.write(
+                f'POST {self.path}/{route} HTTP/1.1\r\n'
+                f'Host: {self.host}:{self.port}\r\n'
+                f'Content-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: keep-alive\r\n\r\n'.encode() + body
+            )
+            await writer.drain()
+            status_line = await reader.readline()
+            if not status_line:  # idle connection closed by the server in the meantime
+                raise ConnectionResetError('Connection closed by the agent server')
+            version, status = status_line.decode().split()[:2]
+            headers = {}
+            line = await reader.readline()
+            while line not in [b'\r\n', b'\n', b'']:
+                key, value = line.decode().split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+                line = await reader.readline()
+            keep_alive = (version == 'HTTP/1.1') and (headers.get('connection', '').lower() != 'close')
+            if 'content-length' in headers:
+                response_body = await reader.readexactly(int(headers['content-length']))
+            elif headers.get('transfer-encoding', '').lower() == 'chunked':
+                response_body = await self._read_chunks(reader)
+            else:  # body ends with the connection
+                response_body = await reader.read()
+                keep_alive = False
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            self.idle_connections.append((reader, writer))
+        else:
+            writer.close()
+        if int(status) >= 500:
+            raise HttpAgentError(f'{self.path}/{route} answered {status}')
+        elif int(status) >= 400:
+            raise HttpAgentError(f'{self.path}/{route} answered {status}: {response_body[:200]}', retryable=False)
+        return json.loads(response_body)
+
+    @staticmethod
+    async def _read_chunks(reader: asyncio.StreamReader) -> bytes:
+        """chunked transfer encoding: hexadecimal size line + chunk + CRLF, until an empty chunk (no trailer)"""
+        chunks = []
+        chunk_size = -1
+        while chunk_size != 0:
+            chunk_size = int((await reader.readline()).split(b';')[0], 16)
+            chunks.append((await reader.readexactly(chunk_size + 2))[:-2])
+        return b''.join(chunks)
+
+    def summary(self) -> str:
+        return (f'{self.nb_requests} requests ({self.nb_retried_requests} retried) '
+                f'over {self.nb_opened_connections} connections')
+
+    async def close(self):
+        for (_, writer) in self.idle_connections:
+            writer.close()
+        self.idle_connections = []
+
+
+async def run_auction(
+        hands: Dict[Player, List[Card]], first_player: Player, pools: Dict[Player, AgentConnectionPool],
+        score: Dict[Team, int]
+) -> Auction:
+    """same loop as analysis.simulation.run_auction, agents being asked over HTTP"""
+    auction = Auction()
+    player = first_player
+    while True:
+        response = await pools[player].post('bet_or_pass', {
+            'player': player.value,
+            'playerCards': [card.describe_plain() for card in hands[player]],
+            'playersBids': describe_bids(auction),
+            'auctionPassedTurnInRow': max(auction.current_passed, 0),
+            'globalScore': {team.value: team_score for (team, team_score) in score.items()},
+            'gameFirstPlayer': first_player.value,
+            'encrypted': False,
+        })
+        if response.get('action') not in ['bet', 'pass']:
+            raise InvalidAgentResponseError(pools[player].agent.name, 'bet_or_pass', response, 'unknown action')
+        action_code = auction.update(
+            player=player, passed=(response['action'] == 'pass'), color=response.get('color'),
+            value=response.get('value')
+        )
+        if action_code in UPDATE_ERROR_CODES:
+            raise InvalidAgentResponseError(
+                pools[player].agent.name, 'bet_or_pass', response, f'invalid bid (code {action_code})'
+            )
+        elif action_code in [AUCTION_END_OK_CODE, AUCTION_END_KO_CODE]:
+            return auction
+        player = NEXT_PLAYER[player]
+
+
+async def play_round(
+        hands: Dict[Player, List[Card]], first_player: Player, trump_color: str, contractor: Player, contract: int,
+        pools: Dict[Player, AgentConnectionPool], score: Dict[Team, int]
+) -> Round:
+    """same loop as analysis.simulation.play_round, agents being asked over HTTP"""
+    contract_team = PLAYER_TO_TEAM[contractor]
+    round_ = Round(hands={player: list(cards) for (player, cards) in hands.items()}, trick_opener=first_player)
+    round_.set_trump(trump_color)
+    game_history = {player.value: [] for player in Player}
+    tricks_first_player = []
+    for trick_id in range(NB_TRICKS):
+        trick_opener = round_.trick_opener
+        tricks_first_player.append(trick_opener.value)
+        trick_cards = {}
+        player = trick_opener
+        for _ in range(4):
+            player_cards = [card.describe_plain() for card in round_.hands[player].cards]
+            response = await pools[player].post('play', {
+                'player': player.value,
+                'trumpColor': trump_color,
+                'playerCards': player_cards,
+                'cardsPlayability': round_.get_cards_playability(player),
+                'round': trick_id,
+                'roundCards': {
+                    p.value: c.describe_plain() if c is not None else None
+                    for p, c in round_.trick_cards.cards.items()
+                },
+                'roundColor': trick_cards[trick_opener].color if trick_cards else None,
+                'gameHistory': game_history,
+                'roundsFirstPlayer': tricks_first_player,
+                'contract': contract,
+                'contractTeam': contract_team.value,
+                'globalScore': {team.value: team_score for (team, team_score) in score.items()},
+                'encrypted': False,
+            })
+            if response.get('card') not in player_cards:
+                raise InvalidAgentResponseError(pools[player].agent.name, 'play', response, 'card is not in hand')
+            card_index = player_cards.index(response['card'])
+            card = round_.hands[player].cards[card_index]
+            update_code = round_.update(player=player, card_index=card_index)
+            if update_code in UPDATE_ERROR_CODES:
+                raise InvalidAgentResponseError(
+                    pools[player].agent.name, 'play', response, f'card is not playable (code {update_code})'
+                )
+            trick_cards[player] = card
+            player = NEXT_PLAYER[player]
+        for (player, card) in trick_cards.items():
+            game_history[player.value].append(card.describe_plain())
+    return round_
+
+
+async def play_game(
+        pools: Dict[Player, AgentConnectionPool], first_player: Player = Player.ONE,
+        deal: Callable[[], Dict[Player, List[Card]]] = Game.deal
+) -> Dict[Team, int]:
+    """same loop as analysis.simulation.play_game, agents being asked over HTTP"""
+    score = {team: 0 for team in Team}
+    while max(score.values()) < GAME_LIMIT:
+        hands = deal()
+        auction = await run_auction(hands=hands, first_player=first_player, pools=pools, score=score)
+        if auction.current_best is not None:
+            contractor = auction.current_best
+            contract = auction.bids[contractor].value
+            round_ = await play_round(
+                hands=hands, first_player=first_player, trump_color=auction.get_best_color(), contractor=contractor,
+                contract=contract, pools=pools, score=score
+            )
+            for (team, round_score) in compute_round_score(round_, PLAYER_TO_TEAM[contractor], contract).items():
+                score[team] += round_score
+        first_player = NEXT_PLAYER[first_player]
+    return score
+
+
+async def run_http_experiment_async(
+        east_west_agent: Union[HttpAgent, PipeAgent], north_south_agent: Union[HttpAgent, PipeAgent], nb_games: int,
+        max_concurrent_games: int = 32,
+        timeout: float = DEFAULT_TIMEOUT, nb_retries: int = DEFAULT_NB_RETRIES, deal_pool_path: Optional[str] = None
+) -> Tuple[pd.DataFrame, Dict[str, Union[AgentConnectionPool, PipeAgentBatcher]]]:
+    experiment_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    # agents served by the same server (or process) share their connections
+    pools = {}
+    for agent in [east_west_agent, north_south_agent]:
+        if agent.name in pools:
+            continue
+        elif isinstance(agent, PipeAgent):
+            pools[agent.name] = PipeAgentBatcher(agent)
+        else:
+            pools[agent.name] = AgentConnectionPool(agent, timeout=timeout, nb_retries=nb_retries)
+    player_pools = {
+        player: pools[east_west_agent.name if PLAYER_TO_TEAM[player] == Team.ONE else north_south_agent.name]
+        for player in Player
+    }
+    deal_pool = load_deal_pool(deal_pool_path) if deal_pool_path is not None else None
+    games_semaphore = asyncio.Semaphore(max_concurrent_games)
+
+    async def run_game(game_id: int) -> Dict:
+        async with games_semaphore:
+            start_time = time()
+            nb_requests = sum(pool.nb_requests for pool in pools.values())
+            first_player = ALL_PLAYERS[game_id % 4]
+            deal = Game.deal if deal_pool is None else pool_dealer(deal_pool, game_id * DEALS_PER_GAME)
+            score = await play_game(pools=player_pools, first_player=first_player, deal=deal)
+            return {
+                'experiment_id': experiment_id,
+                'game_id': game_id,
+                'east/west_agent': east_west_agent.name,
+                'north/south_agent': north_south_agent.name,
+                'first_player': first_player.value,
+                'east/west_score': score[Team.ONE],
+                'north/south_score': score[Team.TWO],
+                'game_winners': derive_game_winners(score).value,
+                # requests sent by all the games running meanwhile are counted too
+                'nb_requests': sum(pool.nb_requests for pool in pools.values()) - nb_requests,
+                'elapsed_time': time() - start_time,
+            }
+
+    try:
+        rows = await asyncio.gather(*[run_game(game_id) for game_id in range(nb_games)])
+    finally:
+        for pool in pools.values():
+            await pool.close()
+    return pd.DataFrame(rows, columns=HTTP_GAMES_COLUMNS), pools
+
+
+def run_http_experiment(
+        east_west_agent: Union[HttpAgent, PipeAgent], north_south_agent: Union[HttpAgent, PipeAgent], nb_games: int,
+        max_concurrent_games: int = 32,
+        timeout: float = DEFAULT_TIMEOUT, nb_retries: int = DEFAULT_NB_RETRIES, deal_pool_path: Optional[str] = None,
+        data_path: str = DATA_PATH
+) -> pd.DataFrame:
+    games_df, pools = asyncio.run(run_http_experiment_async(
+        east_west_agent=east_west_agent, north_south_agent=north_south_agent, nb_games=nb_games,
+        max_concurrent_games=max_concurrent_games, timeout=timeout, nb_retries=nb_retries,
+        deal_pool_path=deal_pool_path
+    ))
+    for (name, pool) in pools.items():
+        print(f'{name}: {pool.summary()}')
+
+    output_dir = os.path.join(data_path, f'{east_west_agent.name}-vs-{north_south_agent.name}')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, 'http_games_data.csv')
+    games_df.to_csv(output_path, sep=';', mode='a', header=not os.path.exists(output_path), index=False)
+
+    return games_df
+
+
+if __name__ == '__main__':
+    start_time = time()
+    df = run_http_experiment(
+        east_west_agent=HttpAgent('EXPERT', 'http://localhost:5000/expert'),
+        north_south_agent=HttpAgent('HIGHEST_CARD', 'http://localhost:5000/highest_card'),
+        nb_games=100
+    )
+    print(df['game_winners'].value_counts(normalize=True))
+    print(f'elapsed time: {time()-start_time} sec')
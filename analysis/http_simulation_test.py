@@ -0,0 +1,139 @@
+import asyncio
+import json
+import logging
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+from analysis.experiment import GAME_LIMIT
+from analysis.card_codes import decode_card
+from analysis.http_simulation import (
+    HttpAgent, HttpAgentError, AgentConnectionPool, InvalidAgentResponseError, run_http_experiment_async, run_auction,
+    play_round, HTTP_GAMES_COLUMNS,
+)
+from app import app
+from helpers.structures import Player, Team
+
+
+@pytest.fixture(scope='module')
+def app_url():
+    """local instance of app.py"""
+    app.logger.setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    app.logger.setLevel(logging.INFO)
+
+
+def test_run_http_experiment_against_app(app_url):
+    games_df, pools = asyncio.run(run_http_experiment_async(
+        east_west_agent=HttpAgent('EXPERT', f'{app_url}/expert', max_concurrency=4),
+        north_south_agent=HttpAgent('RANDOM', f'{app_url}/random', max_concurrency=4),
+        nb_games=3
+    ))
+    assert list(games_df.columns) == HTTP_GAMES_COLUMNS
+    assert games_df['game_id'].tolist() == [0, 1, 2]
+    assert (games_df[['east/west_score', 'north/south_score']].max(axis=1) >= GAME_LIMIT).all()
+    assert pools['EXPERT'].nb_requests > 0 and pools['RANDOM'].nb_requests > 0
+
+
+async def _serve_keep_alive(responses):
+    """minimal HTTP/1.1 server answering the given (status, body) in order on kept-alive connections"""
+    async def handle(reader, writer):
+        while True:
+            headers = {}
+            line = await reader.readline()
+            if not line:
+                break
+            while line not in [b'\r\n', b'']:
+                if b':' in line:
+                    key, value = line.decode().split(':', 1)
+                    headers[key.strip().lower()] = value.strip()
+                line = await reader.readline()
+            await reader.readexactly(int(headers['content-length']))
+            status, body = responses.pop(0)
+            writer.write(f'HTTP/1.1 {status} X\r\nContent-Length: {len(body)}\r\n\r\n{body}'.encode())
+            await writer.drain()
+        writer.close()
+    return await asyncio.start_server(handle, '127.0.0.1', 0)
+
+
+def test_pool_keeps_connections_alive_and_retries():
+    async def run():
+        responses = [(200, json.dumps({'action': 'pass'})), (503, ''), (200, json.dumps({'card': '7h'}))]
+        server = await _serve_keep_alive(responses)
+        port = server.sockets[0].getsockname()[1]
+        pool = AgentConnectionPool(HttpAgent('STUB', f'http://127.0.0.1:{port}/stub'), timeout=1.)
+        assert await pool.post('bet_or_pass', {}) == {'action': 'pass'}
+        assert await pool.post('play', {}) == {'card': '7h'}
+        await pool.close()
+        server.close()
+        return pool
+
+    pool = asyncio.run(run())
+    assert pool.nb_opened_connections == 1
+    assert pool.nb_requests == 3
+    assert pool.nb_retried_requests == 1
+
+
+def test_pool_does_not_retry_client_errors():
+    async def run():
+        server = await _serve_keep_alive([(400, 'bad request'), (200, '{}')])
+        port = server.sockets[0].getsockname()[1]
+        pool = AgentConnectionPool(HttpAgent('STUB', f'http://127.0.0.1:{port}/stub'), timeout=1.)
+        try:
+            await pool.post('play', {})
+        finally:
+            await pool.close()
+            server.close()
+
+    with pytest.raises(HttpAgentError):
+        asyncio.run(run())
+
+
+class StubPool:
+    """agent answering answer(route, payload), with the interface of AgentConnectionPool"""
+    def __init__(self, name, answer):
+        self.agent = HttpAgent(name, 'http://stub')
+        self.answer = answer
+
+    async def post(self, route, payload):
+        return self.answer(route, payload)
+
+
+# every player gets 2 cards of every color
+HANDS = {player: [decode_card(code) for code in range(position, 32, 4)] for (position, player) in enumerate(Player)}
+SCORE = {team: 0 for team in Team}
+
+
+@pytest.mark.parametrize('response', [{'action': 'bet', 'color': 'h', 'value': 75}, {'action': 'raise'}, {}])
+def test_run_auction_rejects_invalid_bids(response):
+    pools = {player: StubPool('BAD_BIDDER', lambda route, payload: response) for player in Player}
+    with pytest.raises(InvalidAgentResponseError, match='BAD_BIDDER'):
+        asyncio.run(run_auction(hands=HANDS, first_player=Player.ONE, pools=pools, score=SCORE))
+
+
+def test_play_round_rejects_cards_not_in_hand():
+    pools = {player: StubPool('CHEATER', lambda route, payload: {'card': 'Xh'}) for player in Player}
+    with pytest.raises(InvalidAgentResponseError, match='not in hand'):
+        asyncio.run(play_round(
+            hands=HANDS, first_player=Player.ONE, trump_color='h', contractor=Player.ONE, contract=80, pools=pools,
+            score=SCORE
+        ))
+
+
+def test_play_round_rejects_unplayable_cards():
+    def play_unplayable_card(route, payload):
+        cards = [card for (card, playable) in zip(payload['playerCards'], payload['cardsPlayability']) if not playable]
+        return {'card': (cards or payload['playerCards'])[0]}
+
+    pools = {player: StubPool('CHEATER', play_unplayable_card) for player in Player}
+    with pytest.raises(InvalidAgentResponseError, match='not playable'):
+        asyncio.run(play_round(
+            hands=HANDS, first_player=Player.ONE, trump_color='h', contractor=Player.ONE, contract=80, pools=pools,
+            score=SCORE
+        ))
@@ -0,0 +1,159 @@
+# RATING LADDER
+#
+# Instead of the k x k round robin of generate_heatmaps, every registered agent gets a Glicko rating
+# (rating + deviation, i.e. a gaussian belief on its strength) that is updated after every batch of games.
+# Next matchups are the ones whose outcome is the most uncertain and the most informative:
+# pairs of agents with high deviations and close ratings.
+# cf http://www.glicko.net/glicko/glicko.pdf
+# Agents (names of this package, AgentVariant or PipeAgent, cf analysis.experiment.Agent) are keyed by their name
+# in the ladder file: the agents of a run are given again to run_ladder, which maps their names back to them.
+import json
+import math
+import os
+import random
+from itertools import combinations
+from multiprocessing import Pool
+from time import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from analysis.experiment import DATA_PATH, Agent, get_agent_name
+from analysis.simulation import derive_game_winners, play_game
+from helpers.structures import Player, Team
+
+LADDER_PATH = os.path.join(DATA_PATH, 'ladder.json')
+INITIAL_RATING = 1500.
+INITIAL_DEVIATION = 350.
+MIN_DEVIATION = 30.
+Q = math.log(10) / 400
+
+
+def load_ladder(path: str = LADDER_PATH) -> Dict[str, Dict[str, float]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_ladder(ladder: Dict[str, Dict[str, float]], path: str = LADDER_PATH):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(ladder, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def register_agents(ladder: Dict[str, Dict[str, float]], agents: List[Agent]) -> Dict[str, Agent]:
+    """registry of the agents by name, new names entering the ladder with the initial rating"""
+    registry = {}
+    for agent in agents:
+        name = get_agent_name(agent)
+        if name in registry:
+            raise ValueError(f'Several agents are named {name}: ladder entries are keyed by name')
+        registry[name] = agent
+        ladder.setdefault(name, {'rating': INITIAL_RATING, 'deviation': INITIAL_DEVIATION, 'nb_games': 0})
+    return registry
+
+
+def _g(deviation: float) -> float:
+    return 1 / math.sqrt(1 + 3 * (Q * deviation / math.pi) ** 2)
+
+
+def compute_expected_score(rating: float, opponent_rating: float, opponent_deviation: float) -> float:
+    return 1 / (1 + 10 ** (-_g(opponent_deviation) * (rating - opponent_rating) / 400))
+
+
+def update_ratings(ladder: Dict[str, Dict[str, float]], results: List[Tuple[str, str, int, int]]):
+    """
+    results: (agent_A, agent_B, nb_games_won_by_A, nb_games) of the batch, considered as one rating period
+    (every agent is updated against the ratings of its opponents at the beginning of the period)
+    """
+    games = {agent: [] for agent in ladder}
+    for (agent_A, agent_B, nb_won_games, nb_games) in results:
+        games[agent_A].append((agent_B, nb_won_games, nb_games))
+        games[agent_B].append((agent_A, nb_games - nb_won_games, nb_games))
+    previous_ladder = {agent: dict(entry) for (agent, entry) in ladder.items()}
+    for (agent, agent_games) in games.items():
+        if not agent_games:
+            continue
+        rating, deviation = previous_ladder[agent]['rating'], previous_ladder[agent]['deviation']
+        d_inverse = 0.
+        score_gap = 0.
+        for (opponent, nb_won_games, nb_games) in agent_games:
+            opponent_rating = previous_ladder[opponent]['rating']
+            opponent_deviation = previous_ladder[opponent]['deviation']
+            g = _g(opponent_deviation)
+            expected_score = compute_expected_score(rating, opponent_rating, opponent_deviation)
+            d_inverse += nb_games * Q ** 2 * g ** 2 * expected_score * (1 - expected_score)
+            score_gap += g * (nb_won_games - nb_games * expected_score)
+        precision = 1 / deviation ** 2 + d_inverse
+        ladder[agent]['rating'] = rating + Q / precision * score_gap
+        ladder[agent]['deviation'] = max(MIN_DEVIATION, math.sqrt(1 / precision))
+        ladder[agent]['nb_games'] += sum(nb_games for (_, _, nb_games) in agent_games)
+
+
+def schedule_matchups(
+        ladder: Dict[str, Dict[str, float]], nb_matchups: int, names: Optional[List[str]] = None
+) -> List[Tuple[str, str]]:
+    """
+    pairs (of names, every agent of the ladder by default) maximizing the uncertainty on their outcome:
+    (deviation_A^2 + deviation_B^2) * E * (1 - E)
+    """
+    def uncertainty(pair):
+        entry_A, entry_B = ladder[pair[0]], ladder[pair[1]]
+        expected_score = compute_expected_score(
+            entry_A['rating'], entry_B['rating'], math.hypot(entry_A['deviation'], entry_B['deviation'])
+        )
+        return (entry_A['deviation'] ** 2 + entry_B['deviation'] ** 2) * expected_score * (1 - expected_score)
+    return sorted(combinations(sorted(names or ladder), 2), key=uncertainty, reverse=True)[:nb_matchups]
+
+
+def play_matchup(matchup: Tuple[Agent, Agent, int, int]) -> Tuple[str, str, int, int]:
+    """agent_A plays half of the games as east/west and half as north/south; results are keyed by name"""
+    agent_A, agent_B, nb_games, seed = matchup
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+    nb_won_games = 0
+    for game_id in range(nb_games):
+        team_A = Team.ONE if game_id % 2 == 0 else Team.TWO
+        agents = {
+            player: agent_A if (player in [Player.ONE, Player.THREE]) == (team_A == Team.ONE) else agent_B
+            for player in Player
+        }
+        score = play_game(agents=agents)
+        nb_won_games += derive_game_winners(score) == team_A
+    return get_agent_name(agent_A), get_agent_name(agent_B), nb_won_games, nb_games
+
+
+def print_ranking(ladder: Dict[str, Dict[str, float]]):
+    for (rank, (agent, entry)) in enumerate(sorted(ladder.items(), key=lambda x: x[1]['rating'], reverse=True)):
+        print(f"{rank + 1}. {agent}: {entry['rating']:.0f} ± {2 * entry['deviation']:.0f} ({entry['nb_games']} games)")
+
+
+def run_ladder(
+        agents: List[Agent], nb_batches: int, nb_matchups_per_batch: int, nb_games_per_matchup: int = 10,
+        nb_processes: Optional[int] = None, path: str = LADDER_PATH
+) -> Dict[str, Dict[str, float]]:
+    """matchups are scheduled among agents only: other agents of the ladder file keep their rating"""
+    ladder = load_ladder(path)
+    registry = register_agents(ladder, agents)
+    with Pool(processes=nb_processes) as pool:
+        for batch_id in range(nb_batches):
+            matchups = [
+                (registry[name_A], registry[name_B], nb_games_per_matchup, random.randrange(2 ** 63))
+                for (name_A, name_B) in schedule_matchups(ladder, nb_matchups_per_batch, names=list(registry))
+            ]
+            update_ratings(ladder, pool.map(play_matchup, matchups))
+            save_ladder(ladder, path)
+            print(f'>> batch {batch_id + 1}/{nb_batches}')
+            print_ranking(ladder)
+    return ladder
+
+
+if __name__ == '__main__':
+    start_time = time()
+    run_ladder(
+        agents=["RANDOM", "HIGHEST_CARD", "HIGHEST_CARD_W_EXP_BET", "EXPERT_W_HC_BET", "EXPERT"],
+        nb_batches=10, nb_matchups_per_batch=4, nb_games_per_matchup=10
+    )
+    print(f'elapsed time: {time()-start_time} sec')
@@ -0,0 +1,69 @@
+import pytest
+
+from analysis.ladder import (
+    load_ladder, register_agents, run_ladder, update_ratings, schedule_matchups, INITIAL_RATING, INITIAL_DEVIATION
+)
+from analysis.sweep import build_grid_variants
+
+
+def test_update_ratings_glicko_example():
+    """example from http://www.glicko.net/glicko/glicko.pdf"""
+    ladder = {
+        'A': {'rating': 1500., 'deviation': 200., 'nb_games': 0},
+        'B': {'rating': 1400., 'deviation': 30., 'nb_games': 0},
+        'C': {'rating': 1550., 'deviation': 100., 'nb_games': 0},
+        'D': {'rating': 1700., 'deviation': 300., 'nb_games': 0},
+    }
+    update_ratings(ladder, [('A', 'B', 1, 1), ('A', 'C', 0, 1), ('A', 'D', 0, 1)])
+    assert ladder['A']['rating'] == pytest.approx(1464, abs=1)
+    assert ladder['A']['deviation'] == pytest.approx(151.4, abs=0.5)
+    assert ladder['A']['nb_games'] == 3
+
+
+def test_update_ratings_is_symmetric():
+    ladder = {}
+    register_agents(ladder, ['A', 'B'])
+    update_ratings(ladder, [('A', 'B', 7, 10)])
+    assert ladder['A']['rating'] - INITIAL_RATING == pytest.approx(INITIAL_RATING - ladder['B']['rating'])
+    assert ladder['A']['deviation'] == pytest.approx(ladder['B']['deviation'])
+    assert ladder['A']['deviation'] < INITIAL_DEVIATION
+
+
+def test_schedule_matchups_prefers_uncertain_pairs():
+    ladder = {
+        'A': {'rating': 1500., 'deviation': 50., 'nb_games': 100},
+        'B': {'rating': 1510., 'deviation': 50., 'nb_games': 100},
+        'C': {'rating': 1500., 'deviation': 350., 'nb_games': 0},
+        'D': {'rating': 2500., 'deviation': 50., 'nb_games': 100},
+    }
+    matchups = schedule_matchups(ladder, nb_matchups=2)
+    assert all('C' in matchup for matchup in matchups)
+    assert ('C', 'D') not in matchups
+
+
+def test_run_ladder_ranks_variants(tmp_path):
+    path = str(tmp_path / 'ladder.json')
+    variants = build_grid_variants(base='HIGHEST_CARD', grid={'bet_or_pass.min_points': [40, 50, 60]})
+    ladder = run_ladder(
+        agents=['RANDOM', *variants], nb_batches=2, nb_matchups_per_batch=2, nb_games_per_matchup=2,
+        nb_processes=1, path=path
+    )
+    names = ['RANDOM', *[variant.name for variant in variants]]
+    assert sorted(ladder) == sorted(names)
+    assert load_ladder(path) == ladder
+    assert sum(entry['nb_games'] for entry in ladder.values()) == 2 * 2 * 2 * 2  # 2 agents per game
+
+    # agents of the file that are not given are kept, but not scheduled
+    new_ladder = run_ladder(agents=variants[:2], nb_batches=1, nb_matchups_per_batch=1, nb_games_per_matchup=2,
+                            nb_processes=1, path=path)
+    assert sorted(new_ladder) == sorted(names)
+    for name in ['RANDOM', variants[2].name]:
+        assert new_ladder[name] == ladder[name]
+    for variant in variants[:2]:
+        assert new_ladder[variant.name]['nb_games'] == ladder[variant.name]['nb_games'] + 2
+
+
+def test_register_agents_rejects_duplicated_names():
+    variants = build_grid_variants(base='HIGHEST_CARD', grid={'bet_or_pass.min_points': [40]})
+    with pytest.raises(ValueError):
+        register_agents({}, [*variants, variants[0]._replace(base='EXPERT')])
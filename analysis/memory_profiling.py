@@ -0,0 +1,99 @@
+# MEMORY PROFILING
+#
+# Opt-in memory report of run_experiment, printed at every batch (cf memory_profiler argument):
+# memory traced by tracemalloc (current, peak, growth per game), peak RSS of the process,
+# top allocation sites since the previous batch and number of live engine objects (helpers.structures).
+# With max_memory_per_game, a report whose traced memory grew by more than this amount (in bytes)
+# per played game since the beginning raises MemoryCeilingExceeded: regression benchmarks can assert a ceiling.
+import gc
+import resource
+import sys
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from helpers.structures import Card, Bid, Hand, TrickCards, Auction, Round, Game
+
+ENGINE_CLASSES = (Card, Bid, Hand, TrickCards, Auction, Round, Game, pd.DataFrame)
+
+
+class MemoryCeilingExceeded(RuntimeError):
+    pass
+
+
+def get_peak_rss() -> int:
+    """peak resident set size of the process, in bytes"""
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == 'darwin' else 1024 * peak_rss  # kilobytes on Linux
+
+
+def count_engine_objects() -> Dict[str, int]:
+    counts = Counter(type(obj).__name__ for obj in gc.get_objects() if isinstance(obj, ENGINE_CLASSES))
+    return {cls.__name__: counts.get(cls.__name__, 0) for cls in ENGINE_CLASSES}
+
+
+class MemoryProfiler:
+    def __init__(self, top_n: int = 10, nb_frames: int = 1, max_memory_per_game: Optional[int] = None,
+                 verbose: bool = True):
+        self.top_n = top_n
+        self.nb_frames = nb_frames
+        self.max_memory_per_game = max_memory_per_game
+        self.verbose = verbose
+        self.reports: List[Dict] = []
+        self.baseline_memory = 0
+        self.previous_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    def start(self):
+        tracemalloc.start(self.nb_frames)
+        self.baseline_memory = tracemalloc.get_traced_memory()[0]
+        self.previous_snapshot = tracemalloc.take_snapshot()
+
+    def stop(self):
+        tracemalloc.stop()
+        self.previous_snapshot = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def report_batch(self, played_games: int) -> Dict:
+        gc.collect()  # only leaked objects should remain
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        memory_per_game = (current_memory - self.baseline_memory) / max(played_games, 1)
+        report = {
+            'played_games': played_games,
+            'traced_memory': current_memory,
+            'peak_traced_memory': peak_memory,
+            'memory_per_game': memory_per_game,
+            'peak_rss': get_peak_rss(),
+            'top_allocations': [
+                (str(stat.traceback), stat.size_diff, stat.count_diff)
+                for stat in snapshot.compare_to(self.previous_snapshot, 'lineno')[:self.top_n]
+            ],
+            'engine_objects': count_engine_objects(),
+        }
+        self.previous_snapshot = snapshot
+        self.reports.append(report)
+        if self.verbose:
+            print_report(report)
+        if (self.max_memory_per_game is not None) and (memory_per_game > self.max_memory_per_game):
+            raise MemoryCeilingExceeded(
+                f'{memory_per_game:.0f} bytes retained per game after {played_games} games '
+                f'(ceiling: {self.max_memory_per_game} bytes)'
+            )
+        return report
+
+
+def print_report(report: Dict):
+    print(f"...memory after {report['played_games']} games: {report['traced_memory'] / 2 ** 20:.1f} MiB traced "
+          f"(peak {report['peak_traced_memory'] / 2 ** 20:.1f} MiB, {report['memory_per_game'] / 2 ** 10:.1f} KiB "
+          f"per game), peak RSS {report['peak_rss'] / 2 ** 20:.1f} MiB")
+    for (site, size_diff, count_diff) in report['top_allocations']:
+        print(f'   {size_diff / 2 ** 10:+10.1f} KiB {count_diff:+8d} blocks  {site}')
+    print('   live objects: ' + ', '.join(f'{name}={count}' for (name, count) in report['engine_objects'].items()))
@@ -0,0 +1,41 @@
+import gc
+
+import pytest
+
+from analysis.experiment import run_experiment
+from analysis.memory_profiling import MemoryCeilingExceeded, MemoryProfiler, count_engine_objects
+from helpers.structures import Game, Player
+
+
+def test_count_engine_objects():
+    # no collection between both counts: unreachable engine objects of former tests would be freed in between
+    gc.collect()
+    gc.disable()
+    try:
+        before = count_engine_objects()
+        games = [Game(first_player=Player.ONE) for _ in range(3)]
+        after = count_engine_objects()
+    finally:
+        gc.enable()
+    assert after['Game'] - before['Game'] == len(games)
+    assert after['Hand'] - before['Hand'] >= 4 * len(games)
+
+
+def test_report_per_batch(tmp_path):
+    with MemoryProfiler(top_n=5, verbose=False) as profiler:
+        run_experiment('RANDOM', 'HIGHEST_CARD', nb_games=2, batch_size=1, data_path=str(tmp_path),
+                       memory_profiler=profiler)
+    assert [report['played_games'] for report in profiler.reports] == [1, 2]
+    report = profiler.reports[-1]
+    assert report['peak_rss'] > 0
+    assert report['peak_traced_memory'] >= report['traced_memory'] > 0
+    assert 0 < len(report['top_allocations']) <= 5
+    assert set(report['engine_objects']) >= {'Game', 'Round', 'Auction', 'Card', 'Hand', 'DataFrame'}
+
+
+def test_memory_ceiling(tmp_path):
+    with pytest.raises(MemoryCeilingExceeded):
+        with MemoryProfiler(max_memory_per_game=1, verbose=False) as profiler:
+            run_experiment('RANDOM', 'RANDOM', nb_games=1, batch_size=1, data_path=str(tmp_path),
+                           memory_profiler=profiler)
+    assert len(profiler.reports) == 1
@@ -0,0 +1,252 @@
+# SQLITE METRICS STORE
+#
+# Facts of the datasets (cf analysis.analyze.build_dataset_facts) persisted in a SQLite database:
+#   experiments              one row per experiment of a pair of agents (ew_agent, ns_agent: directory of its data)
+#   games / rounds           one summary row per game / round, columns of DatasetFacts (ew_ for east/west_, ns_ for
+#                            north/south_), in the seats of their experiment
+#   experiment_aggregates    (total, count) of every indicator (cf analysis.analyze.aggregate_indicators),
+#                            by experiment and team
+#   watermarks               byte offsets of the data files up to which rows are imported (cf AppendedRows)
+# Data directories are imported incrementally: only the games written since the previous import are read, in a
+# single transaction with the update of the watermarks (run_experiment imports every batch with metrics_db_path).
+# Indicators of a pair of agents (A, B) sum the aggregates of A-vs-B experiments for the requested team and of
+# B-vs-A experiments for the other team, as analysis.analyze.prepare_datasets mirrors them.
+#   python -m analysis.metrics_store --data-path ./data --db-path ./data/metrics.sqlite [--report A B]
+import argparse
+import os
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from analysis.analyze import (
+    DATA_PATH, INDICATORS, OTHER_TEAM, STREAMING_CHUNKSIZE, TEAMS, AppendedDataset, DatasetFacts,
+    aggregate_indicators_by, finalize_indicators, print_report
+)
+
+METRICS_DB_PATH = os.path.join(DATA_PATH, 'metrics.sqlite')
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS experiments (
+    experiment_key INTEGER PRIMARY KEY,
+    experiment_id TEXT NOT NULL,
+    ew_agent TEXT NOT NULL,
+    ns_agent TEXT NOT NULL,
+    nb_games INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (ew_agent, ns_agent, experiment_id)  -- index of the experiments of a pair of agents
+);
+CREATE INDEX IF NOT EXISTS experiments_by_experiment_id ON experiments (experiment_id);
+CREATE TABLE IF NOT EXISTS games (
+    experiment_key INTEGER NOT NULL REFERENCES experiments,
+    game_id INTEGER NOT NULL,
+    finished INTEGER NOT NULL,
+    game_winners TEXT,
+    ew_score REAL,
+    ns_score REAL,
+    PRIMARY KEY (experiment_key, game_id)
+);
+CREATE TABLE IF NOT EXISTS rounds (
+    experiment_key INTEGER NOT NULL REFERENCES experiments,
+    game_id INTEGER NOT NULL,
+    round_id INTEGER NOT NULL,
+    contractor TEXT,
+    contract_team TEXT,
+    contract REAL,
+    played INTEGER NOT NULL,
+    reached INTEGER NOT NULL,
+    ew_points REAL,
+    ns_points REAL,
+    belote_team TEXT,
+    round_winners TEXT,
+    ew_tricks INTEGER NOT NULL,
+    ns_tricks INTEGER NOT NULL,
+    nb_tricks INTEGER NOT NULL,
+    auctioned INTEGER NOT NULL,
+    PRIMARY KEY (experiment_key, game_id, round_id)
+);
+CREATE TABLE IF NOT EXISTS experiment_aggregates (
+    experiment_key INTEGER NOT NULL REFERENCES experiments,
+    team TEXT NOT NULL,
+    indicator TEXT NOT NULL,
+    total REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (experiment_key, team, indicator)
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    dir_name TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    PRIMARY KEY (dir_name, file_name)
+);
+CREATE VIEW IF NOT EXISTS pair_aggregates AS
+    SELECT ew_agent, ns_agent, team, indicator, SUM(total) AS total, SUM(count) AS count
+    FROM experiment_aggregates JOIN experiments USING (experiment_key)
+    GROUP BY ew_agent, ns_agent, team, indicator;
+'''
+GAMES_COLUMNS = {
+    'finished': 'finished', 'game_winners': 'game_winners',
+    'east/west_score': 'ew_score', 'north/south_score': 'ns_score',
+}
+ROUNDS_COLUMNS = {
+    'contractor': 'contractor', 'contract_team': 'contract_team', 'contract': 'contract', 'played': 'played',
+    'reached': 'reached', 'east/west_points': 'ew_points', 'north/south_points': 'ns_points',
+    'belote_team': 'belote_team', 'round_winners': 'round_winners', 'east/west_tricks': 'ew_tricks',
+    'north/south_tricks': 'ns_tricks', 'nb_tricks': 'nb_tricks', 'auctioned': 'auctioned',
+}
+PAIR_AGGREGATES_QUERY = '''
+SELECT indicator, SUM(total), SUM(count)
+FROM experiment_aggregates JOIN experiments USING (experiment_key)
+WHERE (ew_agent = :agent_A AND ns_agent = :agent_B AND team = :team)
+    OR (ew_agent = :agent_B AND ns_agent = :agent_A AND team = :other_team)
+GROUP BY indicator
+'''
+# rounds contracted by agent (in either seat), by contract value
+CONTRACT_SUCCESS_QUERY = '''
+SELECT contract, COUNT(*) AS nb_contracts, AVG(reached) AS pc_reached
+FROM rounds JOIN experiments USING (experiment_key)
+WHERE played AND contract_team IS NOT NULL
+    AND (CASE contract_team WHEN 'east/west' THEN ew_agent ELSE ns_agent END) = :agent
+GROUP BY contract
+ORDER BY contract
+'''
+
+
+def connect(db_path: str = METRICS_DB_PATH) -> sqlite3.Connection:
+    """connection in autocommit mode (transactions are explicit), the schema being created if needed"""
+    connection = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def to_records(df: pd.DataFrame, columns: List[str]) -> List[Tuple]:
+    """rows as tuples of python values, missing values being None"""
+    values = df[columns].astype(object)
+    return list(values.where(values.notna(), None).itertuples(index=False, name=None))
+
+
+def get_experiment_keys(connection: sqlite3.Connection, ew_agent: str, ns_agent: str, experiment_ids) -> Dict:
+    connection.executemany(
+        'INSERT OR IGNORE INTO experiments (experiment_id, ew_agent, ns_agent) VALUES (?, ?, ?)',
+        [(experiment_id, ew_agent, ns_agent) for experiment_id in experiment_ids]
+    )
+    return dict(connection.execute(
+        'SELECT experiment_id, experiment_key FROM experiments WHERE ew_agent = ? AND ns_agent = ?',
+        (ew_agent, ns_agent)
+    ).fetchall())
+
+
+def insert_facts(connection: sqlite3.Connection, ew_agent: str, ns_agent: str, facts: DatasetFacts):
+    experiment_ids = pd.concat([facts.rounds['experiment_id'], facts.games['experiment_id']]).astype(object).unique()
+    experiment_keys = get_experiment_keys(connection, ew_agent, ns_agent, experiment_ids)
+
+    games = facts.games.assign(experiment_key=facts.games['experiment_id'].astype(object).map(experiment_keys))
+    connection.executemany(
+        f'INSERT INTO games VALUES ({", ".join(["?"] * (2 + len(GAMES_COLUMNS)))})',
+        to_records(games, ['experiment_key', 'game_id'] + list(GAMES_COLUMNS))
+    )
+    rounds = facts.rounds.assign(experiment_key=facts.rounds['experiment_id'].astype(object).map(experiment_keys))
+    connection.executemany(
+        f'INSERT INTO rounds VALUES ({", ".join(["?"] * (3 + len(ROUNDS_COLUMNS)))})',
+        to_records(rounds, ['experiment_key', 'game_id', 'round_id'] + list(ROUNDS_COLUMNS))
+    )
+    connection.executemany(
+        'UPDATE experiments SET nb_games = nb_games + ? WHERE experiment_key = ?',
+        [(int(nb_games), experiment_keys[experiment_id])
+         for (experiment_id, nb_games) in games['experiment_id'].astype(object).value_counts().items()]
+    )
+    for team in TEAMS:
+        units, totals, counts = aggregate_indicators_by(facts, team, keys=['experiment_id'])
+        connection.executemany(
+            'INSERT INTO experiment_aggregates VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (experiment_key, team, indicator) '
+            'DO UPDATE SET total = total + excluded.total, count = count + excluded.count',
+            [
+                (experiment_keys[experiment_id], team, name, float(total), int(count))
+                for (experiment_id, experiment_totals, experiment_counts) in zip(units['experiment_id'], totals, counts)
+                for (name, total, count) in zip(INDICATORS, experiment_totals, experiment_counts)
+            ]
+        )
+
+
+def import_directory(db_path: str, dir_path: str, chunksize: int = STREAMING_CHUNKSIZE) -> int:
+    """imports the games of a data directory ({ew_agent}-vs-{ns_agent}) written since its last import"""
+    dir_name = os.path.basename(os.path.normpath(dir_path))
+    ew_agent, ns_agent = dir_name.split('-vs-', 1)
+    connection = connect(db_path)
+    try:
+        connection.execute('BEGIN IMMEDIATE')  # concurrent imports of a directory wait for each other
+        offsets = dict(connection.execute(
+            'SELECT file_name, offset FROM watermarks WHERE dir_name = ?', (dir_name,)
+        ).fetchall())
+        for (file_name, offset) in offsets.items():
+            if os.path.getsize(os.path.join(dir_path, file_name)) < offset:
+                raise ValueError(f'{file_name} of {dir_name} is shorter than its imported part: it has been rewritten')
+        dataset = AppendedDataset(dir_path, offsets)
+        nb_games = 0
+        for facts in dataset.iter_facts(chunksize=chunksize):
+            insert_facts(connection, ew_agent, ns_agent, facts)
+            nb_games += len(facts.games)
+        connection.executemany(
+            'INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?)',
+            [(dir_name, file_name, offset) for (file_name, offset) in dataset.offsets.items()]
+        )
+        connection.execute('COMMIT')
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    finally:
+        connection.close()
+    return nb_games
+
+
+def import_data(db_path: str = METRICS_DB_PATH, data_path: str = DATA_PATH) -> Dict[str, int]:
+    """imports every data directory: number of new games by directory"""
+    return {
+        dir_name: import_directory(db_path, os.path.join(data_path, dir_name))
+        for dir_name in sorted(os.listdir(data_path))
+        if os.path.exists(os.path.join(data_path, dir_name, 'tricks_data.csv'))
+    }
+
+
+def query_pair_indicators(
+        connection: sqlite3.Connection, ew_agent: str, ns_agent: str, team: str
+) -> Dict[str, Tuple[float, Optional[int]]]:
+    """analysis.analyze.compute_indicators of prepare_datasets(ew_agent, ns_agent)"""
+    aggregates = {name: (0, 0) for name in INDICATORS}
+    rows = connection.execute(
+        PAIR_AGGREGATES_QUERY,
+        {'agent_A': ew_agent, 'agent_B': ns_agent, 'team': team, 'other_team': OTHER_TEAM[team]}
+    ).fetchall()
+    aggregates.update({name: (total, count) for (name, total, count) in rows})
+    return finalize_indicators(aggregates)
+
+
+def query_heatmap_indicators(
+        connection: sqlite3.Connection, agents: List[str], team: str = 'east/west'
+) -> List[Tuple[str, str, Tuple[Tuple[float, Optional[int]], ...], None]]:
+    """results of analysis.analyze.compute_pair_indicators for every pair of agents"""
+    results = []
+    for agent_A in agents:
+        for agent_B in agents:
+            indicators = query_pair_indicators(connection, ew_agent=agent_A, ns_agent=agent_B, team=team)
+            results.append((agent_A, agent_B, tuple(indicators[name] for name in INDICATORS), None))
+    return results
+
+
+def query_contract_success(connection: sqlite3.Connection, agent: str) -> pd.DataFrame:
+    """rate of reached contracts by contract value, for rounds contracted by agent (in either seat)"""
+    return pd.read_sql_query(CONTRACT_SUCCESS_QUERY, connection, params={'agent': agent})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import experiment data into the SQLite metrics store')
+    parser.add_argument('--data-path', default=DATA_PATH)
+    parser.add_argument('--db-path', default=METRICS_DB_PATH)
+    parser.add_argument('--report', nargs=2, metavar=('EW_AGENT', 'NS_AGENT'))
+    args = parser.parse_args()
+
+    for (dir_name, nb_games) in import_data(db_path=args.db_path, data_path=args.data_path).items():
+        print(f'{dir_name}: {nb_games} new games')
+    if args.report is not None:
+        db_connection = connect(args.db_path)
+        print_report(query_pair_indicators(db_connection, *args.report, team='east/west'), detailed=True)
+        print(query_contract_success(db_connection, agent=args.report[0]).to_string(index=False))
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pytest
+
+from analysis import analyze
+from analysis.experiment import run_experiment
+from analysis.metrics_store import (
+    connect, import_data, import_directory, query_contract_success, query_heatmap_indicators, query_pair_indicators
+)
+
+
+def assert_same_indicators(indicators, expected_indicators):
+    for (name, (value, nb_samples)) in indicators.items():
+        expected_value, expected_nb_samples = expected_indicators[name]
+        assert nb_samples == expected_nb_samples, name
+        np.testing.assert_allclose(value, expected_value, err_msg=name)
+
+
+@pytest.fixture
+def data_path(tmp_path, monkeypatch):
+    data_path = tmp_path / 'data'
+    monkeypatch.setattr(analyze, 'DATA_PATH', str(data_path))
+    return str(data_path)
+
+
+def test_import_and_query(data_path, tmp_path):
+    db_path = str(tmp_path / 'metrics.sqlite')
+    run_experiment('RANDOM', 'HIGHEST_CARD', nb_games=1, batch_size=1, data_path=data_path)
+    run_experiment('HIGHEST_CARD', 'RANDOM', nb_games=1, batch_size=1, data_path=data_path)
+    assert import_data(db_path=db_path, data_path=data_path) == {
+        'HIGHEST_CARD-vs-RANDOM': 1, 'RANDOM-vs-HIGHEST_CARD': 1
+    }
+    # a second import finds no new games (watermarks)
+    assert set(import_data(db_path=db_path, data_path=data_path).values()) == {0}
+
+    connection = connect(db_path)
+    facts = analyze.load_dataset_facts(ew_agent='RANDOM', ns_agent='HIGHEST_CARD')
+    for team in analyze.TEAMS:
+        assert_same_indicators(
+            query_pair_indicators(connection, 'RANDOM', 'HIGHEST_CARD', team=team),
+            analyze.compute_indicators(facts, team)
+        )
+    assert connection.execute('SELECT COUNT(*) FROM rounds').fetchone()[0] == len(facts.rounds)
+    results = query_heatmap_indicators(connection, ['RANDOM', 'HIGHEST_CARD'])
+    assert [(agent_A, agent_B) for (agent_A, agent_B, _, _) in results] == [
+        ('RANDOM', 'RANDOM'), ('RANDOM', 'HIGHEST_CARD'), ('HIGHEST_CARD', 'RANDOM'), ('HIGHEST_CARD', 'HIGHEST_CARD')
+    ]
+    assert results[0][2][analyze.INDICATORS.index('pc_games_won')][1] == 0
+    matrices = analyze.compute_heatmap_matrices(['RANDOM', 'HIGHEST_CARD'], min_games=0, metrics_db_path=db_path)
+    expected_matrices = analyze.compute_heatmap_matrices(['RANDOM', 'HIGHEST_CARD'], min_games=0, nb_processes=1)
+    for name in analyze.INDICATORS:
+        np.testing.assert_allclose(matrices[name], expected_matrices[name], err_msg=name)
+
+    contract_success_df = query_contract_success(connection, agent='RANDOM')
+    contracted = facts.rounds[facts.rounds['played'] & (facts.rounds['contract_team'] == 'east/west')]
+    assert contract_success_df['nb_contracts'].sum() == len(contracted)
+    assert contract_success_df['contract'].is_monotonic_increasing
+    assert ((contract_success_df['pc_reached'] >= 0) & (contract_success_df['pc_reached'] <= 1)).all()
+
+
+def test_run_experiment_imports_batches(data_path, tmp_path):
+    db_path = str(tmp_path / 'metrics.sqlite')
+    run_experiment('RANDOM', 'RANDOM', nb_games=2, batch_size=1, data_path=data_path, metrics_db_path=db_path)
+    connection = connect(db_path)
+    assert connection.execute('SELECT SUM(nb_games) FROM experiments').fetchone()[0] == 2
+    dir_path = os.path.join(data_path, 'RANDOM-vs-RANDOM')
+    watermarks = dict(connection.execute('SELECT file_name, offset FROM watermarks').fetchall())
+    assert watermarks['tricks_data.csv'] == os.path.getsize(os.path.join(dir_path, 'tricks_data.csv'))
+    assert import_directory(db_path, dir_path) == 0
+
+    facts = analyze.load_dataset_facts(ew_agent='RANDOM', ns_agent='RANDOM')
+    assert_same_indicators(
+        query_pair_indicators(connection, 'RANDOM', 'RANDOM', team='east/west'),
+        analyze.compute_indicators(facts, 'east/west')
+    )
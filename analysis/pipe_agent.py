@@ -0,0 +1,169 @@
+# PIPE AGENTS
+#
+# Agents running in a long-lived subprocess (any language), asked through its stdin/stdout instead of HTTP.
+# Protocol: newline-delimited JSON, one line per message in both directions.
+#   simulator -> agent: {"requests": [{"route": "bet_or_pass" | "play", "data": <payload>}, ...]}
+#   agent -> simulator: {"responses": [<response>, ...]}  (same order as the requests)
+# Payloads and responses are the ones of the HTTP contract of the README, e.g. {"action": "pass"} or {"card": "7h"}.
+# A message holds a batch of requests: the analysis.experiment dispatch sends them one by one, while
+# PipeAgentBatcher gathers the requests of all the games of an event loop (cf analysis.http_simulation).
+# analysis.pipe_agent_server serves the agents of this package over this protocol.
+import asyncio
+import atexit
+import json
+import subprocess
+from typing import Dict, List, NamedTuple, Tuple, Optional
+
+
+class PipeAgent(NamedTuple):
+    """e.g. PipeAgent('EXPERT', ('python', '-m', 'analysis.pipe_agent_server', 'EXPERT'))"""
+    name: str
+    command: Tuple[str, ...]
+
+
+class PipeAgentError(Exception):
+    pass
+
+
+def encode_message(requests: List[Tuple[str, Dict]]) -> bytes:
+    return json.dumps({'requests': [{'route': route, 'data': data} for (route, data) in requests]}).encode() + b'\n'
+
+
+def decode_message(line: bytes, nb_requests: int) -> List[Dict]:
+    if not line:
+        raise PipeAgentError('Agent process closed its output')
+    responses = json.loads(line)['responses']
+    if len(responses) != nb_requests:
+        raise PipeAgentError(f'{len(responses)} responses received for {nb_requests} requests')
+    return responses
+
+
+class PipeAgentProcess:
+    """blocking client, one message per request"""
+    def __init__(self, agent: PipeAgent):
+        self.process = subprocess.Popen(agent.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def ask(self, requests: List[Tuple[str, Dict]]) -> List[Dict]:
+        self.process.stdin.write(encode_message(requests))
+        self.process.stdin.flush()
+        return decode_message(self.process.stdout.readline(), len(requests))
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+_PROCESSES: Dict[PipeAgent, PipeAgentProcess] = {}
+
+
+def get_pipe_agent_process(agent: PipeAgent) -> PipeAgentProcess:
+    """subprocesses are started at their first request and reused until the end of the interpreter"""
+    if agent not in _PROCESSES:
+        _PROCESSES[agent] = PipeAgentProcess(agent)
+    return _PROCESSES[agent]
+
+
+@atexit.register
+def close_pipe_agent_processes():
+    for process in _PROCESSES.values():
+        process.close()
+    _PROCESSES.clear()
+
+
+def bet_or_pass_request_data(players_bids: Dict[str, Dict], player_cards: List[str], player: str) -> Dict:
+    """payload of the bet_or_pass route of the API (cf app.py)"""
+    return {'player': player, 'playerCards': player_cards, 'playersBids': players_bids, 'encrypted': False}
+
+
+def play_request_data(
+        player_cards: List[str], cards_playability: List[bool], trump_color: str, player: str,
+        contract_team: str, trick_cards: Dict[str, Optional[str]], trick_color: Optional[str], trick_id: int,
+        game_history: Dict[str, List[str]], tricks_first_player: List[str]
+) -> Dict:
+    """payload of the play route of the API (cf app.py)"""
+    return {
+        'player': player, 'trumpColor': trump_color, 'playerCards': player_cards,
+        'cardsPlayability': cards_playability, 'round': trick_id, 'roundCards': trick_cards,
+        'roundColor': trick_color, 'gameHistory': game_history, 'roundsFirstPlayer': tricks_first_player,
+        'contractTeam': contract_team, 'encrypted': False,
+    }
+
+
+def bet_or_pass_pipe_strategy(
+        agent: PipeAgent, players_bids: Dict[str, Dict], player_cards: List[str], player: str
+) -> Tuple[str, Optional[str], Optional[int]]:
+    response = get_pipe_agent_process(agent).ask([('bet_or_pass', bet_or_pass_request_data(
+        players_bids=players_bids, player_cards=player_cards, player=player
+    ))])[0]
+    return response['action'], response.get('color'), response.get('value')
+
+
+def play_pipe_strategy(
+        agent: PipeAgent, player_cards: List[str], cards_playability: List[bool], trump_color: str, player: str,
+        contract_team: str, trick_cards: Dict[str, Optional[str]], trick_color: Optional[str], trick_id: int,
+        game_history: Dict[str, List[str]], tricks_first_player: List[str]
+) -> str:
+    response = get_pipe_agent_process(agent).ask([('play', play_request_data(
+        player_cards=player_cards, cards_playability=cards_playability, trump_color=trump_color, player=player,
+        contract_team=contract_team, trick_cards=trick_cards, trick_color=trick_color, trick_id=trick_id,
+        game_history=game_history, tricks_first_player=tricks_first_player
+    ))])[0]
+    return response['card']
+
+
+class PipeAgentBatcher:
+    """
+    asyncio client with the interface of analysis.http_simulation.AgentConnectionPool:
+    requests posted while a message is being answered are sent together in the next message
+    """
+    def __init__(self, agent: PipeAgent, max_batch_size: int = 1024):
+        self.agent = agent
+        self.max_batch_size = max_batch_size
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.pending: List[Tuple[str, Dict, asyncio.Future]] = []
+        self.flush_task: Optional[asyncio.Task] = None
+        self.nb_requests = 0
+        self.nb_messages = 0
+
+    async def post(self, route: str, payload: Dict) -> Dict:
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((route, payload, future))
+        self.nb_requests += 1
+        if self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self._flush())
+        return await future
+
+    async def _flush(self):
+        try:
+            if self.process is None:
+                self.process = await asyncio.create_subprocess_exec(
+                    *self.agent.command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE
+                )
+            await asyncio.sleep(0)  # games scheduled meanwhile post their requests before the message is sent
+            while self.pending:
+                batch, self.pending = self.pending[:self.max_batch_size], self.pending[self.max_batch_size:]
+                self.process.stdin.write(encode_message([(route, payload) for (route, payload, _) in batch]))
+                await self.process.stdin.drain()
+                self.nb_messages += 1
+                try:
+                    responses = decode_message(await self.process.stdout.readline(), len(batch))
+                except Exception as e:
+                    for (_, _, future) in batch:
+                        future.set_exception(e)
+                    raise
+                for ((_, _, future), response) in zip(batch, responses):
+                    future.set_result(response)
+        except Exception as e:
+            for (_, _, future) in self.pending:
+                future.set_exception(e)
+            self.pending = []
+        finally:
+            self.flush_task = None
+
+    def summary(self) -> str:
+        return f'{self.nb_requests} requests in {self.nb_messages} messages'
+
+    async def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            await self.process.wait()
@@ -0,0 +1,43 @@
+# Serves an agent of this package over the pipe protocol of analysis.pipe_agent:
+#   python -m analysis.pipe_agent_server EXPERT
+# It is also an example for agents written outside of the package: read a line, answer a line.
+import argparse
+import json
+import sys
+from typing import Dict, TextIO
+
+from analysis.experiment import get_agent_bet_or_pass, get_agent_play
+
+
+def answer_request(agent: str, route: str, data: Dict) -> Dict:
+    if route == 'bet_or_pass':
+        action, color, value = get_agent_bet_or_pass(
+            agent=agent, players_bids=data['playersBids'], player_cards=data['playerCards'], player=data['player']
+        )
+        return {'action': action} if action == 'pass' else {'action': action, 'color': color, 'value': value}
+    elif route == 'play':
+        card = get_agent_play(
+            agent=agent, player_cards=data['playerCards'], cards_playability=data['cardsPlayability'],
+            trump_color=data['trumpColor'], player=data['player'], contract_team=data['contractTeam'],
+            trick_cards=data['roundCards'], trick_color=data['roundColor'], trick_id=data['round'],
+            game_history=data['gameHistory'], tricks_first_player=data['roundsFirstPlayer']
+        )
+        return {'card': card}
+    else:
+        raise ValueError(f'Unknown route ({route}). Please choose among bet_or_pass and play')
+
+
+def serve(agent: str, input_stream: TextIO = sys.stdin, output_stream: TextIO = sys.stdout):
+    for line in input_stream:
+        requests = json.loads(line)['requests']
+        responses = [answer_request(agent, request['route'], request['data']) for request in requests]
+        output_stream.write(json.dumps({'responses': responses}) + '\n')
+        output_stream.flush()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve an agent over stdin/stdout')
+    parser.add_argument(
+        'agent', choices=['RANDOM', 'HIGHEST_CARD', 'EXPERT', 'HIGHEST_CARD_W_EXP_BET', 'EXPERT_W_HC_BET']
+    )
+    serve(parser.parse_args().agent)
@@ -0,0 +1,73 @@
+import asyncio
+import io
+import json
+import os
+import sys
+
+import pandas as pd
+
+from analysis.experiment import GAME_LIMIT, get_agent_bet_or_pass, get_agent_play, run_experiment
+from analysis.http_simulation import run_http_experiment_async
+from analysis.pipe_agent import PipeAgent
+from analysis.pipe_agent_server import serve
+from analysis.simulation import play_game
+from helpers.structures import Player
+
+PLAYER_CARDS = ['Jh', '9h', 'Ah', 'Qh', 'Ks', '7d', '8d', '7c']
+PLAYERS_BIDS = {player.value: {'value': None, 'color': None} for player in Player}
+
+
+def pipe_agent(agent: str) -> PipeAgent:
+    return PipeAgent(agent, (sys.executable, '-m', 'analysis.pipe_agent_server', agent))
+
+
+def test_serve_answers_batches():
+    request = {'requests': [
+        {'route': 'bet_or_pass', 'data': {'player': 'west', 'playerCards': PLAYER_CARDS, 'playersBids': PLAYERS_BIDS}},
+        {'route': 'play', 'data': {
+            'player': 'west', 'playerCards': PLAYER_CARDS, 'cardsPlayability': [True] * 8, 'trumpColor': 'h',
+            'contractTeam': 'east/west', 'roundCards': {}, 'roundColor': None, 'round': 0,
+            'gameHistory': {player.value: [] for player in Player}, 'roundsFirstPlayer': ['west'],
+        }},
+    ]}
+    output_stream = io.StringIO()
+    serve('HIGHEST_CARD', io.StringIO(json.dumps(request) + '\n'), output_stream)
+    assert json.loads(output_stream.getvalue()) == {'responses': [
+        {'action': 'bet', 'color': 'h', 'value': 80},
+        {'card': 'Jh'},
+    ]}
+
+
+def test_dispatch_to_pipe_agent():
+    for agent in ['HIGHEST_CARD', 'EXPERT']:
+        assert get_agent_bet_or_pass(pipe_agent(agent), PLAYERS_BIDS, PLAYER_CARDS, 'west') == \
+            get_agent_bet_or_pass(agent, PLAYERS_BIDS, PLAYER_CARDS, 'west')
+    play_args = (PLAYER_CARDS, [True] * 8, 's', 'west', 'east/west', {player.value: None for player in Player}, None, 0,
+                 {player.value: [] for player in Player}, ['west'])
+    assert get_agent_play(pipe_agent('EXPERT'), *play_args) == get_agent_play('EXPERT', *play_args)
+
+
+def test_play_game_with_pipe_agents():
+    agents = {player: pipe_agent('HIGHEST_CARD') if player in [Player.ONE, Player.THREE] else 'RANDOM'
+              for player in Player}
+    score = play_game(agents=agents)
+    assert max(score.values()) >= GAME_LIMIT
+
+
+def test_run_experiment_with_pipe_agent(tmp_path):
+    run_experiment(pipe_agent('HIGHEST_CARD'), 'RANDOM', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    assert os.listdir(tmp_path) == ['HIGHEST_CARD-vs-RANDOM']
+    config_df = pd.read_csv(tmp_path / 'HIGHEST_CARD-vs-RANDOM' / 'config_data.csv', sep=';')
+    assert config_df[['west_agent', 'south_agent', 'east_agent', 'north_agent']].values.tolist() == [
+        ['HIGHEST_CARD', 'RANDOM', 'HIGHEST_CARD', 'RANDOM']
+    ]
+
+
+def test_batched_pipe_agents():
+    games_df, pools = asyncio.run(run_http_experiment_async(
+        east_west_agent=pipe_agent('EXPERT'), north_south_agent=pipe_agent('HIGHEST_CARD'), nb_games=4
+    ))
+    assert len(games_df) == 4
+    assert (games_df[['east/west_score', 'north/south_score']].max(axis=1) >= GAME_LIMIT).all()
+    for pool in pools.values():
+        assert pool.nb_messages < pool.nb_requests  # requests of concurrent games share messages
@@ -0,0 +1,127 @@
+# FIXED-CONTRACT PLAY-ONLY SIMULATION
+#
+# Plays only the 8 tricks of each deal with a fixed contractor, contract and trump, so that the card
+# play of two agents can be compared without the noise of the auction.
+# Each deal is played twice, swapping the contract team and the defense between both agents.
+# Deals (and contracts) either come from a deal pool, or from logged games (deals_data.csv),
+# where the last bet of the auction gives the contract.
+import os
+from datetime import datetime
+from time import time
+from typing import Optional, Iterator, Tuple, Dict, List
+
+import pandas as pd
+
+from analysis.card_codes import decode_hands, decode_deals
+from analysis.deal_pool import load_deal_pool
+from analysis.deals import DEAL_KEYS, get_played_deals
+from analysis.experiment import DATA_PATH
+from analysis.simulation import ALL_PLAYERS, play_round, is_contract_reached
+from helpers.structures import Game, Player, Card, PLAYER_TO_TEAM, Team
+
+PLAY_ONLY_COLUMNS = [
+    'experiment_id', 'deal_id', 'first_player', 'contractor', 'contract', 'color',
+    'contract_team_agent', 'defense_agent', 'contract_team_points', 'defense_points', 'contract_reached',
+]
+Deal = Tuple[Dict[Player, List[Card]], Player, Player, int, str]  # hands, first player, contractor, contract, trump
+
+
+def iter_pool_deals(
+        deal_pool_path: str, contractor: Player, contract: int, color: str, nb_deals: int
+) -> Iterator[Deal]:
+    deal_pool = load_deal_pool(deal_pool_path)
+    for deal_id in range(nb_deals):
+        yield decode_hands(deal_pool[deal_id % len(deal_pool)]), ALL_PLAYERS[deal_id % 4], contractor, contract, color
+
+
+def iter_random_deals(contractor: Player, contract: int, color: str, nb_deals: int) -> Iterator[Deal]:
+    for deal_id in range(nb_deals):
+        yield Game.deal(), ALL_PLAYERS[deal_id % 4], contractor, contract, color
+
+
+def iter_logged_deals(dir_path: str, nb_deals: Optional[int] = None) -> Iterator[Deal]:
+    """played deals of a data folder (deals_data.csv), along with the contract of their auction"""
+    auctions_df = pd.read_csv(os.path.join(dir_path, 'auctions_data.csv'), sep=';', header='infer')
+    deals_df = pd.read_csv(os.path.join(dir_path, 'deals_data.csv'), sep=';', header='infer')
+    contracts_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(DEAL_KEYS, keep='last')
+    played_deals_df = get_played_deals(deals_df).merge(
+        contracts_df[DEAL_KEYS + ['player', 'value', 'color']], how='inner', on=DEAL_KEYS
+    ).iloc[:nb_deals]
+    all_codes = decode_deals(played_deals_df['deal'])
+    for (codes, first_player, contractor, contract, color) in zip(
+            all_codes, played_deals_df['first_player'], played_deals_df['player'], played_deals_df['value'],
+            played_deals_df['color']
+    ):
+        yield decode_hands(codes), Player(first_player), Player(contractor), int(contract), color
+
+
+def play_deal(
+        hands: Dict[Player, List[Card]], first_player: Player, contractor: Player, contract: int, color: str,
+        contract_team_agent: str, defense_agent: str
+) -> Tuple[int, int, bool]:
+    contract_team = PLAYER_TO_TEAM[contractor]
+    agents = {
+        player: contract_team_agent if PLAYER_TO_TEAM[player] == contract_team else defense_agent for player in Player
+    }
+    round_, _ = play_round(
+        hands=hands, first_player=first_player, trump_color=color, contract_team=contract_team, agents=agents
+    )
+    defense_team = Team.ONE if contract_team == Team.TWO else Team.TWO
+    return round_.score[contract_team], round_.score[defense_team], is_contract_reached(round_, contract_team, contract)
+
+
+def run_play_experiment(
+        agent_A: str, agent_B: str, deals: Iterator[Deal], data_path: str = DATA_PATH
+) -> pd.DataFrame:
+    experiment_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    rows = []
+    for (deal_id, (hands, first_player, contractor, contract, color)) in enumerate(deals):
+        for (contract_team_agent, defense_agent) in [(agent_A, agent_B), (agent_B, agent_A)]:
+            contract_team_points, defense_points, contract_reached = play_deal(
+                hands=hands, first_player=first_player, contractor=contractor, contract=contract, color=color,
+                contract_team_agent=contract_team_agent, defense_agent=defense_agent
+            )
+            rows.append({
+                'experiment_id': experiment_id,
+                'deal_id': deal_id,
+                'first_player': first_player.value,
+                'contractor': contractor.value,
+                'contract': contract,
+                'color': color,
+                'contract_team_agent': contract_team_agent,
+                'defense_agent': defense_agent,
+                'contract_team_points': contract_team_points,
+                'defense_points': defense_points,
+                'contract_reached': contract_reached,
+            })
+    play_only_df = pd.DataFrame(rows, columns=PLAY_ONLY_COLUMNS)
+
+    output_dir = os.path.join(data_path, f'{agent_A}-vs-{agent_B}')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, 'play_only_data.csv')
+    play_only_df.to_csv(output_path, sep=';', mode='a', header=not os.path.exists(output_path), index=False)
+
+    return play_only_df
+
+
+def summarize_play_experiment(play_only_df: pd.DataFrame) -> pd.DataFrame:
+    """average points and % of contracts made by each agent, as contract team and as defense"""
+    as_contract_team = play_only_df.groupby('contract_team_agent').agg(
+        contract_team_points=('contract_team_points', 'mean'),
+        pc_contracts_made=('contract_reached', 'mean'),
+    )
+    as_defense = play_only_df.groupby('defense_agent').agg(
+        defense_points=('defense_points', 'mean'),
+        pc_contracts_defeated=('contract_reached', lambda reached: 1 - reached.mean()),
+    )
+    return as_contract_team.join(as_defense)
+
+
+if __name__ == "__main__":
+    start_time = time()
+    df = run_play_experiment(
+        agent_A='EXPERT', agent_B='HIGHEST_CARD',
+        deals=iter_random_deals(contractor=Player.ONE, contract=90, color='h', nb_deals=1000)
+    )
+    print(summarize_play_experiment(df))
+    print(f'elapsed time: {time()-start_time} sec')
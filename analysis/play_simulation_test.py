@@ -0,0 +1,66 @@
+import os
+
+import pandas as pd
+
+from analysis.deals import ROUND_KEYS
+from analysis.experiment import run_experiment
+from analysis.play_simulation import (
+    PLAY_ONLY_COLUMNS, iter_logged_deals, run_play_experiment, summarize_play_experiment
+)
+from analysis.simulation import BELOTE_POINTS
+from helpers.structures import Player
+
+
+def test_iter_logged_deals(tmp_path):
+    run_experiment('EXPERT', 'HIGHEST_CARD', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    dir_path = os.path.join(tmp_path, 'EXPERT-vs-HIGHEST_CARD')
+    tricks_df = pd.read_csv(os.path.join(dir_path, 'tricks_data.csv'), sep=';')
+    auctions_df = pd.read_csv(os.path.join(dir_path, 'auctions_data.csv'), sep=';')
+    rounds = list(tricks_df.groupby(ROUND_KEYS, sort=False))
+    last_bets_df = auctions_df[auctions_df['action'] == 'bet'].drop_duplicates(ROUND_KEYS, keep='last')
+
+    deals = list(iter_logged_deals(dir_path))
+    assert len(deals) == len(rounds) > 0
+    for ((round_key, round_df), (hands, first_player, contractor, contract, color)) in zip(rounds, deals):
+        for (player, card) in round_df[['player', 'card']].values:
+            assert card in [hand_card.describe_plain() for hand_card in hands[Player(player)]]
+        assert first_player.value == round_df['player'].iloc[0]  # opener of the first trick
+        last_bet = last_bets_df.set_index(ROUND_KEYS).loc[round_key]
+        assert (contractor.value, contract, color) == (last_bet['player'], last_bet['value'], last_bet['color'])
+        assert round_df['contract'].dropna().tolist() == [contract]
+
+    assert len(list(iter_logged_deals(dir_path, nb_deals=3))) == 3
+
+
+def test_run_play_experiment(tmp_path):
+    run_experiment('EXPERT', 'HIGHEST_CARD', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    dir_path = os.path.join(tmp_path, 'EXPERT-vs-HIGHEST_CARD')
+    play_path = str(tmp_path / 'play')
+    df = run_play_experiment('EXPERT', 'HIGHEST_CARD', deals=iter_logged_deals(dir_path, nb_deals=4),
+                             data_path=play_path)
+    assert list(df.columns) == PLAY_ONLY_COLUMNS
+    assert df['deal_id'].tolist() == [0, 0, 1, 1, 2, 2, 3, 3]
+    # every deal is played by both agents as contract team
+    assert df['contract_team_agent'].tolist() == ['EXPERT', 'HIGHEST_CARD'] * 4
+    assert (df['defense_agent'] != df['contract_team_agent']).all()
+    assert ((df['contract_team_points'] + df['defense_points']) == 162).all()
+    # belote points of the contract team may make up for missing card points
+    assert (df['contract_reached'] | (df['contract_team_points'] < df['contract'])).all()
+    assert (~df['contract_reached'] | (df['contract_team_points'] + BELOTE_POINTS >= df['contract'])).all()
+
+    # agents are deterministic: the same deals give the same points
+    same_df = run_play_experiment('EXPERT', 'HIGHEST_CARD', deals=iter_logged_deals(dir_path, nb_deals=4),
+                                  data_path=play_path)
+    pd.testing.assert_frame_equal(same_df.drop(columns='experiment_id'), df.drop(columns='experiment_id'))
+    output_path = os.path.join(play_path, 'EXPERT-vs-HIGHEST_CARD', 'play_only_data.csv')
+    assert len(pd.read_csv(output_path, sep=';')) == 16
+
+    summary_df = summarize_play_experiment(df)
+    assert sorted(summary_df.index) == ['EXPERT', 'HIGHEST_CARD']
+    for agent in ['EXPERT', 'HIGHEST_CARD']:
+        contract_team_df = df[df['contract_team_agent'] == agent]
+        defense_df = df[df['defense_agent'] == agent]
+        assert summary_df.loc[agent, 'contract_team_points'] == contract_team_df['contract_team_points'].mean()
+        assert summary_df.loc[agent, 'pc_contracts_made'] == contract_team_df['contract_reached'].mean()
+        assert summary_df.loc[agent, 'defense_points'] == defense_df['defense_points'].mean()
+        assert summary_df.loc[agent, 'pc_contracts_defeated'] == 1 - defense_df['contract_reached'].mean()
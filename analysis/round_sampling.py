@@ -0,0 +1,158 @@
+# ROUND SAMPLING
+#
+# A game lasts until a team reaches GAME_LIMIT, i.e. about 15 rounds, while rounds are nearly independent.
+# Instead of simulating whole games, independent rounds are simulated and the game outcome is derived from
+# the empirical distribution of round scores with a Markov chain over game scores:
+#   P(win | ew, ns) = sum_k p_k * P(win | ew + ew_k, ns + ns_k)
+# Every round brings at least 160 points, so scores strictly increase and the chain is solved exactly
+# by going through the score grid from the end of the game backwards (one anti-diagonal at a time).
+# Heatmaps may estimate their % of games won this way (cf analysis.analyze.compute_heatmap_matrices), from the rounds
+# of full games and of sampling experiments.
+import os
+from datetime import datetime
+from time import time
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from analysis.card_codes import decode_hands
+from analysis.deal_pool import load_deal_pool
+from analysis.experiment import DATA_PATH, GAME_LIMIT
+from analysis.simulation import run_auction, play_round, is_contract_reached, compute_round_score
+from helpers.structures import Game, Player, Team, PLAYER_TO_TEAM, NEXT_PLAYER
+
+ROUNDS_COLUMNS = [
+    'experiment_id', 'round_id', 'nb_deals', 'first_player', 'contractor', 'contract', 'color', 'contract_reached',
+    'east/west_points', 'north/south_points', 'east/west_round_score', 'north/south_round_score',
+]
+ROUND_SCORE_COLUMNS = ['east/west_round_score', 'north/south_round_score']
+SCORE_UNIT = 10  # every score increment is a multiple of 10
+
+
+def run_round_sampling(
+        east_west_agents: str, north_south_agents: str, nb_rounds: int,
+        deal_pool_path: Optional[str] = None, data_path: str = DATA_PATH
+) -> pd.DataFrame:
+    experiment_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    agents = {
+        Player.ONE: east_west_agents, Player.TWO: north_south_agents,
+        Player.THREE: east_west_agents, Player.FOUR: north_south_agents,
+    }
+    deal_pool = load_deal_pool(deal_pool_path) if deal_pool_path is not None else None
+
+    rows = []
+    deal_id = 0
+    first_player = Player.ONE
+    for round_id in range(nb_rounds):
+        nb_deals = 0
+        contractor = None
+        while contractor is None:  # cards are dealt again (by the next player) as long as everybody passes
+            hands = decode_hands(deal_pool[deal_id % len(deal_pool)]) if deal_pool is not None else Game.deal()
+            deal_id += 1
+            nb_deals += 1
+            auction, _ = run_auction(hands=hands, first_player=first_player, agents=agents)
+            contractor = auction.current_best
+            if contractor is None:
+                first_player = NEXT_PLAYER[first_player]
+        contract_team = PLAYER_TO_TEAM[contractor]
+        contract = auction.bids[contractor].value
+        color = auction.get_best_color()
+        round_, _ = play_round(
+            hands=hands, first_player=first_player, trump_color=color, contract_team=contract_team, agents=agents
+        )
+        round_score = compute_round_score(round_, contract_team, contract)
+        rows.append({
+            'experiment_id': experiment_id,
+            'round_id': round_id,
+            'nb_deals': nb_deals,
+            'first_player': first_player.value,
+            'contractor': contractor.value,
+            'contract': contract,
+            'color': color,
+            'contract_reached': is_contract_reached(round_, contract_team, contract),
+            'east/west_points': round_.score[Team.ONE],
+            'north/south_points': round_.score[Team.TWO],
+            'east/west_round_score': round_score[Team.ONE],
+            'north/south_round_score': round_score[Team.TWO],
+        })
+        first_player = NEXT_PLAYER[first_player]
+    rounds_df = pd.DataFrame(rows, columns=ROUNDS_COLUMNS)
+
+    output_dir = os.path.join(data_path, f'{east_west_agents}-vs-{north_south_agents}')
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, 'rounds_data.csv')
+    rounds_df.to_csv(output_path, sep=';', mode='a', header=not os.path.exists(output_path), index=False)
+
+    return rounds_df
+
+
+def extract_round_scores(tricks_df: pd.DataFrame) -> np.ndarray:
+    """round scores (east/west, north/south) of the rounds of full games already played"""
+    round_end_df = tricks_df[tricks_df['is_last_in_round'].astype(bool)]
+    return round_end_df[ROUND_SCORE_COLUMNS].to_numpy(dtype=int)
+
+
+def load_round_scores(ew_agent: str, ns_agent: str, data_path: str = DATA_PATH) -> np.ndarray:
+    """
+    round scores (east/west, north/south) of ew_agent vs ns_agent: rounds of full games (cf extract_round_scores)
+    and sampled rounds (cf run_round_sampling), teams being swapped in the mirror directory (cf prepare_datasets)
+    """
+    round_scores = [np.empty((0, 2), dtype=int)]
+    for (dir_name, mirrored) in [(f'{ew_agent}-vs-{ns_agent}', False), (f'{ns_agent}-vs-{ew_agent}', True)]:
+        tricks_path = os.path.join(data_path, dir_name, 'tricks_data.csv')
+        rounds_path = os.path.join(data_path, dir_name, 'rounds_data.csv')
+        dir_scores = []
+        if os.path.exists(tricks_path):
+            tricks_df = pd.read_csv(tricks_path, sep=';', usecols=['is_last_in_round'] + ROUND_SCORE_COLUMNS)
+            dir_scores.append(extract_round_scores(tricks_df))
+        if os.path.exists(rounds_path):
+            dir_scores.append(pd.read_csv(rounds_path, sep=';', usecols=ROUND_SCORE_COLUMNS).to_numpy(dtype=int))
+        round_scores.extend(scores[:, ::-1] if mirrored else scores for scores in dir_scores)
+    return np.concatenate(round_scores)
+
+
+def solve_game_chain(round_scores: np.ndarray, game_limit: int = GAME_LIMIT) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    round_scores: (nb_rounds, 2) array of (east/west, north/south) round scores
+    return, for every game score (in SCORE_UNIT) before the end of the game, east/west win probability
+    and expected number of remaining rounds
+    """
+    if (round_scores % SCORE_UNIT).any():
+        raise ValueError(f'round scores are expected to be multiples of {SCORE_UNIT}')
+    deltas, counts = np.unique(round_scores // SCORE_UNIT, axis=0, return_counts=True)
+    moving = deltas.sum(axis=1) > 0  # a round without points would only loop on the same state
+    deltas, probabilities = deltas[moving], counts[moving] / counts[moving].sum()
+    ew_deltas, ns_deltas = deltas[:, 0], deltas[:, 1]
+    limit = -(-game_limit // SCORE_UNIT)
+    size = limit + deltas.max() + 1
+
+    ew_scores, ns_scores = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+    win_probabilities = (ew_scores > ns_scores).astype(float)  # final value of every ended game
+    remaining_rounds = np.zeros((size, size))
+    for diagonal in range(2 * limit - 2, -1, -1):
+        ew = np.arange(max(0, diagonal - limit + 1), min(diagonal, limit - 1) + 1)
+        ns = diagonal - ew
+        next_ew = ew[:, None] + ew_deltas[None, :]
+        next_ns = ns[:, None] + ns_deltas[None, :]
+        win_probabilities[ew, ns] = win_probabilities[next_ew, next_ns] @ probabilities
+        remaining_rounds[ew, ns] = 1 + remaining_rounds[next_ew, next_ns] @ probabilities
+
+    return win_probabilities[:limit, :limit], remaining_rounds[:limit, :limit]
+
+
+def estimate_pc_games_won(round_scores: np.ndarray, team: str, game_limit: int = GAME_LIMIT) -> Tuple[float, float]:
+    """probability for team to win a game from scratch, and expected number of rounds of a game"""
+    win_probabilities, remaining_rounds = solve_game_chain(round_scores, game_limit)
+    pc_games_won = win_probabilities[0, 0] if team == Team.ONE.value else 1 - win_probabilities[0, 0]
+    return pc_games_won, remaining_rounds[0, 0]
+
+
+if __name__ == "__main__":
+    start_time = time()
+    df = run_round_sampling(east_west_agents='EXPERT', north_south_agents='HIGHEST_CARD', nb_rounds=2000)
+    pc_games_won, nb_rounds_per_game = estimate_pc_games_won(
+        df[['east/west_round_score', 'north/south_round_score']].to_numpy(), team='east/west'
+    )
+    print(f'Games won: {100 * pc_games_won:.2f}% (~{nb_rounds_per_game:.1f} rounds per game)')
+    print(f'elapsed time: {time()-start_time} sec')
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import analyze
+from analysis.experiment import run_experiment
+from analysis.round_sampling import (
+    estimate_pc_games_won, extract_round_scores, load_round_scores, run_round_sampling, solve_game_chain
+)
+
+
+def test_dominant_team_always_wins():
+    round_scores = np.array([[250, 0], [200, 60]])
+    pc_games_won, nb_rounds = estimate_pc_games_won(round_scores, team='east/west', game_limit=1000)
+    assert pc_games_won == 1.
+    assert nb_rounds == pytest.approx(np.mean([4, 5]), abs=0.5)
+
+
+def test_deterministic_game_length():
+    win_probabilities, remaining_rounds = solve_game_chain(np.array([[100, 100]]), game_limit=1000)
+    assert win_probabilities[0, 0] == 0.  # ties go to north/south
+    assert remaining_rounds[0, 0] == 10.
+
+
+def test_symmetric_round_scores():
+    round_scores = np.array([[250, 0], [0, 250], [200, 60], [60, 200]])
+    pc_ew, _ = estimate_pc_games_won(round_scores, team='east/west')
+    pc_ns, _ = estimate_pc_games_won(round_scores, team='north/south')
+    assert pc_ew + pc_ns == pytest.approx(1.)
+    assert pc_ew == pytest.approx(0.5, abs=0.05)
+
+
+def test_match_monte_carlo_simulation():
+    rng = np.random.default_rng(13)
+    round_scores = np.array([[250, 0], [0, 260], [200, 60], [60, 200], [0, 280]])
+    nb_games, nb_rounds = 20000, 40
+    sampled = round_scores[rng.integers(len(round_scores), size=(nb_games, nb_rounds))]
+    scores = sampled.cumsum(axis=1)
+    end_round = (scores.max(axis=2) >= 3000).argmax(axis=1)
+    final_scores = scores[np.arange(nb_games), end_round]
+    pc_games_won, nb_rounds_per_game = estimate_pc_games_won(round_scores, team='east/west')
+    assert pc_games_won == pytest.approx((final_scores[:, 0] > final_scores[:, 1]).mean(), abs=0.02)
+    assert nb_rounds_per_game == pytest.approx((end_round + 1).mean(), abs=0.2)
+
+
+def test_heatmap_games_won_from_round_scores(tmp_path, monkeypatch):
+    monkeypatch.setattr(analyze, 'DATA_PATH', str(tmp_path))
+    run_experiment('RANDOM', 'HIGHEST_CARD', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    rounds_df = run_round_sampling('HIGHEST_CARD', 'RANDOM', nb_rounds=20, data_path=str(tmp_path))
+    tricks_df = pd.read_csv(tmp_path / 'RANDOM-vs-HIGHEST_CARD' / 'tricks_data.csv', sep=';')
+
+    # sampled rounds of the mirror directory count for RANDOM as east/west, teams being swapped
+    round_scores = load_round_scores('RANDOM', 'HIGHEST_CARD', data_path=str(tmp_path))
+    np.testing.assert_array_equal(round_scores, np.concatenate([
+        extract_round_scores(tricks_df), rounds_df[['north/south_round_score', 'east/west_round_score']].to_numpy()
+    ]))
+    agents = ['RANDOM', 'HIGHEST_CARD']
+    matrices = analyze.compute_heatmap_matrices(agents, min_games=0, nb_processes=1, round_sampling=True)
+    pc_games_won, _ = estimate_pc_games_won(round_scores, team='east/west')
+    assert matrices['pc_games_won'][0, 1] == 100 * pc_games_won
+    # other indicators are those of the games actually played
+    played_matrices = analyze.compute_heatmap_matrices(agents, min_games=0, nb_processes=1)
+    np.testing.assert_array_equal(matrices['pc_tricks_won'], played_matrices['pc_tricks_won'])
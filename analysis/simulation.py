@@ -0,0 +1,153 @@
+# Lean simulation engine: auction and round loops on top of helpers.structures, without
+# the bookkeeping of analysis.experiment (no DataFrame rows, no game.describe() at every step)
+from typing import Dict, List, Optional, Tuple, Callable
+
+from analysis.experiment import GAME_LIMIT, get_agent_bet_or_pass, get_agent_play
+from helpers.structures import (
+    Auction, Round, Card, Game, Player, Team, PLAYER_TO_TEAM, NEXT_PLAYER, AUCTION_END_OK_CODE, AUCTION_END_KO_CODE,
+)
+
+ALL_PLAYERS = list(Player)
+NB_TRICKS = 8
+BELOTE_POINTS = 20
+FAILED_CONTRACT_POINTS = 160
+
+
+def describe_bids(auction: Auction) -> Dict[str, Dict]:
+    return {
+        player.value: {'value': bid.value, 'color': bid.color} if bid is not None else {'value': None, 'color': None}
+        for player, bid in auction.bids.items()
+    }
+
+
+def run_auction(
+        hands: Dict[Player, List[Card]], first_player: Player, agents: Dict[Player, str]
+) -> Tuple[Auction, List[Tuple[Player, str, Optional[str], Optional[int]]]]:
+    """auction.current_best is None when every player passed"""
+    auction = Auction()
+    bids_history = []
+    player = first_player
+    while True:
+        player_cards = [card.describe_plain() for card in hands[player]]
+        action, color, value = get_agent_bet_or_pass(
+            agent=agents[player], players_bids=describe_bids(auction), player_cards=player_cards, player=player.value
+        )
+        bids_history.append((player, action, color, value))
+        action_code = auction.update(player=player, passed=(action == 'pass'), color=color, value=value)
+        if action_code in [AUCTION_END_OK_CODE, AUCTION_END_KO_CODE]:
+            return auction, bids_history
+        player = NEXT_PLAYER[player]
+
+
+def play_round(
+        hands: Dict[Player, List[Card]], first_player: Player, trump_color: str, contract_team: Team,
+        agents: Dict[Player, str]
+) -> Tuple[Round, List[Tuple[Player, Card]]]:
+    """play the 8 tricks and return the ended round along with the sequence of played cards"""
+    round_ = Round(hands={player: list(cards) for (player, cards) in hands.items()}, trick_opener=first_player)
+    round_.set_trump(trump_color)
+    game_history = {player.value: [] for player in Player}
+    return continue_round(
+        round_=round_, contract_team=contract_team, agents=agents, game_history=game_history,
+        tricks_first_player=[], plays=[]
+    )
+
+
+def continue_round(
+        round_: Round, contract_team: Team, agents: Dict[Player, str], game_history: Dict[str, List[str]],
+        tricks_first_player: List[str], plays: List[Tuple[Player, Card]]
+) -> Tuple[Round, List[Tuple[Player, Card]]]:
+    """
+    play a round to its end from its current state, possibly in the middle of a trick
+    game_history, tricks_first_player and plays describe the cards already played and are updated in place
+    """
+    while any(len(hand) > 0 for hand in round_.hands.values()):
+        trick_id = round_.trick
+        trick_opener = round_.trick_opener
+        if len(tricks_first_player) == trick_id:
+            tricks_first_player.append(trick_opener.value)
+        trick_cards = {
+            player: card for (player, card) in round_.trick_cards.cards.items() if card is not None
+        }
+        player = trick_opener
+        while player in trick_cards:
+            player = NEXT_PLAYER[player]
+        for _ in range(4 - len(trick_cards)):
+            player_cards = [card.describe_plain() for card in round_.hands[player].cards]
+            trick_plain_cards = {
+                p.value: c.describe_plain() if c is not None else None for p, c in round_.trick_cards.cards.items()
+            }
+            agent_card = get_agent_play(
+                agent=agents[player], player_cards=player_cards,
+                cards_playability=round_.get_cards_playability(player), trump_color=round_.trump,
+                player=player.value, contract_team=contract_team.value, trick_cards=trick_plain_cards,
+                trick_color=trick_cards[trick_opener].color if trick_cards else None, trick_id=trick_id,
+                game_history=game_history, tricks_first_player=tricks_first_player
+            )
+            card_index = player_cards.index(agent_card)
+            trick_cards[player] = round_.hands[player].cards[card_index]
+            plays.append((player, trick_cards[player]))
+            round_.update(player=player, card_index=card_index)
+            player = NEXT_PLAYER[player]
+        # game history is only updated once the trick is over (cf analysis.experiment.update_game_history)
+        for (player, card) in trick_cards.items():
+            game_history[player.value].append(card.describe_plain())
+    return round_, plays
+
+
+def derive_belote_team(round_: Round) -> Optional[Team]:
+    if (len(round_.belote) == 2) and (round_.belote[0] == round_.belote[1]):
+        return PLAYER_TO_TEAM[round_.belote[0]]
+
+
+def is_contract_reached(round_: Round, contract_team: Team, contract: int) -> bool:
+    belote_points = BELOTE_POINTS if derive_belote_team(round_) == contract_team else 0
+    return round_.score[contract_team] + belote_points >= contract
+
+
+def compute_round_score(round_: Round, contract_team: Team, contract: int) -> Dict[Team, int]:
+    """game score won by each team at the end of the round (same rules as Game.update_score)"""
+    opponent_team = Team.ONE if contract_team == Team.TWO else Team.TWO
+    round_score = {team: 0 for team in Team}
+    belote_team = derive_belote_team(round_)
+    if belote_team is not None:
+        round_score[belote_team] += BELOTE_POINTS
+    if is_contract_reached(round_, contract_team, contract):
+        round_score[contract_team] += round(round_.score[contract_team] / 10) * 10 + contract
+        round_score[opponent_team] += round(round_.score[opponent_team] / 10) * 10
+    else:
+        round_score[opponent_team] += FAILED_CONTRACT_POINTS + contract
+    return round_score
+
+
+def derive_game_winners(score: Dict[Team, int]) -> Team:
+    """ties go to north/south, as in run_experiment"""
+    return Team.ONE if score[Team.ONE] > score[Team.TWO] else Team.TWO
+
+
+def play_game(
+        agents: Dict[Player, str], first_player: Player = Player.ONE,
+        deal: Callable[[], Dict[Player, List[Card]]] = Game.deal, deals_history: Optional[List[Tuple]] = None
+) -> Dict[Team, int]:
+    """
+    play rounds until a team reaches GAME_LIMIT and return the final score
+    deals_history, when given, receives (first_player, hands, bids_history, plays) for every deal
+    """
+    score = {team: 0 for team in Team}
+    while max(score.values()) < GAME_LIMIT:
+        hands = deal()
+        auction, bids_history = run_auction(hands=hands, first_player=first_player, agents=agents)
+        plays = []
+        if auction.current_best is not None:
+            contract_team = PLAYER_TO_TEAM[auction.current_best]
+            contract = auction.bids[auction.current_best].value
+            round_, plays = play_round(
+                hands=hands, first_player=first_player, trump_color=auction.get_best_color(),
+                contract_team=contract_team, agents=agents
+            )
+            for (team, round_score) in compute_round_score(round_, contract_team, contract).items():
+                score[team] += round_score
+        if deals_history is not None:
+            deals_history.append((first_player, hands, bids_history, plays))
+        first_player = NEXT_PLAYER[first_player]
+    return score
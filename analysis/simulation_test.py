@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from analysis.experiment import GAME_LIMIT
+from analysis.simulation import (
+    compute_round_score, derive_belote_team, derive_game_winners, is_contract_reached, play_game, play_round,
+    run_auction
+)
+from helpers.structures import Game, Player, Team, PLAYER_TO_TEAM
+
+# RANDOM bids often too high: contracts are both reached and failed
+AGENTS = {player: 'RANDOM' if PLAYER_TO_TEAM[player] == Team.ONE else 'HIGHEST_CARD' for player in Player}
+
+
+def play_seeded_round(seed: int):
+    """(hands, auction, bids history, round, plays) of a seeded deal, round and plays being None when all passed"""
+    random.seed(seed)
+    hands = Game.deal()
+    auction, bids_history = run_auction(hands=hands, first_player=Player.ONE, agents=AGENTS)
+    if auction.current_best is None:
+        return hands, auction, bids_history, None, None
+    round_, plays = play_round(
+        hands=hands, first_player=Player.ONE, trump_color=auction.get_best_color(),
+        contract_team=PLAYER_TO_TEAM[auction.current_best], agents=AGENTS
+    )
+    return hands, auction, bids_history, round_, plays
+
+
+def test_run_auction():
+    nb_passed_auctions = 0
+    for seed in range(30):
+        _, auction, bids_history, _, _ = play_seeded_round(seed)
+        assert [player for (player, _, _, _) in bids_history[:4]] == list(Player)  # from first_player, in turn
+        assert [action for (_, action, _, _) in bids_history[-3:]] == ['pass'] * 3
+        bets = [(player, color, value) for (player, action, color, value) in bids_history if action == 'bet']
+        if auction.current_best is None:
+            nb_passed_auctions += 1
+            assert bets == [] and len(bids_history) == 4
+        else:
+            player, color, value = bets[-1]
+            assert (auction.current_best, auction.get_best_color(), auction.bids[player].value) == \
+                (player, color, value)
+            assert [value for (_, _, value) in bets] == sorted({value for (_, _, value) in bets})  # raising bids
+    assert 0 < nb_passed_auctions < 30
+
+
+def test_play_round():
+    for seed in range(10):
+        hands, auction, _, round_, plays = play_seeded_round(seed)
+        if round_ is None:
+            continue
+        assert len(plays) == 32
+        assert all(len(hand) == 0 for hand in round_.hands.values())
+        for player in Player:
+            played_cards = [card.describe_plain() for (player_, card) in plays if player_ == player]
+            assert sorted(played_cards) == sorted(card.describe_plain() for card in hands[player])
+        assert sum(round_.score.values()) == 162  # card points and 10 for the last trick
+        assert derive_belote_team(round_) in [None, *Team]
+
+
+def test_compute_round_score_matches_game_update_score():
+    outcomes = set()
+    for seed in range(30):
+        _, auction, _, round_, _ = play_seeded_round(seed)
+        if round_ is None:
+            continue
+        contract_team = PLAYER_TO_TEAM[auction.current_best]
+        contract = auction.bids[auction.current_best].value
+        game = Game(first_player=Player.ONE)
+        game.auction, game.round = auction, round_
+        game.update_score()
+        assert compute_round_score(round_, contract_team, contract) == game.score
+        outcomes.add(is_contract_reached(round_, contract_team, contract))
+    assert outcomes == {True, False}
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_play_game(seed):
+    random.seed(seed)
+    deals_history = []
+    score = play_game(agents=AGENTS, deals_history=deals_history)
+    assert max(score.values()) >= GAME_LIMIT
+    # first player moves one seat at every deal, passed deals included
+    assert [first_player for (first_player, _, _, _) in deals_history[:4]] == list(Player)
+    played_deals = [(bids_history, plays) for (_, _, bids_history, plays) in deals_history if plays]
+    assert played_deals and all(len(plays) == 32 for (_, plays) in played_deals)
+
+
+def test_derive_game_winners():
+    assert derive_game_winners({Team.ONE: 3010, Team.TWO: 2500}) == Team.ONE
+    assert derive_game_winners({Team.ONE: 2500, Team.TWO: 3010}) == Team.TWO
+    # ties go to north/south whatever the seats of the agents
+    assert derive_game_winners({Team.ONE: 3010, Team.TWO: 3010}) == Team.TWO
@@ -0,0 +1,211 @@
+# PARAMETER SWEEP
+#
+# Tunes the constants of an agent (RANDOM_BET_PROBABILITY, HIGHEST_CARD_MIN_POINTS, IMPORTANT_ROUND_LIMIT,
+# bonus values of the expert combinations...) by playing every configuration against a fixed opponent.
+# Configurations are AgentVariant (cf analysis.experiment): constants are passed as keyword arguments
+# to the strategies, so module globals are never patched and configurations can run side by side in a Pool.
+# Game g of every configuration uses the same deals (deal pool or seeded shuffle, from a generator of its own so that
+# the random choices of the agents do not shift the deals) and the same seed for the random choices of the agents
+# (common random numbers), so that configurations are compared on the same games.
+# Parameters are named '<phase>.<keyword argument>', phase being either 'bet_or_pass' or 'play'.
+import os
+import random
+from copy import deepcopy
+from datetime import datetime
+from itertools import product
+from multiprocessing import Pool
+from time import time
+from typing import Dict, List, Optional, Tuple, Any, Union, Sequence
+
+import numpy as np
+import pandas as pd
+
+from analysis.analyze import compute_confidence_intervals
+from analysis.deal_pool import DEALS_PER_GAME, load_deal_pool, pool_dealer, seeded_dealer
+from analysis.experiment import DATA_PATH, AgentVariant
+from analysis.simulation import derive_game_winners, play_game
+from expert.bet_or_pass.combinations import MAIN_COMBINATIONS, SUPPORT_COMBINATIONS
+from helpers.structures import Player, Team
+from highest_card_agent import derive_value_coefs
+
+PHASES = ['bet_or_pass', 'play']
+SWEEP_COLUMNS = [
+    'experiment_id', 'configuration', 'base', 'opponent', 'nb_games', 'nb_won_games', 'pc_games_won',
+    'inf_threshold', 'sup_threshold',
+]
+GAMES_PER_TASK = 10
+# Grid: every value of a parameter is either listed, or labelled ({label: value}) when its repr is not readable
+ParameterValues = Union[Sequence[Any], Dict[str, Any]]
+
+
+def scale_bonus_values(combinations: List[Dict], factor: float) -> List[Dict]:
+    """copy of (main or support) combinations with every bonus value (and max) scaled, rounded to a bid step (10)"""
+    def scale(value):
+        return 10 * round(value * factor / 10)
+
+    def scale_bonus(bonus):
+        bonus = dict(bonus)
+        if isinstance(bonus['value'], dict):
+            bonus['value'] = {nb_detections: scale(value) for (nb_detections, value) in bonus['value'].items()}
+        else:
+            bonus['value'] = scale(bonus['value'])
+        if bonus.get('max') is not None:
+            bonus['max'] = scale(bonus['max'])
+        return bonus
+
+    scaled_combinations = deepcopy(combinations)
+    for combination in scaled_combinations:
+        if 'bonus' in combination:  # main combinations
+            combination['bonus'] = [scale_bonus(bonus) for bonus in combination['bonus']]
+        else:  # support combinations
+            combination.update(scale_bonus(combination))
+    return scaled_combinations
+
+
+def create_variant(base: str, params: Dict[str, Any], labels: Optional[Dict[str, str]] = None) -> AgentVariant:
+    labels = labels or {}
+    phase_params = {phase: {} for phase in PHASES}
+    for (param, value) in params.items():
+        phase, keyword = param.split('.', 1)
+        if phase not in PHASES:
+            raise ValueError(f'Unknown phase ({phase}) for parameter {param}. Please choose among {PHASES}')
+        phase_params[phase][keyword] = value
+    if 'min_points' in phase_params['bet_or_pass']:  # contract values of HIGHEST_CARD bets, derived once per variant
+        phase_params['bet_or_pass']['value_coefs'] = derive_value_coefs(phase_params['bet_or_pass']['min_points'])
+    description = ', '.join(f'{param}={labels.get(param, repr(value))}' for (param, value) in params.items())
+    return AgentVariant(
+        name=f'{base}[{description}]', base=base,
+        bet_or_pass_params=phase_params['bet_or_pass'], play_params=phase_params['play'],
+    )
+
+
+def _labelled(values: ParameterValues) -> List[Tuple[str, Any]]:
+    if isinstance(values, dict):
+        return list(values.items())
+    return [(repr(value), value) for value in values]
+
+
+def build_grid_variants(base: str, grid: Dict[str, ParameterValues]) -> List[AgentVariant]:
+    params = list(grid)
+    variants = []
+    for combination in product(*[_labelled(grid[param]) for param in params]):
+        variants.append(create_variant(
+            base=base,
+            params={param: value for (param, (_, value)) in zip(params, combination)},
+            labels={param: label for (param, (label, _)) in zip(params, combination)},
+        ))
+    return variants
+
+
+def build_random_variants(
+        base: str, space: Dict[str, Union[ParameterValues, Tuple[float, float]]], nb_variants: int,
+        seed: Optional[int] = None
+) -> List[AgentVariant]:
+    """
+    space values are either a (low, high) tuple, sampled uniformly (as integers when both bounds are),
+    or values (cf ParameterValues) among which one is chosen
+    """
+    rng = random.Random(seed)
+    variants = []
+    for _ in range(nb_variants):
+        params, labels = {}, {}
+        for (param, values) in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                if isinstance(low, int) and isinstance(high, int):
+                    params[param] = rng.randint(low, high)
+                else:
+                    params[param] = round(rng.uniform(low, high), 4)
+                labels[param] = repr(params[param])
+            else:
+                labels[param], params[param] = rng.choice(_labelled(values))
+        variants.append(create_variant(base=base, params=params, labels=labels))
+    return variants
+
+
+def play_sweep_games(task: Tuple[AgentVariant, str, int, int, Optional[str], int]) -> Tuple[str, int, int]:
+    """variant plays games [first_game, first_game + nb_games) against opponent, as east/west on even games"""
+    variant, opponent, first_game, nb_games, deal_pool_path, seed = task
+    deal_pool = load_deal_pool(deal_pool_path) if deal_pool_path is not None else None
+    nb_won_games = 0
+    for game_id in range(first_game, first_game + nb_games):
+        random.seed(seed + game_id)
+        np.random.seed((seed + game_id) % 2 ** 32)
+        deal = seeded_dealer([seed, game_id]) if deal_pool is None else pool_dealer(deal_pool, game_id * DEALS_PER_GAME)
+        variant_team = Team.ONE if game_id % 2 == 0 else Team.TWO
+        agents = {
+            player: variant if (player in [Player.ONE, Player.THREE]) == (variant_team == Team.ONE) else opponent
+            for player in Player
+        }
+        score = play_game(agents=agents, deal=deal)
+        nb_won_games += derive_game_winners(score) == variant_team
+    return variant.name, nb_won_games, nb_games
+
+
+def run_sweep(
+        variants: List[AgentVariant], opponent: str, nb_games: int, deal_pool_path: Optional[str] = None,
+        seed: int = 0, nb_processes: Optional[int] = None, required_confidence_level: float = 0.95,
+        data_path: str = DATA_PATH
+) -> pd.DataFrame:
+    """
+    win rate of every configuration against opponent, over the same nb_games games;
+    results are appended to {base}-vs-{opponent}/sweep_data.csv, for the base agent of every configuration
+    """
+    names = [variant.name for variant in variants]
+    duplicated_names = sorted({name for name in names if names.count(name) > 1})
+    if duplicated_names:
+        raise ValueError(f'Configurations must have distinct names: {duplicated_names} are used several times')
+    experiment_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    tasks = [
+        (variant, opponent, first_game, min(GAMES_PER_TASK, nb_games - first_game), deal_pool_path, seed)
+        for variant in variants for first_game in range(0, nb_games, GAMES_PER_TASK)
+    ]
+    nb_won_games = {variant.name: 0 for variant in variants}
+    with Pool(processes=nb_processes) as pool:
+        for (name, nb_won_task_games, _) in pool.imap_unordered(play_sweep_games, tasks):
+            nb_won_games[name] += nb_won_task_games
+
+    rows = []
+    for variant in variants:
+        pc_games_won = nb_won_games[variant.name] / nb_games
+        inf_threshold, sup_threshold = compute_confidence_intervals(
+            estimator=pc_games_won, nb_samples=nb_games, required_confidence_level=required_confidence_level
+        )
+        rows.append({
+            'experiment_id': experiment_id,
+            'configuration': variant.name,
+            'base': variant.base,
+            'opponent': opponent,
+            'nb_games': nb_games,
+            'nb_won_games': nb_won_games[variant.name],
+            'pc_games_won': pc_games_won,
+            'inf_threshold': inf_threshold,
+            'sup_threshold': sup_threshold,
+        })
+    sweep_df = pd.DataFrame(rows, columns=SWEEP_COLUMNS).sort_values('pc_games_won', ascending=False)
+
+    for (base, base_sweep_df) in sweep_df.groupby('base', sort=False):
+        output_dir = os.path.join(data_path, f'{base}-vs-{opponent}')
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = os.path.join(output_dir, 'sweep_data.csv')
+        base_sweep_df.to_csv(output_path, sep=';', mode='a', header=not os.path.exists(output_path), index=False)
+
+    return sweep_df
+
+
+if __name__ == '__main__':
+    start_time = time()
+    df = run_sweep(
+        variants=build_grid_variants(base='EXPERT', grid={
+            'bet_or_pass.main_combinations': {
+                f'x{factor}': scale_bonus_values(MAIN_COMBINATIONS, factor) for factor in [0.5, 1., 1.5]
+            },
+            'bet_or_pass.support_combinations': {
+                f'x{factor}': scale_bonus_values(SUPPORT_COMBINATIONS, factor) for factor in [0.5, 1., 1.5]
+            },
+            'play.important_round_limit': [5, 10, 20],
+        }),
+        opponent='HIGHEST_CARD', nb_games=100
+    )
+    print(df[['configuration', 'pc_games_won', 'inf_threshold', 'sup_threshold']].to_string(index=False))
+    print(f'elapsed time: {time()-start_time} sec')
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from analysis.experiment import get_agent_bet_or_pass, run_experiment
+from analysis.sweep import (
+    scale_bonus_values, build_grid_variants, build_random_variants, create_variant, run_sweep
+)
+from expert.bet_or_pass.combinations import MAIN_COMBINATIONS, SUPPORT_COMBINATIONS
+from highest_card_agent import bet_or_pass_highest_card_strategy, derive_value_coefs
+
+
+@pytest.mark.parametrize('combinations', [MAIN_COMBINATIONS, SUPPORT_COMBINATIONS])
+def test_scale_bonus_values(combinations):
+    assert scale_bonus_values(combinations, 1.) == combinations
+    doubled_combinations = scale_bonus_values(combinations, 2.)
+    bonus = doubled_combinations[0]['bonus'][0] if 'bonus' in combinations[0] else doubled_combinations[0]
+    original_bonus = combinations[0]['bonus'][0] if 'bonus' in combinations[0] else combinations[0]
+    if isinstance(bonus['value'], dict):
+        assert bonus['value'] == {k: 2 * v for (k, v) in original_bonus['value'].items()}
+    else:
+        assert bonus['value'] == 2 * original_bonus['value']
+    assert doubled_combinations != combinations
+
+
+def test_build_grid_variants():
+    variants = build_grid_variants(base='EXPERT', grid={
+        'bet_or_pass.main_combinations': {'x0.5': scale_bonus_values(MAIN_COMBINATIONS, 0.5)},
+        'play.important_round_limit': [5, 10, 20],
+    })
+    assert len(variants) == 3
+    assert variants[0].name == 'EXPERT[bet_or_pass.main_combinations=x0.5, play.important_round_limit=5]'
+    assert variants[0].base == 'EXPERT'
+    assert variants[0].bet_or_pass_params.keys() == {'main_combinations'}
+    assert [variant.play_params for variant in variants] == [{'important_round_limit': limit} for limit in [5, 10, 20]]
+
+
+def test_build_random_variants():
+    variants = build_random_variants(
+        base='RANDOM', space={'bet_or_pass.bet_probability': (0.1, 0.5), 'bet_or_pass.value_normal_sigma': [1., 2.]},
+        nb_variants=20, seed=0
+    )
+    assert len(variants) == 20
+    for variant in variants:
+        assert 0.1 <= variant.bet_or_pass_params['bet_probability'] <= 0.5
+        assert variant.bet_or_pass_params['value_normal_sigma'] in [1., 2.]
+    assert variants == build_random_variants(
+        base='RANDOM', space={'bet_or_pass.bet_probability': (0.1, 0.5), 'bet_or_pass.value_normal_sigma': [1., 2.]},
+        nb_variants=20, seed=0
+    )
+
+
+def test_create_variant_unknown_phase():
+    with pytest.raises(ValueError):
+        create_variant(base='EXPERT', params={'auction.important_round_limit': 5})
+
+
+def test_variant_overrides_constant():
+    player_cards = ['Jh', '9h', 'Ah', 'Qh', 'Ks', '7d', '8d', '7c']  # 52 points at hearts
+    players_bids = {player: {'value': None, 'color': None} for player in ['west', 'south', 'east', 'north']}
+    assert get_agent_bet_or_pass('HIGHEST_CARD', players_bids, player_cards, 'west')[0] == 'bet'
+    variant = create_variant(base='HIGHEST_CARD', params={'bet_or_pass.min_points': 60})
+    assert variant.bet_or_pass_params['value_coefs'] == derive_value_coefs(60)  # derived once, with the override
+    assert get_agent_bet_or_pass(variant, players_bids, player_cards, 'west')[0] == 'pass'
+    lower_variant = create_variant(base='HIGHEST_CARD', params={'bet_or_pass.min_points': 40})
+    assert get_agent_bet_or_pass(lower_variant, players_bids, player_cards, 'west') == \
+        bet_or_pass_highest_card_strategy(player_cards, players_bids, min_points=40)
+    assert get_agent_bet_or_pass('HIGHEST_CARD', players_bids, player_cards, 'west')[0] == 'bet'
+
+
+def test_run_sweep_writes_every_base(tmp_path):
+    variants = [
+        create_variant(base='RANDOM', params={'bet_or_pass.bet_probability': 0.2}),
+        create_variant(base='HIGHEST_CARD', params={'bet_or_pass.min_points': 60}),
+    ]
+    sweep_df = run_sweep(variants=variants, opponent='RANDOM', nb_games=2, nb_processes=1, data_path=str(tmp_path))
+    assert sorted(sweep_df['configuration']) == sorted(variant.name for variant in variants)
+    assert sorted(os.listdir(tmp_path)) == ['HIGHEST_CARD-vs-RANDOM', 'RANDOM-vs-RANDOM']
+    for variant in variants:
+        with open(tmp_path / f'{variant.base}-vs-RANDOM' / 'sweep_data.csv') as f:
+            assert len(f.readlines()) == 2  # header and the row of its configuration
+
+
+def test_run_sweep_rejects_duplicated_names(tmp_path):
+    variant = create_variant(base='RANDOM', params={'bet_or_pass.bet_probability': 0.2})
+    with pytest.raises(ValueError):
+        run_sweep(variants=[variant, variant._replace(base='HIGHEST_CARD')], opponent='RANDOM', nb_games=2,
+                  data_path=str(tmp_path))
+
+
+def test_run_experiment_with_variant(tmp_path):
+    variant = create_variant(base='RANDOM', params={'bet_or_pass.bet_probability': 0.2})
+    run_experiment(variant, 'RANDOM', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    assert os.listdir(tmp_path) == [f'{variant.name}-vs-RANDOM']
@@ -0,0 +1,169 @@
+# TYPED CSV LOADING
+#
+# Experiment CSV files (cf analysis.experiment) parsed with explicit dtypes: categoricals for players, teams,
+# cards and experiment ids, small integers, booleans, and float32 / nullable booleans for the columns that are
+# only filled on some rows (nullable integers are much slower to parse with pandas 1.5).
+# Parsed frames are pickled in a .cache directory next to the CSV, keyed by its size and modification time:
+# loading an unchanged file again only unpickles it.
+# iter_typed_csv parses a file by chunks of rows instead, for files that do not fit in memory (no cache),
+# and parse_typed_lines parses raw lines of a file (e.g. the ones appended since a given byte offset).
+# Player and team columns share fixed categories, so that mirroring a frame (cf analysis.analyze.prepare_datasets)
+# remaps the integer codes of those columns instead of rewriting their strings.
+import io
+import os
+import tempfile
+from glob import glob
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from analysis.card_codes import PLAIN_CARDS
+from helpers.constants import COLORS
+
+CACHE_DIR_NAME = '.cache'
+CACHE_VERSION = 1  # to be incremented when dtypes change
+PLAYER_DTYPE = pd.CategoricalDtype(['west', 'south', 'east', 'north'])
+TEAM_DTYPE = pd.CategoricalDtype(['east/west', 'north/south'])
+CARD_DTYPE = pd.CategoricalDtype(PLAIN_CARDS)
+AUCTIONS_DTYPES = {
+    'experiment_id': 'category',
+    'game_id': 'int32',
+    'round_id': 'int16',
+    'player': PLAYER_DTYPE,
+    'action_code': 'int8',
+    'action': pd.CategoricalDtype(['bet', 'pass']),
+    'color': pd.CategoricalDtype(COLORS),
+    'value': 'float32',
+    'deal_id': 'int16',
+}
+TRICKS_DTYPES = {
+    'experiment_id': 'category',
+    'game_id': 'int32',
+    'round_id': 'int16',
+    'trick_id': 'int8',
+    'player': PLAYER_DTYPE,
+    'trick_position': 'int8',
+    'action_code': 'int8',
+    'card': CARD_DTYPE,
+    'is_last_in_trick': 'bool',
+    'trick_winner': PLAYER_DTYPE,
+    'trick_points': 'float32',
+    'is_last_in_round': 'bool',
+    'east/west_points': 'float32',
+    'north/south_points': 'float32',
+    'belote_team': TEAM_DTYPE,
+    'contract': 'float32',
+    'contract_reached': 'boolean',
+    'east/west_round_score': 'float32',
+    'north/south_round_score': 'float32',
+    'is_last_in_game': 'bool',
+    'game_winners': TEAM_DTYPE,
+    'east/west_score': 'float32',
+    'north/south_score': 'float32',
+}
+
+
+def read_typed_csv(path: str, dtypes: Dict) -> pd.DataFrame:
+    """concurrent calls (e.g. processes of a pool) may parse the file each, one of their caches being kept"""
+    stat = os.stat(path)
+    cache_dir = os.path.join(os.path.dirname(path), CACHE_DIR_NAME)
+    file_name = os.path.basename(path)
+    cache_path = os.path.join(
+        cache_dir, f'{file_name}.{pd.__version__}.v{CACHE_VERSION}.{stat.st_size}.{stat.st_mtime_ns}.pkl'
+    )
+    try:
+        return pd.read_pickle(cache_path)
+    except FileNotFoundError:  # not cached yet, or removed as stale by a process which saw a newer file
+        pass
+    read_dtypes, nullable_bool_columns = _split_dtypes(dtypes)
+    df = _to_nullable_booleans(pd.read_csv(path, sep=';', header='infer', dtype=read_dtypes), nullable_bool_columns)
+    os.makedirs(cache_dir, exist_ok=True)
+    # every process writes its own temporary file: readers never see a partially written cache
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=f'{file_name}.', suffix='.tmp')
+    os.close(fd)
+    try:
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, cache_path)  # the last of concurrent writers wins, their caches are the same
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    for stale_cache_path in glob(os.path.join(cache_dir, f'{file_name}.*.pkl')):
+        if stale_cache_path != cache_path:
+            try:
+                os.remove(stale_cache_path)
+            except FileNotFoundError:  # removed by another process
+                pass
+    return df
+
+
+def iter_typed_csv(path: str, dtypes: Dict, chunksize: int) -> Iterator[pd.DataFrame]:
+    """frames of (at most) chunksize rows of the file, parsed as read_typed_csv does"""
+    read_dtypes, nullable_bool_columns = _split_dtypes(dtypes)
+    with pd.read_csv(path, sep=';', header='infer', dtype=read_dtypes, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield _to_nullable_booleans(chunk, nullable_bool_columns)
+
+
+def read_csv_header(path: str) -> List[str]:
+    with open(path) as f:
+        return f.readline().rstrip('\n').split(';')
+
+
+def parse_typed_lines(lines: List[bytes], columns: List[str], dtypes: Dict) -> pd.DataFrame:
+    """rows of a CSV file given as raw lines (header excluded), parsed as read_typed_csv does"""
+    read_dtypes, nullable_bool_columns = _split_dtypes(dtypes)
+    df = pd.read_csv(io.BytesIO(b''.join(lines)), sep=';', header=None, names=columns, dtype=read_dtypes)
+    return _to_nullable_booleans(df, nullable_bool_columns)
+
+
+def _split_dtypes(dtypes: Dict) -> Tuple[Dict, List[str]]:
+    # nullable booleans are parsed as objects (True / False / NaN) first, which is faster
+    nullable_bool_columns = [column for (column, dtype) in dtypes.items() if dtype == 'boolean']
+    read_dtypes = {column: dtype for (column, dtype) in dtypes.items() if column not in nullable_bool_columns}
+    return read_dtypes, nullable_bool_columns
+
+
+def _to_nullable_booleans(df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    for column in columns:
+        if column in df:
+            df[column] = df[column].astype('boolean')
+    return df
+
+
+def empty_typed_frame(dtypes: Dict) -> pd.DataFrame:
+    return pd.DataFrame({column: pd.Series(dtype=dtype) for (column, dtype) in dtypes.items()})
+
+
+def remap_categories(values: pd.Series, mapping: Dict[str, str]) -> pd.Series:
+    """values mapped through mapping (a permutation of their categories), by remapping their integer codes"""
+    categories = values.cat.categories
+    # code -1 (missing value) picks the last element and stays -1
+    new_codes = np.append(categories.get_indexer([mapping.get(c, c) for c in categories]), -1)
+    return pd.Series(
+        pd.Categorical.from_codes(new_codes[values.cat.codes.to_numpy()], dtype=values.dtype),
+        index=values.index, name=values.name
+    )
+
+
+def rename_categories(values: pd.Series, suffix: str) -> pd.Series:
+    """suffix appended to every value, by renaming categories only"""
+    return pd.Series(
+        pd.Categorical.from_codes(values.cat.codes.to_numpy(), categories=values.cat.categories + suffix),
+        index=values.index, name=values.name
+    )
+
+
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """pd.concat keeping categorical columns whose categories differ between frames (e.g. experiment ids)"""
+    frames = [frame.copy(deep=False) for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    for column in frames[0].columns:
+        if all((column in frame) and isinstance(frame[column].dtype, pd.CategoricalDtype) for frame in frames):
+            categories = union_categoricals([frame[column] for frame in frames]).categories
+            for frame in frames:
+                if not frame[column].cat.categories.equals(categories):
+                    frame[column] = frame[column].cat.set_categories(categories)
+    return pd.concat(frames)
@@ -0,0 +1,81 @@
+import os
+import shutil
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+from analysis import analyze
+from analysis.experiment import run_experiment
+from analysis.typed_csv import (
+    CACHE_DIR_NAME, PLAYER_DTYPE, TRICKS_DTYPES, concat_frames, read_typed_csv, remap_categories, rename_categories
+)
+from analysis.analyze import MIRROR_PLAYER
+
+
+def test_read_typed_csv_is_cached(tmp_path):
+    path = str(tmp_path / 'data.csv')
+    pd.DataFrame({'player': ['west', 'north', None], 'value': [80, None, 120], 'reached': [True, None, False]}).to_csv(
+        path, sep=';', index=False
+    )
+    dtypes = {'player': PLAYER_DTYPE, 'value': 'float32', 'reached': 'boolean'}
+    df = read_typed_csv(path, dtypes)
+    assert {column: df[column].dtype for column in dtypes} == dtypes
+    assert df['reached'].isna().tolist() == [False, True, False]
+    cache_paths = os.listdir(tmp_path / CACHE_DIR_NAME)
+    assert len(cache_paths) == 1
+    pd.testing.assert_frame_equal(read_typed_csv(path, dtypes), df)
+
+    with open(path, 'a') as f:
+        f.write('south;90;True\n')
+    assert len(read_typed_csv(path, dtypes)) == 4
+    new_cache_paths = os.listdir(tmp_path / CACHE_DIR_NAME)
+    assert len(new_cache_paths) == 1 and new_cache_paths != cache_paths
+
+
+def read_cached_tricks(path: str) -> int:
+    return len(read_typed_csv(path, TRICKS_DTYPES))
+
+
+def test_read_typed_csv_concurrently(tmp_path):
+    run_experiment('RANDOM', 'RANDOM', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    dir_path = tmp_path / 'RANDOM-vs-RANDOM'
+    path = str(dir_path / 'tricks_data.csv')
+    with Pool(processes=6) as pool:
+        for _ in range(5):  # cold cache every time
+            shutil.rmtree(dir_path / CACHE_DIR_NAME, ignore_errors=True)
+            assert len(set(pool.map(read_cached_tricks, [path] * 24))) == 1
+    assert len(os.listdir(dir_path / CACHE_DIR_NAME)) == 1  # no temporary file left
+
+
+def test_remap_categories():
+    values = pd.Series(['west', None, 'north', 'east'], dtype=PLAYER_DTYPE, name='player')
+    mirror = remap_categories(values, MIRROR_PLAYER)
+    assert mirror.dtype == PLAYER_DTYPE
+    assert mirror.tolist() == ['south', np.nan, 'west', 'north']
+    assert rename_categories(values, '_mirror').tolist() == ['west_mirror', np.nan, 'north_mirror', 'east_mirror']
+
+
+def test_concat_frames_keeps_categories():
+    frames = [
+        pd.DataFrame({'experiment_id': pd.Series(['a', 'a'], dtype='category'), 'x': [1, 2]}),
+        pd.DataFrame({'experiment_id': pd.Series(['b'], dtype='category'), 'x': [3]}),
+        pd.DataFrame(),
+    ]
+    df = concat_frames(frames)
+    assert df['experiment_id'].dtype == 'category'
+    assert df['experiment_id'].tolist() == ['a', 'a', 'b'] and df['x'].tolist() == [1, 2, 3]
+
+
+def test_prepare_typed_datasets(tmp_path, monkeypatch):
+    run_experiment('RANDOM', 'RANDOM', nb_games=1, batch_size=1, data_path=str(tmp_path))
+    monkeypatch.setattr(analyze, 'DATA_PATH', str(tmp_path))
+    auctions_df, tricks_df = analyze.prepare_datasets(ew_agent='RANDOM', ns_agent='RANDOM')
+    assert {column: tricks_df[column].dtype for column in TRICKS_DTYPES} == TRICKS_DTYPES
+    assert auctions_df['player'].dtype == PLAYER_DTYPE
+    standard_df, mirror_df = tricks_df.iloc[:len(tricks_df) // 2], tricks_df.iloc[len(tricks_df) // 2:]
+    assert (mirror_df['experiment_id'].astype(str) == standard_df['experiment_id'].astype(str) + '_mirror').all()
+    assert (mirror_df['player'].astype(str).values == standard_df['player'].map(MIRROR_PLAYER).astype(str).values).all()
+    assert mirror_df['north/south_score'].reset_index(drop=True).equals(
+        standard_df['east/west_score'].reset_index(drop=True)
+    )
@@ -0,0 +1,273 @@
+# FILE-BASED WORK QUEUE
+#
+# queue_path/
+#   pending/<shard_id>.json    shard descriptors waiting for a worker
+#   claimed/<shard_id>.json    shards being run (file mtime = last heartbeat of the worker)
+#   done/<shard_id>.json       shards whose segment has been published
+#   segments/<shard_id>/       data written by the worker ({A}-vs-{B}/*.csv, same layout as ./data)
+#   merged/<shard_id>/         segments already appended to the data folder by the coordinator
+#   published/<shard_id>       marker of the worker that published the segment of the shard (created exclusively)
+#   merging/<shard_id>.json    sizes of the data files before the merge of a segment, to undo a partial merge
+#
+# Every state change is an os.rename, which is atomic on a POSIX file system (local disk or NFS):
+# when several workers try to claim the same shard, only one rename succeeds.
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import threading
+from datetime import datetime
+from time import time, sleep
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+import numpy as np
+
+from analysis.deal_pool import DEALS_PER_GAME
+from analysis.experiment import DATA_PATH, run_experiment
+
+QUEUE_PATH = './queue'
+PENDING_DIR = 'pending'
+CLAIMED_DIR = 'claimed'
+DONE_DIR = 'done'
+SEGMENTS_DIR = 'segments'
+MERGED_DIR = 'merged'
+PUBLISHED_DIR = 'published'
+MERGING_DIR = 'merging'
+CLAIM_TIMEOUT = 600  # sec without heartbeat before a claimed shard is given back to the queue
+HEARTBEAT_PERIOD = CLAIM_TIMEOUT / 4
+POLL_PERIOD = 10  # sec
+
+
+def init_queue(queue_path: str):
+    for sub_dir in [PENDING_DIR, CLAIMED_DIR, DONE_DIR, SEGMENTS_DIR, MERGED_DIR, PUBLISHED_DIR, MERGING_DIR]:
+        os.makedirs(os.path.join(queue_path, sub_dir), exist_ok=True)
+
+
+def submit_experiment(
+        queue_path: str, east_west_agents: str, north_south_agents: str, nb_games: int, nb_shards: int,
+        batch_size: int = 5, deal_pool_path: Optional[str] = None, seed: Optional[int] = None
+) -> List[str]:
+    init_queue(queue_path)
+    # several submissions may happen within the same second (e.g. from a script)
+    submission_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid4().hex[:8]}"
+    rng = random.Random(seed)
+    shard_ids = []
+    first_game = 0
+    for shard_index in range(nb_shards):
+        shard_nb_games = nb_games // nb_shards + (1 if shard_index < nb_games % nb_shards else 0)
+        if shard_nb_games == 0:
+            continue
+        shard_id = f'{submission_id}_{shard_index:04d}'
+        descriptor = {
+            'shard_id': shard_id,
+            'east_west_agents': east_west_agents,
+            'north_south_agents': north_south_agents,
+            'nb_games': shard_nb_games,
+            'batch_size': batch_size,
+            'deal_pool_path': deal_pool_path,
+            'first_deal': first_game * DEALS_PER_GAME,  # shards replay consecutive parts of the deal pool
+            'seed': rng.randrange(2 ** 32),
+        }
+        # descriptor is fully written before being moved to pending/, so workers never read a partial file
+        tmp_path = os.path.join(queue_path, f'.{shard_id}.json')
+        with open(tmp_path, 'w') as f:
+            json.dump(descriptor, f)
+        os.rename(tmp_path, os.path.join(queue_path, PENDING_DIR, f'{shard_id}.json'))
+        shard_ids.append(shard_id)
+        first_game += shard_nb_games
+
+    return shard_ids
+
+
+def claim_shard(queue_path: str) -> Optional[Tuple[str, Dict]]:
+    for file_name in sorted(os.listdir(os.path.join(queue_path, PENDING_DIR))):
+        claimed_path = os.path.join(queue_path, CLAIMED_DIR, file_name)
+        try:
+            os.rename(os.path.join(queue_path, PENDING_DIR, file_name), claimed_path)
+        except FileNotFoundError:  # claimed by another worker in the meantime
+            continue
+        os.utime(claimed_path)  # claim timeout starts now, not at submission time
+        with open(claimed_path) as f:
+            return claimed_path, json.load(f)
+    return None
+
+
+def _heartbeat(claimed_path: str, stop_event: threading.Event):
+    while not stop_event.wait(HEARTBEAT_PERIOD):
+        try:
+            os.utime(claimed_path)
+        except FileNotFoundError:  # claim expired and was given back to the queue
+            return
+
+
+def _create_marker(path: str) -> bool:
+    """whether the marker was created by this call (O_EXCL: a single creator, even on concurrent calls)"""
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+    return True
+
+
+def run_shard(queue_path: str, claimed_path: str, descriptor: Dict):
+    shard_id = descriptor['shard_id']
+    tmp_segment_path = os.path.join(queue_path, SEGMENTS_DIR, f'.{shard_id}.{socket.gethostname()}.{os.getpid()}')
+    segment_path = os.path.join(queue_path, SEGMENTS_DIR, shard_id)
+    random.seed(descriptor['seed'])
+    np.random.seed(descriptor['seed'])
+    stop_event = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(claimed_path, stop_event), daemon=True)
+    heartbeat.start()
+    try:
+        try:
+            run_experiment(
+                east_west_agents=descriptor['east_west_agents'], north_south_agents=descriptor['north_south_agents'],
+                nb_games=descriptor['nb_games'], batch_size=descriptor['batch_size'],
+                deal_pool_path=descriptor['deal_pool_path'], first_deal=descriptor['first_deal'],
+                experiment_id=shard_id, data_path=tmp_segment_path
+            )
+        finally:
+            stop_event.set()
+            heartbeat.join()
+        # shard may have been re-run by another worker after an expired claim: the first worker creating the
+        # marker publishes its segment (even when it was already merged), the others discard theirs.
+        # A worker dying between both steps leaves the shard unpublished: it then has to be submitted again
+        if _create_marker(os.path.join(queue_path, PUBLISHED_DIR, shard_id)):
+            os.rename(tmp_segment_path, segment_path)
+    finally:
+        shutil.rmtree(tmp_segment_path, ignore_errors=True)  # failed run, or segment published by another worker
+    try:
+        os.rename(claimed_path, os.path.join(queue_path, DONE_DIR, os.path.basename(claimed_path)))
+    except FileNotFoundError:
+        pass
+
+
+def run_worker(queue_path: str, wait_for_shards: bool = False):
+    init_queue(queue_path)
+    while True:
+        claim = claim_shard(queue_path)
+        if claim is None:
+            if not wait_for_shards:
+                return
+            sleep(POLL_PERIOD)
+            continue
+        claimed_path, descriptor = claim
+        print(f"running shard {descriptor['shard_id']}")
+        run_shard(queue_path, claimed_path, descriptor)
+
+
+def requeue_expired_claims(queue_path: str, claim_timeout: float = CLAIM_TIMEOUT) -> List[str]:
+    requeued = []
+    now = time()
+    for file_name in os.listdir(os.path.join(queue_path, CLAIMED_DIR)):
+        claimed_path = os.path.join(queue_path, CLAIMED_DIR, file_name)
+        try:
+            if now - os.path.getmtime(claimed_path) < claim_timeout:
+                continue
+            os.rename(claimed_path, os.path.join(queue_path, PENDING_DIR, file_name))
+        except FileNotFoundError:  # shard was completed in the meantime
+            continue
+        requeued.append(file_name)
+    return requeued
+
+
+def _append_csv(source_path: str, target_path: str):
+    with open(source_path) as source:
+        header = source.readline()
+        if not os.path.exists(target_path):
+            with open(target_path, 'w') as target:
+                target.write(header)
+        with open(target_path, 'a') as target:
+            shutil.copyfileobj(source, target)
+
+
+def _truncate_csvs(file_sizes: Dict[str, Optional[int]]):
+    """data files back to their size before a merge (removed when they did not exist)"""
+    for (target_path, size) in file_sizes.items():
+        if size is None:
+            if os.path.exists(target_path):
+                os.remove(target_path)
+        else:
+            os.truncate(target_path, size)
+
+
+def merge_segments(queue_path: str, data_path: str = DATA_PATH) -> List[str]:
+    """
+    appends the published segments to the data folder; sizes of the data files are recorded before, so that
+    the rows of a merge interrupted by a crash are removed before the segment is merged again
+    """
+    merged = []
+    for shard_id in sorted(os.listdir(os.path.join(queue_path, SEGMENTS_DIR))):
+        if shard_id.startswith('.'):  # segment still being written
+            continue
+        segment_path = os.path.join(queue_path, SEGMENTS_DIR, shard_id)
+        merging_path = os.path.join(queue_path, MERGING_DIR, f'{shard_id}.json')
+        if os.path.exists(merging_path):  # previous merge of the segment was interrupted
+            with open(merging_path) as f:
+                _truncate_csvs(json.load(f))
+        file_paths = [
+            (os.path.join(segment_path, pair_dir, file_name), os.path.join(data_path, pair_dir, file_name))
+            for pair_dir in os.listdir(segment_path)
+            for file_name in ['config_data.csv', 'auctions_data.csv', 'tricks_data.csv', 'deals_data.csv']
+        ]
+        file_sizes = {
+            target_path: os.path.getsize(target_path) if os.path.exists(target_path) else None
+            for (_, target_path) in file_paths
+        }
+        tmp_merging_path = os.path.join(queue_path, MERGING_DIR, f'.{shard_id}.json')
+        with open(tmp_merging_path, 'w') as f:
+            json.dump(file_sizes, f)
+        os.replace(tmp_merging_path, merging_path)
+        for (source_path, target_path) in file_paths:
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            _append_csv(source_path, target_path)
+        os.rename(segment_path, os.path.join(queue_path, MERGED_DIR, shard_id))
+        os.remove(merging_path)
+        merged.append(shard_id)
+    return merged
+
+
+def is_queue_drained(queue_path: str) -> bool:
+    return not any(
+        os.listdir(os.path.join(queue_path, sub_dir)) for sub_dir in [PENDING_DIR, CLAIMED_DIR]
+    )
+
+
+def run_coordinator(queue_path: str, data_path: str = DATA_PATH, claim_timeout: float = CLAIM_TIMEOUT):
+    init_queue(queue_path)
+    while True:
+        for file_name in requeue_expired_claims(queue_path, claim_timeout):
+            print(f"claim on {file_name} expired, shard is back in the queue")
+        for shard_id in merge_segments(queue_path, data_path):
+            print(f"merged shard {shard_id}")
+        if is_queue_drained(queue_path):
+            merge_segments(queue_path, data_path)
+            return
+        sleep(POLL_PERIOD)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('role', choices=['submit', 'worker', 'coordinator'])
+    parser.add_argument('--queue-path', default=QUEUE_PATH)
+    parser.add_argument('--data-path', default=DATA_PATH)
+    parser.add_argument('--east-west-agents')
+    parser.add_argument('--north-south-agents')
+    parser.add_argument('--nb-games', type=int)
+    parser.add_argument('--nb-shards', type=int)
+    parser.add_argument('--deal-pool-path')
+    args = parser.parse_args()
+
+    if args.role == 'submit':
+        submit_experiment(
+            queue_path=args.queue_path, east_west_agents=args.east_west_agents,
+            north_south_agents=args.north_south_agents, nb_games=args.nb_games, nb_shards=args.nb_shards,
+            deal_pool_path=args.deal_pool_path
+        )
+    elif args.role == 'worker':
+        run_worker(queue_path=args.queue_path, wait_for_shards=True)
+    else:
+        run_coordinator(queue_path=args.queue_path, data_path=args.data_path)
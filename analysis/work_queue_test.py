@@ -0,0 +1,131 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from analysis import work_queue
+from analysis.work_queue import (
+    submit_experiment, claim_shard, run_shard, run_worker, requeue_expired_claims, merge_segments, is_queue_drained,
+    PENDING_DIR, CLAIMED_DIR, DONE_DIR, MERGED_DIR, SEGMENTS_DIR, MERGING_DIR,
+)
+
+
+def test_submit_experiment_splits_games(tmp_path):
+    queue_path = str(tmp_path / 'queue')
+    shard_ids = submit_experiment(queue_path, 'RANDOM', 'RANDOM', nb_games=5, nb_shards=3, seed=13)
+    assert len(shard_ids) == 3
+    assert len(os.listdir(os.path.join(queue_path, PENDING_DIR))) == 3
+    descriptors = []
+    while True:
+        claim = claim_shard(queue_path)
+        if claim is None:
+            break
+        descriptors.append(claim[1])
+    assert [d['nb_games'] for d in descriptors] == [2, 2, 1]
+    assert [d['first_deal'] for d in descriptors] == [0, 128, 256]
+    assert len(os.listdir(os.path.join(queue_path, CLAIMED_DIR))) == 3
+
+
+def test_requeue_expired_claims(tmp_path):
+    queue_path = str(tmp_path / 'queue')
+    submit_experiment(queue_path, 'RANDOM', 'RANDOM', nb_games=1, nb_shards=1)
+    claim_shard(queue_path)
+    assert requeue_expired_claims(queue_path, claim_timeout=3600) == []
+    assert len(requeue_expired_claims(queue_path, claim_timeout=0)) == 1
+    assert len(os.listdir(os.path.join(queue_path, PENDING_DIR))) == 1
+    assert claim_shard(queue_path) is not None
+
+
+def test_worker_and_merge(tmp_path):
+    queue_path = str(tmp_path / 'queue')
+    data_path = str(tmp_path / 'data')
+    submit_experiment(queue_path, 'HIGHEST_CARD', 'RANDOM', nb_games=2, nb_shards=2, batch_size=1)
+    run_worker(queue_path)
+    assert is_queue_drained(queue_path)
+    assert len(os.listdir(os.path.join(queue_path, DONE_DIR))) == 2
+    assert len(merge_segments(queue_path, data_path)) == 2
+    assert len(os.listdir(os.path.join(queue_path, MERGED_DIR))) == 2
+    pair_path = os.path.join(data_path, 'HIGHEST_CARD-vs-RANDOM')
+    config_df = pd.read_csv(os.path.join(pair_path, 'config_data.csv'), sep=';')
+    tricks_df = pd.read_csv(os.path.join(pair_path, 'tricks_data.csv'), sep=';')
+    assert config_df['nb_games'].tolist() == [1, 1]
+    assert set(tricks_df['experiment_id']) == set(config_df['experiment_id'])
+    assert tricks_df['is_last_in_game'].sum() == 2
+
+
+def test_submissions_within_a_second_do_not_collide(tmp_path):
+    queue_path = str(tmp_path / 'queue')
+    shard_ids = []
+    for _ in range(3):
+        shard_ids += submit_experiment(queue_path, 'RANDOM', 'RANDOM', nb_games=2, nb_shards=2)
+    assert len(set(shard_ids)) == 6
+    assert len(os.listdir(os.path.join(queue_path, PENDING_DIR))) == 6
+
+
+def read_pair_data(data_path: str) -> dict:
+    pair_path = os.path.join(data_path, 'HIGHEST_CARD-vs-RANDOM')
+    return {file_name: pd.read_csv(os.path.join(pair_path, file_name), sep=';') for file_name in os.listdir(pair_path)}
+
+
+def test_shard_run_again_after_its_merge_is_not_published(tmp_path):
+    queue_path = str(tmp_path / 'queue')
+    data_path = str(tmp_path / 'data')
+    submit_experiment(queue_path, 'HIGHEST_CARD', 'RANDOM', nb_games=1, nb_shards=1, batch_size=1)
+    claimed_path, descriptor = claim_shard(queue_path)
+    # claim expires while the first worker runs the shard: a second worker runs it again
+    requeue_expired_claims(queue_path, claim_timeout=0)
+    other_claimed_path, _ = claim_shard(queue_path)
+    run_shard(queue_path, claimed_path, descriptor)
+    assert merge_segments(queue_path, data_path) == [descriptor['shard_id']]
+    merged_data = read_pair_data(data_path)
+    run_shard(queue_path, other_claimed_path, descriptor)
+    assert os.listdir(os.path.join(queue_path, SEGMENTS_DIR)) == []
+    assert merge_segments(queue_path, data_path) == []
+    for (file_name, df) in read_pair_data(data_path).items():
+        pd.testing.assert_frame_equal(df, merged_data[file_name])
+
+
+def test_failed_shard_leaves_no_segment(tmp_path, monkeypatch):
+    queue_path = str(tmp_path / 'queue')
+    submit_experiment(queue_path, 'HIGHEST_CARD', 'RANDOM', nb_games=1, nb_shards=1, batch_size=1)
+    claimed_path, descriptor = claim_shard(queue_path)
+
+    def failing_experiment(data_path, **kwargs):
+        os.makedirs(data_path)
+        raise RuntimeError('agent crashed')
+    monkeypatch.setattr(work_queue, 'run_experiment', failing_experiment)
+    with pytest.raises(RuntimeError):
+        run_shard(queue_path, claimed_path, descriptor)
+    assert os.listdir(os.path.join(queue_path, SEGMENTS_DIR)) == []
+
+
+def test_interrupted_merge_is_merged_once(tmp_path, monkeypatch):
+    queue_path = str(tmp_path / 'queue')
+    submit_experiment(queue_path, 'HIGHEST_CARD', 'RANDOM', nb_games=2, nb_shards=2, batch_size=1)
+    run_worker(queue_path)
+    # same segments merged without crash
+    reference_queue_path = str(tmp_path / 'reference_queue')
+    shutil.copytree(queue_path, reference_queue_path)
+    reference_data_path = str(tmp_path / 'reference_data')
+    merge_segments(reference_queue_path, reference_data_path)
+
+    data_path = str(tmp_path / 'data')
+    append_csv = work_queue._append_csv
+    appended_files = []
+
+    def crashing_append_csv(source_path, target_path):
+        if len(appended_files) == 6:  # second segment: crash after 2 of its 4 files
+            raise OSError('disk full')
+        appended_files.append(source_path)
+        append_csv(source_path, target_path)
+    monkeypatch.setattr(work_queue, '_append_csv', crashing_append_csv)
+    with pytest.raises(OSError):
+        merge_segments(queue_path, data_path)
+    assert len(os.listdir(os.path.join(queue_path, MERGING_DIR))) == 1
+    monkeypatch.setattr(work_queue, '_append_csv', append_csv)
+    assert len(merge_segments(queue_path, data_path)) == 1
+    assert os.listdir(os.path.join(queue_path, MERGING_DIR)) == []
+    reference_data = read_pair_data(reference_data_path)
+    for (file_name, df) in read_pair_data(data_path).items():
+        pd.testing.assert_frame_equal(df, reference_data[file_name])
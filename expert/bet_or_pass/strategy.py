@@ -105,16 +105,16 @@ def compute_support_score(player_cards, color, support_combinations):
 
 
 # STRATEGY
-def bet_or_pass_none_spoke(player_cards):
-    best_color, best_score = compute_best_color_bet(player_cards, MAIN_COMBINATIONS)
+def bet_or_pass_none_spoke(player_cards, main_combinations=MAIN_COMBINATIONS):
+    best_color, best_score = compute_best_color_bet(player_cards, main_combinations)
     if best_color is not None:
         return 'bet', best_color, best_score
     else:
         return 'pass', None, None
 
 
-def bet_or_pass_only_opponents_spoke(player_cards, opponent_bid_value):
-    best_color, best_score = compute_best_color_bet(player_cards, MAIN_COMBINATIONS)
+def bet_or_pass_only_opponents_spoke(player_cards, opponent_bid_value, main_combinations=MAIN_COMBINATIONS):
+    best_color, best_score = compute_best_color_bet(player_cards, main_combinations)
     if (best_color is None) or (best_score < opponent_bid_value):
         return 'pass', None, None
     elif best_score == opponent_bid_value:
@@ -125,9 +125,10 @@ def bet_or_pass_only_opponents_spoke(player_cards, opponent_bid_value):
         raise UnhandledBetOrPassCaseException()
 
 
-def bet_or_pass_only_partner_spoke(player_cards, partner_bid_color, partner_bid_value):
-    best_color, best_score = compute_best_color_bet(player_cards, MAIN_COMBINATIONS)
-    support_score = compute_support_score(player_cards, partner_bid_color, SUPPORT_COMBINATIONS)
+def bet_or_pass_only_partner_spoke(player_cards, partner_bid_color, partner_bid_value,
+                                   main_combinations=MAIN_COMBINATIONS, support_combinations=SUPPORT_COMBINATIONS):
+    best_color, best_score = compute_best_color_bet(player_cards, main_combinations)
+    support_score = compute_support_score(player_cards, partner_bid_color, support_combinations)
     if (best_color is not None) and (best_score > (partner_bid_value + support_score)):
         return 'bet', best_color, best_score
     elif support_score > 0:
@@ -136,19 +137,21 @@ def bet_or_pass_only_partner_spoke(player_cards, partner_bid_color, partner_bid_
         return 'pass', None, None
 
 
-def bet_or_pass_only_player_partner_spoke_different_colors(player_cards, partner_bid_color, partner_bid_value):
-    support_score = compute_support_score(player_cards, partner_bid_color, SUPPORT_COMBINATIONS)
+def bet_or_pass_only_player_partner_spoke_different_colors(player_cards, partner_bid_color, partner_bid_value,
+                                                           support_combinations=SUPPORT_COMBINATIONS):
+    support_score = compute_support_score(player_cards, partner_bid_color, support_combinations)
     if support_score > 0:
         return 'bet', partner_bid_color, partner_bid_value + support_score
     else:
         return 'pass', None, None
 
 
-def bet_or_pass_only_opponent_partner_spoke_opponent_leads(player_cards,
-                                                           partner_bid_color, partner_bid_value,
-                                                           opponent_bid_value):
-    best_color, best_score = compute_best_color_bet(player_cards, MAIN_COMBINATIONS)
-    aggressive_support_score = compute_support_score(player_cards, partner_bid_color, AGGRESSIVE_SUPPORT_COMBINATIONS)
+def bet_or_pass_only_opponent_partner_spoke_opponent_leads(
+        player_cards, partner_bid_color, partner_bid_value, opponent_bid_value,
+        main_combinations=MAIN_COMBINATIONS, aggressive_support_combinations=AGGRESSIVE_SUPPORT_COMBINATIONS
+):
+    best_color, best_score = compute_best_color_bet(player_cards, main_combinations)
+    aggressive_support_score = compute_support_score(player_cards, partner_bid_color, aggressive_support_combinations)
     if (best_color is not None) and best_score > max(opponent_bid_value, partner_bid_value + aggressive_support_score):
         return 'bet', best_color, best_score
     elif (aggressive_support_score > 0) and ((partner_bid_value + aggressive_support_score) > opponent_bid_value):
@@ -157,40 +160,51 @@ def bet_or_pass_only_opponent_partner_spoke_opponent_leads(player_cards,
         return 'pass', None, None
 
 
-def bet_or_pass_only_opponent_partner_spoke_partner_leads(player_cards, partner_bid_color, partner_bid_value):
-    return bet_or_pass_only_partner_spoke(player_cards, partner_bid_color, partner_bid_value)
+def bet_or_pass_only_opponent_partner_spoke_partner_leads(player_cards, partner_bid_color, partner_bid_value,
+                                                          main_combinations=MAIN_COMBINATIONS,
+                                                          support_combinations=SUPPORT_COMBINATIONS):
+    return bet_or_pass_only_partner_spoke(player_cards, partner_bid_color, partner_bid_value,
+                                          main_combinations, support_combinations)
 
 
-def bet_or_pass_everyone_spoke_opponent_leads_different_color(player_cards,
-                                                              partner_bid_color, partner_bid_value,
-                                                              opponent_bid_value):
-    aggressive_support_score = compute_support_score(player_cards, partner_bid_color, AGGRESSIVE_SUPPORT_COMBINATIONS)
+def bet_or_pass_everyone_spoke_opponent_leads_different_color(
+        player_cards, partner_bid_color, partner_bid_value, opponent_bid_value,
+        aggressive_support_combinations=AGGRESSIVE_SUPPORT_COMBINATIONS
+):
+    aggressive_support_score = compute_support_score(player_cards, partner_bid_color, aggressive_support_combinations)
     if (aggressive_support_score > 0) and ((partner_bid_value + aggressive_support_score) > opponent_bid_value):
         return 'bet', partner_bid_color, partner_bid_value + aggressive_support_score
     else:
         return 'pass', None, None
 
 
-def bet_or_pass_everyone_spoke_partner_leads_different_colors(player_cards, partner_bid_color, partner_bid_value):
-    return bet_or_pass_only_player_partner_spoke_different_colors(player_cards, partner_bid_color, partner_bid_value)
+def bet_or_pass_everyone_spoke_partner_leads_different_colors(player_cards, partner_bid_color, partner_bid_value,
+                                                              support_combinations=SUPPORT_COMBINATIONS):
+    return bet_or_pass_only_player_partner_spoke_different_colors(player_cards, partner_bid_color, partner_bid_value,
+                                                                  support_combinations)
 
 
-def bet_or_pass_expert_strategy(player, player_cards, players_bids):
+def bet_or_pass_expert_strategy(player, player_cards, players_bids,
+                                main_combinations=MAIN_COMBINATIONS, support_combinations=SUPPORT_COMBINATIONS,
+                                aggressive_support_combinations=AGGRESSIVE_SUPPORT_COMBINATIONS):
     partner = NEXT_PLAYER[NEXT_PLAYER[player]]
     opponents = [NEXT_PLAYER[player], NEXT_PLAYER[partner]]
 
     speakers = extract_speakers(players_bids)
 
     if len(speakers) == 0:  # None spoke
-        action, color, value = bet_or_pass_none_spoke(player_cards)
+        action, color, value = bet_or_pass_none_spoke(player_cards, main_combinations)
     elif speakers.issubset(set(opponents)):  # only opponent(s) spoke
         best_opponent_bid_value = get_best_opponent_bid(players_bids, opponents)[1]
-        action, color, value = bet_or_pass_only_opponents_spoke(player_cards, best_opponent_bid_value)
+        action, color, value = bet_or_pass_only_opponents_spoke(player_cards, best_opponent_bid_value,
+                                                                main_combinations)
     elif speakers == {partner}:  # only partner spoke
         action, color, value = bet_or_pass_only_partner_spoke(
             player_cards,
             players_bids[partner]['color'],
-            players_bids[partner]['value']
+            players_bids[partner]['value'],
+            main_combinations,
+            support_combinations
         )
     elif speakers == {player, partner}:  # only player & partner spoke...
         if have_player_and_partner_spoken_over_same_color(player, players_bids):  # ...over same color
@@ -199,7 +213,8 @@ def bet_or_pass_expert_strategy(player, player_cards, players_bids):
             action, color, value = bet_or_pass_only_player_partner_spoke_different_colors(
                 player_cards,
                 players_bids[partner]['color'],
-                players_bids[partner]['value']
+                players_bids[partner]['value'],
+                support_combinations
             )
     elif speakers.issubset(set(opponents + [partner])):  # only opponent & partner spoke...
         leader = extract_leader(players_bids)
@@ -209,13 +224,17 @@ def bet_or_pass_expert_strategy(player, player_cards, players_bids):
                 player_cards,
                 players_bids[partner]['color'],
                 players_bids[partner]['value'],
-                best_opponent_bid_value
+                best_opponent_bid_value,
+                main_combinations,
+                aggressive_support_combinations
             )
         elif leader == partner:  # ...and partner leads
             action, color, value = bet_or_pass_only_opponent_partner_spoke_partner_leads(
                 player_cards,
                 players_bids[partner]['color'],
-                players_bids[partner]['value']
+                players_bids[partner]['value'],
+                main_combinations,
+                support_combinations
             )
         else:
             raise UnhandledBetOrPassCaseException(f'Leader ({leader}) is neither among opponents ({opponents}) '
@@ -235,7 +254,8 @@ def bet_or_pass_expert_strategy(player, player_cards, players_bids):
                     player_cards,
                     players_bids[partner]['color'],
                     players_bids[partner]['value'],
-                    best_opponent_bid_value
+                    best_opponent_bid_value,
+                    aggressive_support_combinations
                 )
         elif leader == partner:  # ...and partner leads...
             if have_player_and_partner_spoken_over_same_color(player, players_bids):
@@ -245,7 +265,8 @@ def bet_or_pass_expert_strategy(player, player_cards, players_bids):
                 action, color, value = bet_or_pass_everyone_spoke_partner_leads_different_colors(
                     player_cards,
                     players_bids[partner]['color'],
-                    players_bids[partner]['value']
+                    players_bids[partner]['value'],
+                    support_combinations
                 )
         else:
             raise UnhandledBetOrPassCaseException(f'Leader ({leader}) is neither among opponents ({opponents}) '
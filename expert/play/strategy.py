@@ -442,7 +442,7 @@ def play_expert_second_in_round(player, player_cards, trump_asked, playable_card
 
 
 def play_expert_third_in_round(player, player_cards, trump_asked, playable_cards, round_cards, trump_color, round_color,
-                               round, game_history, rounds_first_player):
+                               round, game_history, rounds_first_player, important_round_limit=IMPORTANT_ROUND_LIMIT):
     partner = NEXT_PLAYER[NEXT_PLAYER[player]]
     partner_card = round_cards[partner]
     opponent = NEXT_PLAYER[partner]
@@ -543,7 +543,7 @@ def play_expert_third_in_round(player, player_cards, trump_asked, playable_cards
                             and ((get_highest_color_card_remaining(game_history, round, round_color) != partner_card)
                                  and extract_color(partner_card) != trump_color)
                         )
-                        and (count_round_points(round_cards, trump_color, round) >= IMPORTANT_ROUND_LIMIT)
+                        and (count_round_points(round_cards, trump_color, round) >= important_round_limit)
                         and (
                             not has_player_cut_color(fourth_player, game_history, round, rounds_first_player,
                                                      round_color, trump_color)
@@ -617,7 +617,7 @@ def play_expert_fourth_in_round(player, trump_asked, playable_cards, round_cards
 # LEVEL 0
 
 def play_expert_strategy(player, contract_team, player_cards, cards_playability, round_cards, trump_color, round_color,
-                         round, game_history, rounds_first_player):
+                         round, game_history, rounds_first_player, important_round_limit=IMPORTANT_ROUND_LIMIT):
     playable_cards = derive_playable_cards(player_cards, cards_playability)
     # LEVEL 0
     if len(playable_cards) == 1:
@@ -635,7 +635,8 @@ def play_expert_strategy(player, contract_team, player_cards, cards_playability,
                                            round, game_history, rounds_first_player)
     elif player_rank_in_round == 2:
         card = play_expert_third_in_round(player, player_cards, trump_asked, playable_cards, round_cards, trump_color,
-                                          round_color, round, game_history, rounds_first_player)
+                                          round_color, round, game_history, rounds_first_player,
+                                          important_round_limit)
     elif player_rank_in_round == 3:
         card = play_expert_fourth_in_round(player, trump_asked, playable_cards, round_cards, trump_color, round_color)
     else:
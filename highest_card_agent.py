@@ -7,11 +7,18 @@ from helpers.play_helpers import derive_playable_cards
 
 HIGHEST_CARD_MIN_POINTS = 50  # (J, 9, A)
 MAX_POINTS_IN_HAND = 93  # (J, 9, A, 10 (Trump) + A * 3 + 10)
+
+
 # raw_value = K * (points) ^ A
-# K * (HIGHEST_CARD_MIN_POINTS) ^ A = 80
+# K * (min_points) ^ A = 80
 # K * (MAX_POINTS_IN_HAND) ^ A = 160
-HIGHEST_CARD_VALUE_COEF_A = math.log(2) / (math.log(MAX_POINTS_IN_HAND) - math.log(HIGHEST_CARD_MIN_POINTS))
-HIGHEST_CARD_VALUE_COEF_K = 80 / (pow(HIGHEST_CARD_MIN_POINTS, HIGHEST_CARD_VALUE_COEF_A))
+def derive_value_coefs(min_points):
+    coef_a = math.log(2) / (math.log(MAX_POINTS_IN_HAND) - math.log(min_points))
+    coef_k = 80 / (pow(min_points, coef_a))
+    return coef_a, coef_k
+
+
+HIGHEST_CARD_VALUE_COEF_A, HIGHEST_CARD_VALUE_COEF_K = derive_value_coefs(HIGHEST_CARD_MIN_POINTS)
 
 
 ########
@@ -67,18 +74,24 @@ def get_points_in_hand(player_cards, trump_color):
     return points
 
 
-def get_contract_value_from_points(points):
-    raw_contract_value = HIGHEST_CARD_VALUE_COEF_K * pow(points, HIGHEST_CARD_VALUE_COEF_A)
+def get_contract_value_from_points(points, coef_a=HIGHEST_CARD_VALUE_COEF_A, coef_k=HIGHEST_CARD_VALUE_COEF_K):
+    raw_contract_value = coef_k * pow(points, coef_a)
     return int(round(raw_contract_value, -1))
 
 
-def bet_or_pass_highest_card_strategy(player_cards, players_bids):
+# value_coefs: derive_value_coefs(min_points), given by callers overriding min_points to compute it once
+def bet_or_pass_highest_card_strategy(player_cards, players_bids, min_points=HIGHEST_CARD_MIN_POINTS, value_coefs=None):
     color = get_best_trump_color(player_cards)
     points = get_points_in_hand(player_cards, color)
 
-    if points >= HIGHEST_CARD_MIN_POINTS:
+    if points >= min_points:
         action = 'bet'
-        tmp_value = get_contract_value_from_points(points)
+        if value_coefs is None:
+            value_coefs = (
+                (HIGHEST_CARD_VALUE_COEF_A, HIGHEST_CARD_VALUE_COEF_K) if min_points == HIGHEST_CARD_MIN_POINTS
+                else derive_value_coefs(min_points)
+            )
+        tmp_value = get_contract_value_from_points(points, *value_coefs)
         value = max(80, tmp_value)
         currently_highest_bid_value = derive_currently_highest_bid_value(players_bids)
         if currently_highest_bid_value and (value <= currently_highest_bid_value):
@@ -26,11 +26,13 @@ def play_random_strategy(player_cards, cards_playability):
 # BET OR PASS #
 ###############
 
-def bet_or_pass_random_strategy(players_bids):
-    if random.random() < RANDOM_BET_PROBABILITY:
+def bet_or_pass_random_strategy(players_bids, bet_probability=RANDOM_BET_PROBABILITY,
+                                color_weights=RANDOM_COLOR_WEIGHTS, value_normal_mu=RANDOM_VALUE_NORMAL_MU,
+                                value_normal_sigma=RANDOM_VALUE_NORMAL_SIGMA):
+    if random.random() < bet_probability:
         action = 'bet'
-        color = random.choices(population=COLORS, weights=RANDOM_COLOR_WEIGHTS, k=1)[0]
-        value = 80 + 10 * round(abs(np.random.normal(loc=RANDOM_VALUE_NORMAL_MU, scale=RANDOM_VALUE_NORMAL_SIGMA)))
+        color = random.choices(population=COLORS, weights=color_weights, k=1)[0]
+        value = 80 + 10 * round(abs(np.random.normal(loc=value_normal_mu, scale=value_normal_sigma)))
         currently_highest_bid_value = derive_currently_highest_bid_value(players_bids)
         if currently_highest_bid_value and (value <= currently_highest_bid_value):
             action = 'pass'